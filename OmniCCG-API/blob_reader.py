@@ -0,0 +1,119 @@
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+# Memory bound of the blob cache shared by all repositories
+SNIPPET_CACHE_SIZE = int(os.environ.get("OMNICCG_SNIPPET_CACHE_SIZE", str(64 * 1024 ** 2)))
+
+_OBJECT_TYPES = (b"blob", b"tree", b"commit", b"tag")
+
+
+class BlobReader:
+    """
+    Long-lived `git cat-file --batch` process of one repository. Every lookup is one request/answer
+    round trip on its pipes instead of a new git process per file. The process is started on the
+    first lookup and restarted if it dies; close() stops it.
+    """
+
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _start(self) -> subprocess.Popen:
+        if not self.running:
+            self._proc = subprocess.Popen(["git", "--git-dir", self.git_dir, "cat-file", "--batch"],
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL)
+        return self._proc
+
+    def lookup(self, name: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        (object id, type, content) of the object `name` (e.g. "<commit>:<path>" or
+        "<commit>^{commit}"), or None when the repository does not have it.
+        """
+        if "\n" in name:
+            return None
+        with self._lock:
+            for attempt in (1, 2):
+                proc = self._start()
+                try:
+                    proc.stdin.write(name.encode("utf-8") + b"\n")
+                    proc.stdin.flush()
+                    header = proc.stdout.readline()
+                    if not header:
+                        raise BrokenPipeError("git cat-file exited")
+                    parts = header.rstrip(b"\n").split(b" ")
+                    # "<oid> <type> <size>", otherwise "<name> missing" or "<name> ambiguous"
+                    if len(parts) != 3 or parts[1] not in _OBJECT_TYPES or not parts[2].isdigit():
+                        return None
+                    size = int(parts[2])
+                    content = proc.stdout.read(size + 1)[:size]
+                    return parts[0].decode("ascii"), parts[1].decode("ascii"), content
+                except (BrokenPipeError, OSError):
+                    self._stop()
+                    if attempt == 2:
+                        raise
+
+    def read_blob(self, name: str) -> Optional[bytes]:
+        found = self.lookup(name)
+        return found[2] if found is not None and found[1] == "blob" else None
+
+    def _stop(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+        finally:
+            proc.stdout.close()
+
+    def close(self) -> None:
+        """Stop the process, e.g. after a fetch; the next lookup starts a new one."""
+        with self._lock:
+            self._stop()
+
+
+class BlobCache:
+    """Thread-safe LRU of file contents, bounded by their total size in bytes."""
+
+    def __init__(self, max_size: int = SNIPPET_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: Hashable, data: bytes) -> None:
+        if len(data) > self.max_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= len(old)
+            self._entries[key] = data
+            self._total += len(data)
+            while self._total > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._total -= len(evicted)
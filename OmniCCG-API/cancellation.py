@@ -0,0 +1,74 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional, Sequence
+
+# How often a running detector is checked for cancellation, and how long it may take to exit
+POLL_INTERVAL = 0.2
+TERMINATE_GRACE = 5.0
+
+
+class AnalysisCancelled(Exception):
+    """Raised at the next check point once an analysis was cancelled."""
+
+
+class CancelToken:
+    """
+    Cancellation request of one analysis. The pipeline calls check() between its stages and starts
+    the clone detectors through run(), which terminates them as soon as the token is cancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise AnalysisCancelled()
+
+    def run(self, args: Sequence[str], check: bool = False, **popen_kwargs) -> int:
+        """
+        Like subprocess.run(args, check=check), but the process (with its children, e.g. the txl
+        processes of nicad6) is terminated once the token is cancelled, and AnalysisCancelled is
+        raised instead of returning.
+        """
+        self.check()
+        if os.name == "posix":
+            # own process group, so the whole tree can be signalled
+            popen_kwargs.setdefault("start_new_session", True)
+        proc = subprocess.Popen(args, **popen_kwargs)
+        terminated_at: Optional[float] = None
+        while True:
+            try:
+                returncode = proc.wait(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if not self.cancelled:
+                    continue
+                if terminated_at is None:
+                    _signal(proc, signal.SIGTERM)
+                    terminated_at = time.monotonic()
+                elif time.monotonic() - terminated_at > TERMINATE_GRACE:
+                    _signal(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        self.check()
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, list(args))
+        return returncode
+
+
+def _signal(proc: subprocess.Popen, sig: int) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
@@ -0,0 +1,74 @@
+import os
+import json
+import zlib
+import pickle
+import hashlib
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+# File signature and layout version of the checkpoint format
+CHECKPOINT_MAGIC = b"OCCGCKPT"
+CHECKPOINT_VERSION = 2
+
+
+@dataclass
+class Checkpoint:
+    # Number of hashes (in GetHashes order) already folded into the genealogy
+    last_index: int
+    # Identifies the hash prefix and the settings the state was computed with
+    hashes_digest: str
+    settings_key: str
+    lineages: List[Any] = field(default_factory=list)
+    densities: List[Tuple[int, float, float]] = field(default_factory=list)
+    elapsed: float = 0.0
+    # Job workspace the fragment paths of the lineages point into
+    workspace_dir: Optional[str] = None
+
+
+def hashes_digest(hashes: List[str]) -> str:
+    return hashlib.sha1("\n".join(hashes).encode("ascii", errors="ignore")).hexdigest()
+
+
+def settings_key(*values) -> str:
+    """Key of the settings a genealogy depends on; a checkpoint is only reused when it matches."""
+    return json.dumps([v if v is None else str(v) for v in values])
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    """
+    Write the checkpoint as magic + version byte + zlib-compressed pickle.
+    The file is replaced atomically, so a crash while saving keeps the previous checkpoint.
+    """
+    payload = zlib.compress(pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL), 6)
+    # Jobs with the same settings may save at the same time; each writes its own temporary file
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "wb") as fp:
+        fp.write(CHECKPOINT_MAGIC)
+        fp.write(bytes([CHECKPOINT_VERSION]))
+        fp.write(payload)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str) -> Optional[Checkpoint]:
+    """Return the checkpoint stored at `path`, or None when it is missing, foreign or corrupt."""
+    try:
+        data = Path(path).read_bytes()
+    except OSError:
+        return None
+    header = len(CHECKPOINT_MAGIC) + 1
+    if len(data) < header or not data.startswith(CHECKPOINT_MAGIC) or data[header - 1] != CHECKPOINT_VERSION:
+        return None
+    try:
+        checkpoint = pickle.loads(zlib.decompress(data[header:]))
+    except Exception:
+        return None
+    return checkpoint if isinstance(checkpoint, Checkpoint) else None
+
+
+def remove_checkpoint(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1 +1,34 @@
-git_repos_to_control = []
\ No newline at end of file
+import threading
+from typing import Dict, List
+
+try:
+    from .cancellation import CancelToken
+except:
+    from cancellation import CancelToken
+
+# Cancellation tokens of the extractions currently running, per repository URL
+_running: Dict[str, List[CancelToken]] = {}
+_lock = threading.Lock()
+
+
+def register(git_url: str, token: CancelToken) -> None:
+    with _lock:
+        _running.setdefault(git_url, []).append(token)
+
+
+def unregister(git_url: str, token: CancelToken) -> None:
+    with _lock:
+        tokens = _running.get(git_url, [])
+        if token in tokens:
+            tokens.remove(token)
+        if not tokens:
+            _running.pop(git_url, None)
+
+
+def cancel_repository(git_url: str) -> int:
+    """Cancel every running extraction of git_url; returns how many were cancelled."""
+    with _lock:
+        tokens = list(_running.get(git_url, []))
+    for token in tokens:
+        token.cancel()
+    return len(tokens)
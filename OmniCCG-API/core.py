@@ -3,32 +3,39 @@ import json
 import time
 import shutil
 import hashlib
-import re
 import platform
 import requests
 import subprocess
 import stat
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from xml.dom import minidom
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-from typing import Union, Dict, Any, List, Iterable, Optional, Tuple
+from typing import Union, Dict, Any, List, Iterable, Optional, Tuple, Callable
 from git import Repo
 from git.exc import BadName
 
 try:
-    from .control import git_repos_to_control
+    from .cancellation import CancelToken, AnalysisCancelled
+    from .checkpoint import Checkpoint, hashes_digest, settings_key, save_checkpoint, load_checkpoint, remove_checkpoint
+    from .clone_xml import iter_clone_classes
     from .compute_time import timed
     from .get_method_name import get_enclosing_java_method
     from .metrics import generate_detailed_report
     from .analysis import count_java_methods_in_file
+    from .workspaces import Workspace, job_workspace
+    from .result_store import results
 except:
-    from control import git_repos_to_control
+    from cancellation import CancelToken, AnalysisCancelled
+    from checkpoint import Checkpoint, hashes_digest, settings_key, save_checkpoint, load_checkpoint, remove_checkpoint
+    from clone_xml import iter_clone_classes
     from compute_time import timed
     from get_method_name import get_enclosing_java_method
     from metrics import generate_detailed_report
     from analysis import count_java_methods_in_file
+    from workspaces import Workspace, job_workspace
+    from result_store import results
 
 # =========================
 # Cross‑platform helpers
@@ -195,6 +202,9 @@ class Settings:
     use_leaps: bool = False
     commit_leaps: Optional[int] = None
 
+    # Continue from the checkpoint of a cancelled extraction
+    resume: bool = False
+
 @dataclass
 class Paths:
     script_dir: str = "scripts"
@@ -213,6 +223,7 @@ class Paths:
     metrics_xml: str = field(default_factory=lambda: os.path.join("workspace", "metrics.xml"))  # overwritten in main()
     p_res_file: str = field(default_factory=lambda: os.path.join("final_results", "production_results.xml"))
     p_dens_file: str = field(default_factory=lambda: os.path.join("final_results", "production_density.csv"))
+    checkpoint_file: str = "checkpoint.bin"  # overwritten in main()
 
 @dataclass
 class State:
@@ -226,6 +237,8 @@ class Context:
     settings: Settings
     paths: Paths
     state: State
+    # Checked between pipeline stages; never cancelled unless the caller passes its own
+    cancel: CancelToken = field(default_factory=CancelToken)
 
 
 # =========================
@@ -490,56 +503,6 @@ def GetPattern(v1: CloneVersion, v2: CloneVersion):
 # Git & dataset pipeline
 # =========================
 
-def SetupRepo(ctx: "Context"):
-    s, p = ctx.settings, ctx.paths
-
-    # Local path: copy as-is
-    if s.local_path:
-        src = Path(s.local_path)
-        dest = Path(p.repo_dir)
-        dest.parent.mkdir(parents=True, exist_ok=True)
-        if dest.exists():
-            safe_rmtree(dest)
-        shutil.copytree(src, dest)
-        return
-
-    print("Setting up local directory for git repository " + s.git_url)
-
-    repo_git_dir = os.path.join(p.repo_dir, ".git")
-
-    if os.path.isdir(repo_git_dir):
-        # Open with GitPython and fetch/pull safely (cross‑platform)
-        repo = Repo(p.repo_dir)
-        try:
-            # Clean Git locks before operations
-            clean_git_locks(p.repo_dir)
-            
-            # Fetch all remotes
-            for remote in repo.remotes:
-                remote.fetch(prune=True)
-            # Try fast-forward pull on active branch (if not detached)
-            if not repo.head.is_detached:
-                try:
-                    repo.git.pull("--ff-only")
-                except Exception:
-                    printInfo("Pull --ff-only skipped (non-FF or no upstream). Fetched refs only.")
-            else:
-                printInfo("Detached HEAD or no branch; fetched refs only.")
-        except Exception as e:
-            printWarning(f"Git fetch/pull encountered an issue: {e}")
-        return
-
-    # Not a git repo but folder exists → clean it
-    if os.path.isdir(p.repo_dir):
-        clean_git_locks(p.repo_dir)
-        safe_rmtree(p.repo_dir)
-
-    # Clone fresh (GitPython)
-    os.makedirs(p.ws_dir, exist_ok=True)
-    Repo.clone_from(s.git_url, p.repo_dir)
-    print(" Repository setup complete.\n")
-
-
 def PrepareGitHistory(ctx: "Context"):
     print("Getting git history")
     s, p = ctx.settings, ctx.paths
@@ -654,73 +617,81 @@ def PrepareSourceCode(ctx: "Context") -> bool:
     return found
 
 
-def StartFromPreviousVersion(ctx: "Context") -> int:
-    p = ctx.paths
-    if not os.path.exists(p.res_dir):
-        os.makedirs(p.res_dir, exist_ok=True)
-        return 0
-    return 0
+def GenealogySettingsKey(ctx: "Context") -> str:
+    s = ctx.settings
+    return settings_key(s.git_url, s.local_path, s.clone_detector_tool, s.detection_api)
 
 
-def parse_clones_xml(xml_input: Union[str, bytes]) -> Dict[str, Any]:
-    if isinstance(xml_input, (bytes,)):
-        root = ET.fromstring(xml_input)
-    elif isinstance(xml_input, str) and (xml_input.strip().startswith("<") or "\n" in xml_input):
-        root = ET.fromstring(xml_input)
-    else:
-        if not os.path.exists(xml_input):
-            raise FileNotFoundError(f"XML file not found: {xml_input}")
-        tree = ET.parse(xml_input)
-        root = tree.getroot()
+def StartFromPreviousVersion(ctx: "Context", hashes: List[str]) -> Optional[Checkpoint]:
+    """
+    Restore the genealogy state of the checkpoint left by a cancelled extraction when resuming.
+    The checkpoint is only used if it was taken with the same settings and its processed
+    hashes are still the first hashes of the current history. An extraction that does not
+    resume leaves it in place: it is shared by the jobs with the same settings, and is only
+    removed once one of them completes.
+    """
+    s, p, st = ctx.settings, ctx.paths, ctx.state
+    os.makedirs(p.res_dir, exist_ok=True)
+    if not s.resume:
+        return None
+
+    checkpoint = load_checkpoint(p.checkpoint_file)
+    if checkpoint is None:
+        printWarning("No usable checkpoint found; starting from the first commit.")
+        return None
+    if (
+        checkpoint.settings_key != GenealogySettingsKey(ctx)
+        or checkpoint.last_index > len(hashes)
+        or checkpoint.hashes_digest != hashes_digest(hashes[:checkpoint.last_index])
+    ):
+        printWarning("Checkpoint does not match the current settings or commit history; starting from the first commit.")
+        return None
+
+    RelocateLineages(checkpoint.lineages, checkpoint.workspace_dir, p.ws_dir)
+    st.p_lin_data = checkpoint.lineages
+    st.p_dens_data = checkpoint.densities
+    printInfo(f"Resuming after commit nr.{checkpoint.last_index} of {len(hashes)}")
+    return checkpoint
+
+
+def SaveCheckpoint(ctx: "Context", hashes: List[str], last_index: int, elapsed: float) -> None:
+    st = ctx.state
+    save_checkpoint(ctx.paths.checkpoint_file, Checkpoint(
+        last_index=last_index,
+        hashes_digest=hashes_digest(hashes[:last_index]),
+        settings_key=GenealogySettingsKey(ctx),
+        lineages=st.p_lin_data,
+        densities=st.p_dens_data,
+        elapsed=elapsed,
+        workspace_dir=ctx.paths.ws_dir,
+    ))
+
+
+def RelocateLineages(lineages: List["Lineage"], old_dir: Optional[str], new_dir: str) -> None:
+    """
+    Point the fragments of lineages restored from the workspace of an earlier job at the files of
+    the current workspace, so that they match the clone classes detected from now on.
+    """
+    if not old_dir or old_dir == new_dir:
+        return
+    for lineage in lineages:
+        for version in lineage.versions:
+            fragments = list(version.removed_fragments)
+            if version.cloneclass is not None:
+                fragments += version.cloneclass.fragments
+            for fragment in fragments:
+                if fragment.file.startswith(old_dir):
+                    fragment.file = new_dir + fragment.file[len(old_dir):]
+                    fragment.hash = hashlib.sha256(f"{fragment.file}{fragment.ls}{fragment.le}".encode("utf-8")).hexdigest()[:7]
 
-    if root.tag != "clones":
-        raise ValueError(f"Unexpected root tag '{root.tag}', expected 'clones'.")
 
+def parse_clones_xml(xml_input: Union[str, bytes]) -> Dict[str, Any]:
     result: Dict[str, List[Dict[str, Any]]] = {"clones": []}
-    for class_el in root.findall("class"):
-        class_dict = {"sources": []}
-        for src in class_el.findall("source"):
-            file_path = src.get("file")
-            startline = int(src.get("startline")) if src.get("startline") is not None else None
-            endline = int(src.get("endline")) if src.get("endline") is not None else None
-            class_dict["sources"].append({"file": file_path, "startline": startline, "endline": endline})
-        result["clones"].append(class_dict)
+    for sources in iter_clone_classes(xml_input):
+        result["clones"].append({"sources": [{"file": f, "startline": s, "endline": e} for f, s, e in sources]})
     return result
 
 
-def parse_simian_to_clones(simian_xml: str) -> None:
-    raw = open(simian_xml, 'r', encoding='utf-8', errors='ignore').read()
-    pos = raw.find("<simian")
-    if pos == -1:
-        pos = raw.find("<")
-        if pos == -1:
-            raise ValueError("Content does not appear to contain valid XML.")
-    xml = raw[pos:]
-    xml = re.sub(r"<!--.*?-->", "", xml, flags=re.DOTALL)
-    xml = re.sub(r"<\?.*?\?>", "", xml, flags=re.DOTALL)
-
-    clean_xml = xml.strip()
-    root = ET.fromstring(clean_xml)
-    check = root.find("check")
-    if check is None:
-        raise ValueError("Invalid XML: <check> node not found.")
-
-    clones = ET.Element("clones")
-    for set_node in check.findall("set"):
-        class_el = ET.SubElement(clones, "class")
-        for block in set_node.findall("block"):
-            source_file = block.get("sourceFile")
-            start = block.get("startLineNumber")
-            end = block.get("endLineNumber")
-            ET.SubElement(class_el, "source", {"file": source_file, "startline": start or "", "endline": end or ""})
-
-    rough = ET.tostring(clones, encoding="utf-8")
-    reparsed = minidom.parseString(rough)
-    result_xml = reparsed.toprettyxml(indent="  ", encoding="utf-8").decode("utf-8")
-    with open(simian_xml, "w", encoding="utf-8") as f:
-        f.write(result_xml)
-
-
 def find_method_end(lines, decl_line, brace_col):
     depth = 0
     for li in range(decl_line - 1, len(lines)):
@@ -798,13 +769,18 @@ def RunCloneDetection(ctx: "Context", current_hash: str):
         print(" >>> Running nicad6...")
         os.makedirs(p.cur_res_dir, exist_ok=True)
 
-        subprocess.run(["./nicad6", "functions", "java", p.prod_data_dir],
-                    cwd=Path(p.tools_dir) / "NiCad",
-                    check=True)
+        clones_dir = Path(f"{p.prod_data_dir}_functions-clones")
+        try:
+            ctx.cancel.run(["./nicad6", "functions", "java", p.prod_data_dir],
+                           cwd=Path(p.tools_dir) / "NiCad",
+                           check=True)
+        except AnalysisCancelled:
+            # nicad6 was terminated: drop its partial output right away
+            shutil.rmtree(clones_dir, ignore_errors=True)
+            raise
 
         nicad_xml = f"{p.prod_data_dir}_functions-clones/production_functions-clones-0.30-classes.xml"
         shutil.move(nicad_xml, p.clone_detector_xml)
-        clones_dir = Path(f"{p.prod_data_dir}_functions-clones")
         shutil.rmtree(clones_dir, ignore_errors=True)
 
         data_dir = Path(ctx.paths.data_dir)
@@ -816,18 +792,15 @@ def RunCloneDetection(ctx: "Context", current_hash: str):
             except PermissionError:
                 pass
 
-        xml_path = Path(p.clone_detector_xml)
-        new_xml_data = xml_path.read_text(encoding="utf-8")
-        xml_path.write_text(new_xml_data, encoding="utf-8")
         return
 
     if tool == "simian":
         print(" >>> Running Simian...")
-        java_jar_command = f"java -jar {os.path.join(p.tools_dir, 'simian', 'simian-4.0.0.jar')}"
-        options_command = "-format  ter=xml -threshold=20"
-        simian_command = f'{java_jar_command} {options_command} "{p.prod_data_dir}"/**/*.java > "{p.clone_detector_xml}"'
-        os.system(simian_command)
-        parse_simian_to_clones(p.clone_detector_xml)
+        simian_command = ["java", "-jar", os.path.join(p.tools_dir, 'simian', 'simian-4.0.0.jar'),
+                          "-formatter=xml", "-threshold=20", f"{p.prod_data_dir}/**/*.java"]
+        # Simian expands the pattern itself; its exit code reports whether duplicates were found
+        with open(p.clone_detector_xml, "wb") as out:
+            ctx.cancel.run(simian_command, stdout=out)
         print("Finished clone detection.\n")
         return
 
@@ -840,17 +813,12 @@ def RunCloneDetection(ctx: "Context", current_hash: str):
 def parseCloneClassFile(ctx: "Context", cloneclass_filename: str) -> List[CloneClass]:
     cloneclasses: List[CloneClass] = []
     try:
-        file_xml = ET.parse(cloneclass_filename)
-        root = file_xml.getroot()
-        for child in root:
-            cc = CloneClass()
-            fragments = list(child)
+        # Streamed: the detector XML is never held in memory as a whole
+        for fragments in iter_clone_classes(cloneclass_filename):
             if not fragments:
                 continue
-            for fragment in fragments:
-                file_path = fragment.get("file")
-                startline = int(fragment.get("startline"))
-                endline = int(fragment.get("endline"))
+            cc = CloneClass()
+            for file_path, startline, endline in fragments:
                 method_name = get_enclosing_java_method(file_path, startline, endline)
                 cf = CloneFragment(file_path, startline, endline, method_name)
                 cf.function_hash = hash(GetCloneFragment(cf.file, cf.ls, cf.le))
@@ -1150,24 +1118,11 @@ def init_settings_from_user(general_settings: Dict[str, Any]) -> Settings:
         use_merge_commits=bool(merge_commit),
         use_leaps=bool(fixed_leaps),
         commit_leaps=fixed_leaps,
+
+        resume=bool(user.get("resume")),    # optional; continue a cancelled extraction
     )
     return s
 
-def _derive_repo_name(settings: Settings) -> str:
-    """
-    Determine a stable repository folder name from git_url or local_path.
-    Falls back to 'repo' if nothing can be inferred.
-    """
-    if settings.local_path:
-        return os.path.basename(os.path.normpath(settings.local_path)) or "repo"
-    url = (settings.git_url or "").rstrip("/")
-    base = os.path.basename(url) or "repo"
-    if base.endswith(".git"):
-        base = base[:-4]
-    base = os.path.splitext(base)[0] or base
-    return base or "repo"
-
-
 # =========================
 # Main function (no globals)
 # =========================
@@ -1199,13 +1154,40 @@ def validate_user_input_or_raise(general_settings: Dict[str, Any]) -> None:
     if dp is not None and not dp_ok:
         raise ValueError("'days_prior' must be an integer > 0 when provided.")
 
+def ReportProgress(progress: Optional[Callable[[Dict[str, Any]], None]], stage: str, hashes: List[str],
+                   processed: int, current_hash: Optional[str], total_time: float, analysis_index: int):
+    """Hand the per-commit progress (commit index, average iteration time, ETA) to the caller, if it asked for it."""
+    if progress is None:
+        return
+    avg = total_time / analysis_index if analysis_index else 0.0
+    progress({
+        "stage": stage,
+        "current_commit": current_hash,
+        "processed_commits": processed,
+        "total_commits": len(hashes),
+        "average_iteration_time": avg,
+        "eta_seconds": avg * (len(hashes) - processed) if analysis_index else None,
+    })
+
+
 @timed()
-def execute_omniccg(general_settings: Dict[str, Any]) -> str:
+def execute_omniccg(general_settings: Dict[str, Any],
+                    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    cancel: Optional[CancelToken] = None) -> Tuple[str, Optional[str], Optional[str], int]:
+    """
+    Extract the clone genealogy. Returns the genealogy XML, the lineages XML, the metrics XML and
+    the id of the run in the result store. When given, `progress` is called with a dict describing
+    the analysis stage and the commit being analysed, before every commit and once at the end.
+
+    When `cancel` is cancelled, the extraction stops at the next stage boundary (a running clone
+    detector is terminated), the genealogy of the processed commits is saved as a checkpoint to
+    continue from with `resume`, and AnalysisCancelled is raised.
+    """
     validate_user_input_or_raise(general_settings)
     settings = init_settings_from_user(general_settings)
     paths = Paths()
     state = State()
-    ctx = Context(settings=settings, paths=paths, state=state)
+    ctx = Context(settings=settings, paths=paths, state=state, cancel=cancel or CancelToken())
 
     # --- NEW: make all folders live inside the installed package directory ---
     pkg_root = Path(__file__).resolve().parent            # .../omniccg
@@ -1215,17 +1197,35 @@ def execute_omniccg(general_settings: Dict[str, Any]) -> str:
     paths.tools_dir = os.path.join(pkg_root_str, "tools")
     paths.script_dir = os.path.join(pkg_root_str, "scripts")
 
-    # Workspace (clones, datasets, history) lives under omniccg/cloned_repositories/<repo_name>
-    repo_name = _derive_repo_name(settings)
-    base_dir = os.path.join(pkg_root_str, "cloned_repositories", repo_name)
+    print("STARTING DATA COLLECTION SCRIPT\n")
+    ReportProgress(progress, "setup", [], 0, None, 0, 0)
+    ctx.cancel.check()
+    # Every extraction works in a workspace of its own, cloned from the repository's shared store,
+    # so extractions and snippet lookups of the same repository can run at the same time
+    with job_workspace(settings.local_path or settings.git_url) as workspace:
+        SetWorkspacePaths(ctx, workspace)
+        return ExtractGenealogy(ctx, workspace, progress)
+
+
+def SetWorkspacePaths(ctx: "Context", workspace: Workspace):
+    """
+    Per-commit data (clone, datasets, history, detector output) lives in the job's workspace and
+    is removed with it. Checkpoints and the published results live in the repository directory,
+    cloned_repositories/<repo_name>-<url digest>, shared by all jobs of the repository.
+    """
+    paths = ctx.paths
+    base_dir = workspace.dir
     paths.ws_dir = base_dir
-    paths.repo_dir = os.path.join(base_dir, "repo")
+    paths.repo_dir = workspace.repo_dir
     paths.data_dir = os.path.join(base_dir, "dataset")
     paths.prod_data_dir = os.path.join(paths.data_dir, "production")
     paths.hist_file = os.path.join(base_dir, "githistory.txt")
     paths.metrics_xml = os.path.join(base_dir, "metrics.xml")
     paths.p_res_file = os.path.join(base_dir, "genealogy.xml")
     paths.p_dens_file = os.path.join(base_dir, "density.csv")
+    # One checkpoint per settings, so concurrent extractions with other settings keep theirs
+    digest = hashlib.sha1(GenealogySettingsKey(ctx).encode("utf-8")).hexdigest()[:12]
+    paths.checkpoint_file = os.path.join(workspace.store.dir, "checkpoints", f"{digest}.bin")
 
     # Results & detector output
     paths.res_dir = os.path.join(base_dir, "final_result")
@@ -1236,85 +1236,101 @@ def execute_omniccg(general_settings: Dict[str, Any]) -> str:
     # Ensure folders exist
     os.makedirs(paths.res_dir, exist_ok=True)
     os.makedirs(paths.clone_detector_dir, exist_ok=True)
-    os.makedirs(base_dir, exist_ok=True)
-    # --- 
+    os.makedirs(os.path.dirname(paths.checkpoint_file), exist_ok=True)
 
-    # Cleanup previous results
-    if os.path.isdir(paths.res_dir):
-        safe_rmtree(paths.res_dir)
-        os.makedirs(paths.res_dir, exist_ok=True)
 
-    print("STARTING DATA COLLECTION SCRIPT\n")
-    SetupRepo(ctx)
+def ExtractGenealogy(ctx: "Context", workspace: Workspace,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+    settings, paths = ctx.settings, ctx.paths
+    ctx.cancel.check()
     PrepareGitHistory(ctx)
     hashes = GetHashes(ctx)
     time.sleep(1)
 
-    analysis_index = 0
-    total_time = 0
+    checkpoint = StartFromPreviousVersion(ctx, hashes)
+    start_index = checkpoint.last_index if checkpoint else 0
+    analysis_index = start_index
+    total_time = checkpoint.elapsed if checkpoint else 0
+    processed = start_index
 
     repo = Repo(paths.repo_dir)
 
-    for hash_index in range(len(hashes)):
-        if settings.git_url not in git_repos_to_control:
-            break
+    try:
+        for hash_index in range(start_index, len(hashes)):
+            # Every commit before hash_index is part of the genealogy
+            processed = hash_index
+            ctx.cancel.check()
 
-        iteration_start_time = time.time()
-        analysis_index += 1
-        current_hash = hashes[hash_index]
-        hi_plus = hash_index + 1
+            iteration_start_time = time.time()
+            analysis_index += 1
+            current_hash = hashes[hash_index]
+            hi_plus = hash_index + 1
 
-        printInfo("Analyzing commit nr." + str(hi_plus) + " with hash " + current_hash + f"| total commits: {len(hashes)}")
-        paths.cur_res_dir = os.path.join(paths.res_dir, f"{hi_plus}_{current_hash}")
+            printInfo("Analyzing commit nr." + str(hi_plus) + " with hash " + current_hash + f"| total commits: {len(hashes)}")
+            ReportProgress(progress, "analysis", hashes, hash_index, current_hash, total_time, analysis_index - 1)
+            paths.cur_res_dir = os.path.join(paths.res_dir, f"{hi_plus}_{current_hash}")
 
-        # Ensure we are at the correct commit
-        try:
-            head_short = repo.git.rev_parse("--short", "HEAD")
-        except Exception:
-            head_short = ""
-        if current_hash not in head_short:
+            # Ensure we are at the correct commit
             try:
-                # Clean Git locks before checkout
-                clean_git_locks(paths.repo_dir)
-                repo.git.checkout(current_hash, f=True)
-            except Exception as e:
-                # Retry once after cleaning locks
+                head_short = repo.git.rev_parse("--short", "HEAD")
+            except Exception:
+                head_short = ""
+            if current_hash not in head_short:
                 try:
+                    # Clean Git locks before checkout
                     clean_git_locks(paths.repo_dir)
-                    time.sleep(1)
                     repo.git.checkout(current_hash, f=True)
-                except Exception:
-                    raise RuntimeError(f"git checkout {current_hash} failed: {e}")
-            time.sleep(0.5)
+                except Exception as e:
+                    # Retry once after cleaning locks
+                    try:
+                        clean_git_locks(paths.repo_dir)
+                        time.sleep(1)
+                        repo.git.checkout(current_hash, f=True)
+                    except Exception:
+                        raise RuntimeError(f"git checkout {current_hash} failed: {e}")
+                time.sleep(0.5)
+
+            # Prepare source and run detection
+            ctx.cancel.check()
+            if not PrepareSourceCode(ctx):
+                continue
 
-        # Prepare source and run detection
-        if not PrepareSourceCode(ctx):
-            continue
+            ctx.cancel.check()
+            RunCloneDetection(ctx, current_hash)
+            ctx.cancel.check()
+            RunGenealogyAnalysis(ctx, hi_plus, current_hash)
+            WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
 
-        RunCloneDetection(ctx, current_hash)
-        RunGenealogyAnalysis(ctx, hi_plus, current_hash)
-        WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
+            # Cleanup
+            safe_rmtree(paths.cur_res_dir)
 
-        # Cleanup
-        safe_rmtree(paths.cur_res_dir)
+            # Timing
+            iteration_end_time = time.time()
+            iteration_time = iteration_end_time - iteration_start_time
+            total_time += iteration_time
 
-        # Timing
-        iteration_end_time = time.time()
-        iteration_time = iteration_end_time - iteration_start_time
-        total_time += iteration_time
+            print("Iteration finished in " + timeToString(int(iteration_time)))
+            avg = int(total_time / analysis_index) if analysis_index else 0
+            remaining = int((total_time / analysis_index) * (len(hashes) - analysis_index)) if analysis_index else 0
+            print(" >>> Average iteration time: " + timeToString(avg))
+            print(" >>> Estimated remaining time: " + timeToString(remaining))
 
-        print("Iteration finished in " + timeToString(int(iteration_time)))
-        avg = int(total_time / analysis_index) if analysis_index else 0
-        remaining = int((total_time / analysis_index) * (len(hashes) - analysis_index)) if analysis_index else 0
-        print(" >>> Average iteration time: " + timeToString(avg))
-        print(" >>> Estimated remaining time: " + timeToString(remaining))
+            WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
+            time.sleep(0.5)
+    except AnalysisCancelled:
+        # Keep what was processed so far, so that the extraction can be resumed later
+        SaveCheckpoint(ctx, hashes, processed, total_time)
+        printWarning(f"Extraction cancelled after {processed} of {len(hashes)} commit(s). "
+                     "Submit it again with resume to continue from there.")
+        raise
+    remove_checkpoint(paths.checkpoint_file)
 
-        WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
-        time.sleep(0.5)
+    ReportProgress(progress, "metrics", hashes, len(hashes), None, total_time, analysis_index)
 
     # If nothing was accumulated, return a clear XML message
     if len(ctx.state.p_lin_data) == 0:
-        return build_no_clones_message(settings.clone_detector_tool), None, None
+        run_id = StoreRun(ctx, hashes, None)
+        return build_no_clones_message(settings.clone_detector_tool), None, None, run_id
 
     # Otherwise, finalize outputs
     WriteDensityFile(ctx, ctx.state.p_dens_data, paths.p_dens_file)
@@ -1322,6 +1338,16 @@ def execute_omniccg(general_settings: Dict[str, Any]) -> str:
     metrics_xml = generate_detailed_report(lineages_xml, len(hashes), ctx.state.p_dens_data)
     Path(ctx.paths.metrics_xml).write_text(metrics_xml, encoding="utf-8")
     genealogy_xml = build_genealogy_xml(lineages_xml, metrics_xml)
+    # The workspace is removed once the job ends; keep the latest results of the repository
+    for result_file in (paths.p_res_file, paths.p_dens_file, paths.metrics_xml):
+        workspace.publish(result_file)
+    run_id = StoreRun(ctx, hashes, metrics_xml)
 
     print("\nDONE")
-    return genealogy_xml, lineages_xml, metrics_xml
+    return genealogy_xml, lineages_xml, metrics_xml, run_id
+
+
+def StoreRun(ctx: "Context", hashes: List[str], metrics_xml: Optional[str]) -> int:
+    """Persist the finished genealogy in the result store, for the /runs queries."""
+    return results.save_run(ctx.settings.git_url, asdict(ctx.settings), hashes, ctx.state.p_lin_data,
+                            metrics_xml, repo_dir=ctx.paths.repo_dir)
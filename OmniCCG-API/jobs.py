@@ -0,0 +1,190 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    from .cancellation import CancelToken, AnalysisCancelled
+    from .control import register, unregister
+except:
+    from cancellation import CancelToken, AnalysisCancelled
+    from control import register, unregister
+
+# Number of extractions that run at the same time
+DEFAULT_WORKERS = int(os.environ.get("OMNICCG_WORKERS", "2"))
+# Finished jobs kept for /status and /results; the oldest are forgotten first
+MAX_FINISHED_JOBS = int(os.environ.get("OMNICCG_MAX_FINISHED_JOBS", "100"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    task_id: str
+    settings: Dict[str, Any]
+    git_url: str
+    status: str = QUEUED
+    message: str = "Waiting for a free worker"
+    stage: Optional[str] = None
+    current_commit: Optional[str] = None
+    processed_commits: int = 0
+    total_commits: int = 0
+    average_iteration_time: float = 0.0
+    eta_seconds: Optional[float] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    genealogy_xml: Optional[str] = None
+    lineages_xml: Optional[str] = None
+    metrics_xml: Optional[str] = None
+    # Id of the finished run in the result store
+    run_id: Optional[int] = None
+    # Incremented on every change, so that event streams know when to send an update
+    version: int = 0
+    cancel: CancelToken = field(default_factory=CancelToken, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (COMPLETED, ERROR, CANCELLED)
+
+    def to_status(self) -> Dict[str, Any]:
+        if self.status == COMPLETED:
+            percent = 100
+        elif self.total_commits:
+            percent = int(100 * self.processed_commits / self.total_commits)
+        else:
+            percent = 0
+        return {
+            "task_id": self.task_id,
+            "status": self.status,
+            "progress": percent,
+            "message": self.message,
+            "stage": self.stage,
+            "current_commit": self.current_commit,
+            "processed_commits": self.processed_commits,
+            "total_commits": self.total_commits,
+            "average_iteration_time": round(self.average_iteration_time, 3),
+            "eta_seconds": None if self.eta_seconds is None else round(self.eta_seconds, 1),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "run_id": self.run_id,
+        }
+
+
+class JobManager:
+    """
+    Runs genealogy extractions on a pool of worker threads. Every submitted extraction gets a task
+    id, its progress is updated after each commit and its result is kept until it is one of the
+    MAX_FINISHED_JOBS oldest finished jobs.
+
+    Every job works in a workspace of its own (see workspaces.py), so jobs of the same repository
+    run at the same time.
+    """
+
+    def __init__(self, execute: Callable[..., Any], workers: int = DEFAULT_WORKERS,
+                 max_finished: int = MAX_FINISHED_JOBS):
+        self._execute = execute
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="omniccg-job")
+        self._max_finished = max_finished
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def submit(self, settings: Dict[str, Any]) -> Job:
+        job = Job(task_id=uuid.uuid4().hex, settings=settings, git_url=settings.get("git_repository", ""))
+        with self._lock:
+            self._jobs[job.task_id] = job
+            self._forget_finished()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, task_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(task_id)
+
+    def cancel(self, task_id: str) -> Optional[Job]:
+        """
+        Cancel a job: a queued job never starts, a running one stops at its next stage boundary
+        (terminating a running detector) and leaves a checkpoint to resume from.
+        """
+        job = self.get(task_id)
+        if job is None or job.done:
+            return job
+        job.cancel.cancel()
+        self._update(job, message="Cancelling")
+        return job
+
+    def _update(self, job: Job, **changes) -> None:
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._changed.notify_all()
+
+    def _on_progress(self, job: Job, info: Dict[str, Any]) -> None:
+        stage = info.get("stage")
+        if stage == "setup":
+            message = "Cloning the repository and reading its history"
+        elif stage == "metrics":
+            message = "Computing metrics"
+        else:
+            message = f"Analyzing commit {info['processed_commits'] + 1} of {info['total_commits']}"
+        self._update(job, message=message, **info)
+
+    def _run(self, job: Job) -> None:
+        if job.cancel.cancelled:
+            self._update(job, status=CANCELLED, finished=time.time(), message="Cancelled before it started")
+            return
+        self._update(job, status=RUNNING, started=time.time(), message="Starting extraction")
+        # /stop_detect_clones cancels every job of the repository
+        register(job.git_url, job.cancel)
+        try:
+            genealogy_xml, lineages_xml, metrics_xml, run_id = self._execute(
+                job.settings, progress=lambda info: self._on_progress(job, info), cancel=job.cancel)
+        except AnalysisCancelled:
+            self._update(job, status=CANCELLED, finished=time.time(),
+                         message="Cancelled; submit it again with resume to continue")
+            return
+        except Exception as e:
+            self._update(job, status=ERROR, finished=time.time(), message=f"{type(e).__name__}: {e}")
+            return
+        finally:
+            unregister(job.git_url, job.cancel)
+        self._update(job, status=COMPLETED, finished=time.time(), message="Extraction finished",
+                     genealogy_xml=genealogy_xml, lineages_xml=lineages_xml, metrics_xml=metrics_xml,
+                     run_id=run_id, eta_seconds=0.0)
+
+    def _forget_finished(self) -> None:
+        finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.finished or 0)
+        for job in finished[:max(0, len(finished) - self._max_finished)]:
+            del self._jobs[job.task_id]
+
+    def events(self, task_id: str, keepalive: float = 15.0) -> Iterator[Dict[str, Any]]:
+        """
+        Status of the job after every change, starting with the current one; None is yielded
+        when nothing changed for `keepalive` seconds. Ends once the job finished.
+        """
+        seen = -1
+        while True:
+            with self._changed:
+                job = self._jobs.get(task_id)
+                if job is None:
+                    return
+                if job.version == seen:
+                    self._changed.wait_for(lambda: job.version != seen, timeout=keepalive)
+                if job.version == seen:
+                    status = None
+                else:
+                    seen = job.version
+                    status = job.to_status()
+            yield status
+            if status is not None and status["status"] in (COMPLETED, ERROR, CANCELLED):
+                return
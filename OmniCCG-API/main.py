@@ -1,14 +1,21 @@
 from flask_cors import CORS
-from core import execute_omniccg
+from core import execute_omniccg, validate_user_input_or_raise
+import json
 import subprocess
-from flask import Flask, Response, request, jsonify
-from get_code_snippets import _ensure_repo, _checkout, _safe_repo_path, _slice_lines, _read_text_with_fallback, _clean_git_locks
+from flask import Flask, Response, request, jsonify, stream_with_context
+from get_code_snippets import _repo_relative_path, _slice_lines, _decode_text
 from pathlib import Path
-from control import git_repos_to_control
+from cancellation import CancelToken, AnalysisCancelled
+from control import register, unregister, cancel_repository
+from jobs import JobManager, COMPLETED, ERROR, CANCELLED
+from workspaces import repository, repository_dir
+from result_store import results as result_store
 
 app = Flask(__name__)
 CORS(app)   
 
+jobs = JobManager(execute_omniccg)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -18,81 +25,183 @@ def health():
 def detect_clones():
     general_settings = request.get_json(silent=True)
     git_repository = general_settings.get("git_repository")
-    git_repos_to_control.append(git_repository)
-    xml_obj, _, _  = execute_omniccg(general_settings) 
-    git_repos_to_control.remove(git_repository)
-    return Response(xml_obj, status=200, mimetype="application/xml")
+    token = CancelToken()
+    register(git_repository, token)
+    try:
+        xml_obj, _, _, run_id = execute_omniccg(general_settings, cancel=token)
+    except AnalysisCancelled:
+        return jsonify({
+            "message": f"Genealogy extraction from {git_repository} was cancelled; "
+                       "send it again with user_settings.resume to continue.",
+        }), 409
+    finally:
+        unregister(git_repository, token)
+    # The stored run can be queried through /runs/<run_id>/...
+    return Response(xml_obj, status=200, mimetype="application/xml", headers={"X-OmniCCG-Run-Id": str(run_id)})
+
+
+def _analysis_settings(payload):
+    """
+    Settings of an /analyze request. Besides the /detect_clones body, the web client's shape is
+    accepted: the repository given as user_settings.repo_url and 'days_pior' for days_prior.
+    """
+    settings = dict(payload)
+    user = dict(settings.get("user_settings") or {})
+    if not settings.get("git_repository") and user.get("repo_url"):
+        settings["git_repository"] = user.pop("repo_url")
+    if "days_pior" in user and user.get("days_prior") is None:
+        user["days_prior"] = user.pop("days_pior")
+    settings["user_settings"] = user
+    return settings
+
+
+@app.post("/analyze")
+def analyze():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object with the analysis settings."}), 400
+    settings = _analysis_settings(payload)
+    try:
+        validate_user_input_or_raise(settings)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job = jobs.submit(settings)
+    return jsonify({"task_id": job.task_id, "status": job.status}), 202
+
+
+@app.get("/status/<task_id>")
+def status(task_id):
+    job = jobs.get(task_id)
+    if job is None:
+        return jsonify({"error": f"Unknown task: {task_id}"}), 404
+    return jsonify(job.to_status()), 200
+
+
+@app.get("/results/<task_id>")
+def results(task_id):
+    job = jobs.get(task_id)
+    if job is None:
+        return jsonify({"error": f"Unknown task: {task_id}"}), 404
+    if job.status == ERROR:
+        return jsonify({"error": job.message, "status": job.status}), 500
+    if job.status == CANCELLED:
+        return jsonify({"error": job.message, "status": job.status}), 410
+    if job.status != COMPLETED:
+        return jsonify({"error": "The analysis has not finished yet.", "status": job.status}), 409
+    return jsonify({
+        "task_id": job.task_id,
+        "run_id": job.run_id,
+        "xml_data": job.genealogy_xml,
+        "metrics": job.metrics_xml,
+    }), 200
+
+
+@app.get("/events/<task_id>")
+def events(task_id):
+    """Server-sent events: a 'progress' event after every change of the task, until it finishes."""
+    if jobs.get(task_id) is None:
+        return jsonify({"error": f"Unknown task: {task_id}"}), 404
+
+    def stream():
+        for state in jobs.events(task_id):
+            if state is None:
+                # comment line, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/cancel/<task_id>")
+def cancel(task_id):
+    job = jobs.cancel(task_id)
+    if job is None:
+        return jsonify({"error": f"Unknown task: {task_id}"}), 404
+    return jsonify(job.to_status()), 202
 
 
 @app.post("/stop_detect_clones")
 def stop_detect_clones():
-    git_url = request.get_json(silent=True).get("gir_url")
-    git_repos_to_control.remove(git_url)
+    payload = request.get_json(silent=True) or {}
+    # "gir_url" is still accepted from older web clients
+    git_url = payload.get("git_url") or payload.get("gir_url")
+    if not git_url:
+        return jsonify({"error": "Missing required field: git_url."}), 400
+    cancelled = cancel_repository(git_url)
     return jsonify({
         "message": f"Stop genealogy extraction from the repository: {git_url}",
+        "cancelled": cancelled,
     }), 200
 
 
+def _snippet(store, default_commit, src, oids):
+    fpath = src.get("file") or src.get("path")
+    startline = src.get("startline") or src.get("start") or src.get("ls")
+    endline = src.get("endline") or src.get("end") or src.get("le")
+    commit = src.get("commit") or default_commit
+
+    item = {
+        "commit": commit,
+        "file": fpath,
+        "startline": startline,
+        "endline": endline,
+    }
+
+    if not fpath or not commit or startline is None or endline is None:
+        item["error"] = "Invalid item. Required keys: file, startline, endline (and commit, unless given for the request)."
+        return item
+
+    try:
+        item["file"] = _repo_relative_path(fpath)
+        oid = oids.get(commit)
+        if oid is None:
+            item["error"] = f"Commit not found: {commit}"
+            return item
+        data = store.read_blob(oid, item["file"])
+        if data is None:
+            item["error"] = f"File not found at commit {commit}: {item['file']}"
+        else:
+            item["content"] = _slice_lines(_decode_text(data), int(startline), int(endline))
+    except Exception as e:
+        item["error"] = f"{type(e).__name__}: {e}"
+    return item
+
+
 @app.post("/get_code_snippets")
 def snippets():
+    """
+    Snippets of many (commit, file, line range) items in one call. Every item may name its own
+    commit; items without one use the request's commit.
+    """
     payload = request.get_json(silent=True) or {}
     git_url = payload.get("git_url", "")
     commit = payload.get("commit", "")
     sources = payload.get("sources") or payload.get("items") or []
 
-    git_repos_to_control.append(git_url)
-
-    if not git_url or not commit or not isinstance(sources, list):
+    if not git_url or not isinstance(sources, list) or not all(isinstance(src, dict) for src in sources):
         return jsonify({
-            "error": "Missing or invalid fields. Required: git_url (str), commit (str), sources (list)."
+            "error": "Missing or invalid fields. Required: git_url (str), sources (list), "
+                     "and commit (str) for the sources without their own."
         }), 400
 
+    commits = {src.get("commit") or commit for src in sources} - {""}
+    results = []
     try:
-        repo_dir = _ensure_repo(git_url)
-        _checkout(repo_dir, commit)
+        # Read from the shared store of the repository: no checkout, so running extractions and
+        # other lookups of the repository are not disturbed; it is only fetched when a commit is new
+        with repository(git_url, commits) as store:
+            repo_dir = store.git_dir
+            # branches, tags and abbreviated ids resolve once per request; files are read by commit id
+            oids = {c: store.resolve_commit(c) for c in commits}
+            for src in sources:
+                results.append(_snippet(store, commit, src, oids))
     except subprocess.CalledProcessError as e:
-        error_msg = f"Git operation failed: {e}"
-        if "index.lock" in str(e) or "another git process" in str(e).lower():
-            error_msg += "\nGit lock file issue - attempting to clean and retry..."
-            try:
-                # Try to clean locks and retry
-                _clean_git_locks(repo_dir)
-                _checkout(repo_dir, commit)
-            except Exception as retry_error:
-                return jsonify({"error": f"Git retry failed: {retry_error}"}), 500
-        else:
-            return jsonify({"error": error_msg}), 500
+        return jsonify({"error": f"Git operation failed: {(e.stderr or '').strip() or e}"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    results = []
-    for src in sources:
-        fpath = src.get("file") or src.get("path")
-        startline = src.get("startline") or src.get("start") or src.get("ls")
-        endline = src.get("endline") or src.get("end") or src.get("le")
-
-        repo_name = git_url.split('/')[-1]
-        item = {
-            "file": fpath.split(f'{repo_name}/repo/')[-1],
-            "startline": startline,
-            "endline": endline,
-        }
-
-        if not fpath or startline is None or endline is None:
-            item["error"] = "Invalid item. Required keys: file, startline, endline."
-            results.append(item)
-            continue
-
-        try:
-            abs_path = _safe_repo_path(repo_dir, fpath)
-            text = _read_text_with_fallback(str(abs_path))
-            snippet = _slice_lines(text, int(startline), int(endline))
-            item["content"] = snippet
-        except Exception as e:
-            item["error"] = f"{type(e).__name__}: {e}"
-
-        results.append(item)
-
     return jsonify({
         "repo_dir": repo_dir,
         "commit": commit,
@@ -105,13 +214,103 @@ def snippets():
 def get_metrics():
     payload = request.get_json(silent=True) or {}
     git_url = payload.get("git_url", "")
-    project = git_url.split('/')[-1]
-    base_dir = Path.cwd() / "cloned_repositories" / project
-    metrics_path = (base_dir / "metrics.xml").resolve()
-    xml_result = open(metrics_path, 'r').read()
-    
+    # Metrics of the latest stored run; runs older than the result store only left the file
+    run_id = result_store.latest_run_id(git_url)
+    xml_result = result_store.metrics_xml(run_id) if run_id is not None else None
+    if xml_result is None:
+        metrics_path = Path(repository_dir(git_url)) / "metrics.xml"
+        if not metrics_path.is_file():
+            return jsonify({"error": f"No metrics for the repository: {git_url}"}), 404
+        xml_result = metrics_path.read_text(encoding="utf-8")
+
     return Response(xml_result, status=200, mimetype="application/xml")
 
 
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+def _page():
+    """(page, per_page) of a paginated query; pages start at 1."""
+    page = int(request.args.get("page", 1))
+    per_page = int(request.args.get("per_page", DEFAULT_PER_PAGE))
+    if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+        raise ValueError(f"page must be >= 1 and per_page between 1 and {MAX_PER_PAGE}")
+    return page, per_page
+
+
+def _paginated(key, total, items, page, per_page, **extra):
+    return jsonify({**extra, "total": total, "page": page, "per_page": per_page, key: items}), 200
+
+
+@app.get("/runs")
+def runs():
+    """Stored runs, newest first; ?git_url= restricts them to one repository."""
+    try:
+        page, per_page = _page()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    total, items = result_store.runs(request.args.get("git_url"), (page - 1) * per_page, per_page)
+    return _paginated("runs", total, items, page, per_page)
+
+
+@app.get("/runs/<int:run_id>")
+def run(run_id):
+    summary = result_store.run(run_id)
+    if summary is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return jsonify(summary), 200
+
+
+@app.get("/runs/<int:run_id>/metrics")
+def run_metrics(run_id):
+    if result_store.run(run_id) is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return Response(result_store.metrics_xml(run_id) or "", status=200, mimetype="application/xml")
+
+
+@app.get("/runs/<int:run_id>/lineages")
+def run_lineages(run_id):
+    """
+    Lineages of a run, a page at a time, each with the fragments of its last version. Filters:
+      file=<path>                  lineages with a fragment in the file in any version
+      alive_at=<commit nr | hash>  lineages that exist at the commit
+      category=same|consistent|inconsistent
+      status=alive|dead
+    """
+    if result_store.run(run_id) is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    args = request.args
+    try:
+        page, per_page = _page()
+        file = _repo_relative_path(args["file"]) if args.get("file") else None
+        alive_at = None
+        if args.get("alive_at"):
+            alive_at = result_store.commit_nr(run_id, args["alive_at"])
+            if alive_at is None:
+                raise ValueError(f"Unknown commit of run {run_id}: {args['alive_at']}")
+        category = (args.get("category") or "").lower() or None
+        if category not in (None, "same", "consistent", "inconsistent"):
+            raise ValueError("category must be one of: same, consistent, inconsistent")
+        status = (args.get("status") or "").lower() or None
+        if status not in (None, "alive", "dead"):
+            raise ValueError("status must be alive or dead")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    total, items = result_store.lineages(run_id, file=file, alive_at=alive_at, category=category,
+                                         dead=None if status is None else status == "dead",
+                                         offset=(page - 1) * per_page, limit=per_page)
+    return _paginated("lineages", total, items, page, per_page, run_id=run_id)
+
+
+@app.get("/runs/<int:run_id>/lineages/<int:lineage_id>")
+def run_lineage(run_id, lineage_id):
+    lineage = result_store.lineage(run_id, lineage_id)
+    if lineage is None:
+        return jsonify({"error": f"Unknown lineage {lineage_id} of run {run_id}"}), 404
+    return jsonify(lineage), 200
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
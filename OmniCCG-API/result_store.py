@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .metrics import classify_lineage_change_category
+    from .workspaces import WORKSPACES_ROOT
+except:
+    from metrics import classify_lineage_change_category
+    from workspaces import WORKSPACES_ROOT
+
+# Database of the finished extractions, shared by all repositories
+RESULTS_DB = os.environ.get("OMNICCG_RESULTS_DB", os.path.join(WORKSPACES_ROOT, "results.sqlite3"))
+# Finished runs kept per repository; older ones are deleted when a new run is stored
+MAX_RUNS_PER_REPOSITORY = int(os.environ.get("OMNICCG_MAX_RUNS_PER_REPOSITORY", "10"))
+# Shortest commit hash prefix accepted in queries (as for git's abbreviated hashes)
+MIN_HASH_PREFIX = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    git_url       TEXT NOT NULL,
+    created       REAL NOT NULL,
+    total_commits INTEGER NOT NULL,
+    settings      TEXT NOT NULL,
+    metrics_xml   TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_repository ON runs (git_url, id);
+
+CREATE TABLE IF NOT EXISTS commits (
+    run_id INTEGER NOT NULL,
+    nr     INTEGER NOT NULL,
+    hash   TEXT NOT NULL,
+    PRIMARY KEY (run_id, nr)
+);
+CREATE INDEX IF NOT EXISTS commits_by_hash ON commits (run_id, hash);
+
+CREATE TABLE IF NOT EXISTS lineages (
+    run_id   INTEGER NOT NULL,
+    id       INTEGER NOT NULL,
+    first_nr INTEGER NOT NULL,
+    last_nr  INTEGER NOT NULL,
+    versions INTEGER NOT NULL,
+    is_dead  INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (run_id, id)
+);
+CREATE INDEX IF NOT EXISTS lineages_by_span ON lineages (run_id, first_nr, last_nr);
+CREATE INDEX IF NOT EXISTS lineages_by_category ON lineages (run_id, category, id);
+
+CREATE TABLE IF NOT EXISTS versions (
+    run_id     INTEGER NOT NULL,
+    lineage_id INTEGER NOT NULL,
+    idx        INTEGER NOT NULL,
+    nr         INTEGER NOT NULL,
+    hash       TEXT NOT NULL,
+    evolution  TEXT,
+    change     TEXT,
+    PRIMARY KEY (run_id, lineage_id, idx)
+);
+
+CREATE TABLE IF NOT EXISTS fragments (
+    run_id        INTEGER NOT NULL,
+    lineage_id    INTEGER NOT NULL,
+    version_idx   INTEGER NOT NULL,
+    file          TEXT NOT NULL,
+    startline     INTEGER NOT NULL,
+    endline       INTEGER NOT NULL,
+    function_hash INTEGER,
+    removed       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS fragments_by_file ON fragments (run_id, file, lineage_id);
+CREATE INDEX IF NOT EXISTS fragments_by_version ON fragments (run_id, lineage_id, version_idx);
+"""
+
+_RUN_TABLES = ("fragments", "versions", "lineages", "commits")
+
+
+def _relative(path: str, repo_dir: Optional[str]) -> str:
+    """Fragment paths point into the job's workspace; they are stored relative to the repository."""
+    if repo_dir:
+        prefix = os.path.join(repo_dir, "")
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+    return path.replace(os.sep, "/")
+
+
+class ResultStore:
+    """
+    Finished genealogies in SQLite, with one row per run, lineage, version and fragment, so that
+    lineages can be queried (by file, by commit, by change category) and paged through instead of
+    handing out the whole genealogy XML. Every thread uses its own connection.
+    """
+
+    def __init__(self, db_path: str = RESULTS_DB, max_runs: int = MAX_RUNS_PER_REPOSITORY):
+        self.db_path = db_path
+        self.max_runs = max_runs
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=60)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._local.db = db
+        return db
+
+    # ---- writing
+
+    def save_run(self, git_url: str, settings: Dict[str, Any], hashes: List[str], lineages: List[Any],
+                 metrics_xml: Optional[str], repo_dir: Optional[str] = None) -> int:
+        """Store a finished extraction (its in-memory lineages) and return the id of the run."""
+        last_version = len(hashes)
+        lineage_rows, version_rows, fragment_rows = [], [], []
+        for lineage_id, lineage in enumerate(lineages, start=1):
+            versions = lineage.versions
+            if not versions:
+                continue
+            nrs = [v.nr for v in versions]
+            changes = [v.change_pattern or "None" for v in versions]
+            lineage_rows.append((lineage_id, min(nrs), max(nrs), len(versions), int(max(nrs) != last_version),
+                                 classify_lineage_change_category(changes)))
+            for idx, version in enumerate(versions):
+                version_rows.append((lineage_id, idx, version.nr, version.hash,
+                                     version.evolution_pattern, version.change_pattern))
+                fragments = version.cloneclass.fragments if version.cloneclass is not None else []
+                for removed, group in ((0, fragments), (1, version.removed_fragments)):
+                    for f in group:
+                        fragment_rows.append((lineage_id, idx, _relative(f.file, repo_dir), f.ls, f.le,
+                                              getattr(f, "function_hash", None), removed))
+
+        db = self._connection()
+        with db:
+            cursor = db.execute(
+                "INSERT INTO runs (git_url, created, total_commits, settings, metrics_xml) VALUES (?, ?, ?, ?, ?)",
+                (git_url, time.time(), last_version, json.dumps(settings, default=str), metrics_xml))
+            run_id = cursor.lastrowid
+            db.executemany("INSERT INTO commits (run_id, nr, hash) VALUES (?, ?, ?)",
+                           ((run_id, nr, h) for nr, h in enumerate(hashes, start=1)))
+            db.executemany("INSERT INTO lineages (run_id, id, first_nr, last_nr, versions, is_dead, category) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", ((run_id, *row) for row in lineage_rows))
+            db.executemany("INSERT INTO versions (run_id, lineage_id, idx, nr, hash, evolution, change) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)", ((run_id, *row) for row in version_rows))
+            db.executemany("INSERT INTO fragments (run_id, lineage_id, version_idx, file, startline, endline, "
+                           "function_hash, removed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           ((run_id, *row) for row in fragment_rows))
+            self._forget_old_runs(db, git_url)
+        return run_id
+
+    def _forget_old_runs(self, db: sqlite3.Connection, git_url: str) -> None:
+        old = [row["id"] for row in db.execute(
+            "SELECT id FROM runs WHERE git_url = ? ORDER BY id DESC LIMIT -1 OFFSET ?", (git_url, self.max_runs))]
+        for run_id in old:
+            for table in _RUN_TABLES:
+                db.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+            db.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    # ---- queries
+
+    def runs(self, git_url: Optional[str] = None, offset: int = 0, limit: int = 50) -> Tuple[int, List[Dict[str, Any]]]:
+        where, args = ("WHERE git_url = ?", [git_url]) if git_url else ("", [])
+        db = self._connection()
+        total = db.execute(f"SELECT COUNT(*) FROM runs {where}", args).fetchone()[0]
+        rows = db.execute(
+            f"SELECT id, git_url, created, total_commits, settings, "
+            f"(SELECT COUNT(*) FROM lineages WHERE run_id = runs.id) AS lineages "
+            f"FROM runs {where} ORDER BY id DESC LIMIT ? OFFSET ?", args + [limit, offset]).fetchall()
+        return total, [self._run_summary(row) for row in rows]
+
+    def run(self, run_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT id, git_url, created, total_commits, settings, "
+            "(SELECT COUNT(*) FROM lineages WHERE run_id = runs.id) AS lineages FROM runs WHERE id = ?",
+            (run_id,)).fetchone()
+        return self._run_summary(row) if row is not None else None
+
+    def latest_run_id(self, git_url: str) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT MAX(id) FROM runs WHERE git_url = ?", (git_url,)).fetchone()
+        return row[0]
+
+    def metrics_xml(self, run_id: int) -> Optional[str]:
+        row = self._connection().execute("SELECT metrics_xml FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def commit_nr(self, run_id: int, commit: str) -> Optional[int]:
+        """
+        Number of a commit of the run, given by its number or (a prefix of) its hash; None if the
+        run has no such commit. Raises ValueError for a hash prefix that is too short or ambiguous.
+        """
+        db = self._connection()
+        if commit.isdigit():
+            row = db.execute("SELECT total_commits FROM runs WHERE id = ?", (run_id,)).fetchone()
+            nr = int(commit)
+            return nr if row is not None and 1 <= nr <= row[0] else None
+        commit = commit.lower()
+        if not all(c in "0123456789abcdef" for c in commit):
+            return None
+        if len(commit) < MIN_HASH_PREFIX:
+            raise ValueError(f"A commit hash prefix needs at least {MIN_HASH_PREFIX} characters: {commit}")
+        # Hashes are stored abbreviated, so a full hash starts with the stored one
+        rows = db.execute(
+            "SELECT DISTINCT nr FROM commits WHERE run_id = ? AND (hash LIKE ? || '%' OR ? LIKE hash || '%') "
+            "ORDER BY nr LIMIT 2", (run_id, commit, commit)).fetchall()
+        if len(rows) > 1:
+            raise ValueError(f"Ambiguous commit hash prefix: {commit}")
+        return rows[0][0] if rows else None
+
+    def lineages(self, run_id: int, file: Optional[str] = None, alive_at: Optional[int] = None,
+                 category: Optional[str] = None, dead: Optional[bool] = None,
+                 offset: int = 0, limit: int = 50) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Lineages of a run that touch `file` (in any version), exist at commit number `alive_at`,
+        have the change `category` (same, consistent, inconsistent) and/or are (not) dead, in
+        lineage order. Each comes with the fragments of its last version.
+        """
+        where, args = ["l.run_id = ?"], [run_id]
+        if file:
+            where.append("l.id IN (SELECT lineage_id FROM fragments WHERE run_id = ? AND file = ?)")
+            args += [run_id, file]
+        if alive_at is not None:
+            where.append("l.first_nr <= ? AND l.last_nr >= ?")
+            args += [alive_at, alive_at]
+        if category:
+            where.append("l.category = ?")
+            args.append(category)
+        if dead is not None:
+            where.append("l.is_dead = ?")
+            args.append(int(dead))
+        condition = " AND ".join(where)
+
+        db = self._connection()
+        total = db.execute(f"SELECT COUNT(*) FROM lineages l WHERE {condition}", args).fetchone()[0]
+        rows = db.execute(
+            f"SELECT l.id, l.first_nr, l.last_nr, l.versions, l.is_dead, l.category, "
+            f"(SELECT hash FROM commits WHERE run_id = l.run_id AND nr = l.first_nr) AS first_commit, "
+            f"(SELECT hash FROM commits WHERE run_id = l.run_id AND nr = l.last_nr) AS last_commit "
+            f"FROM lineages l WHERE {condition} ORDER BY l.id LIMIT ? OFFSET ?", args + [limit, offset]).fetchall()
+
+        result = [{
+            "id": row["id"],
+            "first_nr": row["first_nr"],
+            "last_nr": row["last_nr"],
+            "first_commit": row["first_commit"],
+            "last_commit": row["last_commit"],
+            "versions": row["versions"],
+            "status": "dead" if row["is_dead"] else "alive",
+            "category": row["category"],
+            "fragments": [],
+        } for row in rows]
+        by_id = {item["id"]: item for item in result}
+        if by_id:
+            marks = ",".join("?" * len(by_id))
+            for row in db.execute(
+                    f"SELECT f.lineage_id, f.file, f.startline, f.endline FROM fragments f "
+                    f"JOIN lineages l ON l.run_id = f.run_id AND l.id = f.lineage_id "
+                    f"WHERE f.run_id = ? AND f.lineage_id IN ({marks}) AND f.version_idx = l.versions - 1 "
+                    f"AND f.removed = 0 ORDER BY f.rowid", [run_id, *by_id]):
+                by_id[row["lineage_id"]]["fragments"].append(
+                    {"file": row["file"], "startline": row["startline"], "endline": row["endline"]})
+        return total, result
+
+    def lineage(self, run_id: int, lineage_id: int) -> Optional[Dict[str, Any]]:
+        """A lineage with all its versions and their fragments (and removed fragments)."""
+        db = self._connection()
+        row = db.execute("SELECT id, first_nr, last_nr, versions, is_dead, category FROM lineages "
+                         "WHERE run_id = ? AND id = ?", (run_id, lineage_id)).fetchone()
+        if row is None:
+            return None
+        versions = [{
+            "nr": v["nr"],
+            "hash": v["hash"],
+            "evolution": v["evolution"],
+            "change": v["change"],
+            "fragments": [],
+            "removed_fragments": [],
+        } for v in db.execute("SELECT nr, hash, evolution, change FROM versions "
+                              "WHERE run_id = ? AND lineage_id = ? ORDER BY idx", (run_id, lineage_id))]
+        for f in db.execute("SELECT version_idx, file, startline, endline, function_hash, removed FROM fragments "
+                            "WHERE run_id = ? AND lineage_id = ? ORDER BY rowid", (run_id, lineage_id)):
+            versions[f["version_idx"]]["removed_fragments" if f["removed"] else "fragments"].append({
+                "file": f["file"], "startline": f["startline"], "endline": f["endline"], "hash": f["function_hash"]})
+        return {
+            "id": row["id"],
+            "first_nr": row["first_nr"],
+            "last_nr": row["last_nr"],
+            "status": "dead" if row["is_dead"] else "alive",
+            "category": row["category"],
+            "versions": versions,
+        }
+
+    @staticmethod
+    def _run_summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "run_id": row["id"],
+            "git_url": row["git_url"],
+            "created": row["created"],
+            "total_commits": row["total_commits"],
+            "lineages": row["lineages"],
+            "settings": json.loads(row["settings"]),
+        }
+
+
+results = ResultStore()
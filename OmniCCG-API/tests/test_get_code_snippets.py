@@ -0,0 +1,34 @@
+import pytest
+
+from get_code_snippets import _repo_relative_path
+
+WORKSPACE = "/srv/omniccg/cloned_repositories/acme-3f2a9c1b7d"
+
+
+@pytest.mark.parametrize("incoming, expected", [
+    (f"{WORKSPACE}/jobs/4b1f0c2e9a7d/repo/src/Main.java", "src/Main.java"),
+    (f"{WORKSPACE}/jobs/4b1f0c2e9a7d/dataset/production/src/Main.java", "src/Main.java"),
+    ("src/Main.java", "src/Main.java"),
+    ("C:\\omniccg\\acme\\jobs\\4b1f0c2e9a7d\\repo\\src\\Main.java", "src/Main.java"),
+])
+def test_workspace_prefix_is_removed(incoming, expected):
+    assert _repo_relative_path(incoming) == expected
+
+
+def test_nested_repo_package_is_kept():
+    nested = "src/main/java/com/acme/repo/UserRepo.java"
+    assert _repo_relative_path(f"{WORKSPACE}/jobs/4b1f0c2e9a7d/repo/{nested}") == nested
+    assert _repo_relative_path(f"{WORKSPACE}/jobs/4b1f0c2e9a7d/dataset/production/{nested}") == nested
+    assert _repo_relative_path(nested) == nested
+    assert _repo_relative_path(f"repo/{nested}") == f"repo/{nested}"
+
+
+def test_foreign_absolute_path_uses_the_file_name():
+    assert _repo_relative_path("/home/dev/Main.java") == "Main.java"
+
+
+@pytest.mark.parametrize("incoming", ["", ".", "../secret.txt", "src/../../secret.txt",
+                                      f"{WORKSPACE}/jobs/4b1f0c2e9a7d/repo/../../etc/passwd"])
+def test_paths_outside_the_repository_are_rejected(incoming):
+    with pytest.raises(ValueError):
+        _repo_relative_path(incoming)
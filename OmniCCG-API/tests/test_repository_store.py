@@ -0,0 +1,58 @@
+import subprocess
+
+import pytest
+
+import main
+import workspaces
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", "-C", str(cwd), "-c", "user.name=t", "-c", "user.email=t@t", *args],
+                          check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _commit(upstream, text):
+    (upstream / "Main.java").write_text(text)
+    _git(upstream, "add", ".")
+    _git(upstream, "commit", "-qm", text)
+    return _git(upstream, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspaces, "WORKSPACES_ROOT", str(tmp_path / "cloned_repositories"))
+    monkeypatch.setattr(workspaces, "_stores", {})
+    repo = tmp_path / "upstream"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "main")
+    return repo
+
+
+def _snippet(upstream, commit):
+    response = main.app.test_client().post("/get_code_snippets", json={
+        "git_url": str(upstream), "commit": commit,
+        "sources": [{"file": "Main.java", "startline": 1, "endline": 1}]})
+    return response.json["snippets"][0]
+
+
+def test_commit_names_resolve_to_ids(upstream):
+    first = _commit(upstream, "class A {}\n")
+    with workspaces.repository(str(upstream), [first]) as store:
+        assert store.resolve_commit("main") == first
+        assert store.resolve_commit("HEAD") == first
+        assert store.resolve_commit(first[:7]) == first
+        assert store.resolve_commit("0" * 40) is None
+        assert store.has_commit(first) and store.has_commit(first[:7].upper())
+        # a branch may have moved upstream, so it never saves the fetch
+        assert not store.has_commit("main")
+        assert store.read_blob(first, "Main.java") == b"class A {}\n"
+
+
+def test_moved_branch_is_fetched_and_not_served_from_the_cache(upstream):
+    first = _commit(upstream, "class A {}\n")
+    assert _snippet(upstream, "main")["content"] == "class A {}\n"
+    _commit(upstream, "class B {}\n")
+    assert _snippet(upstream, "main")["content"] == "class B {}\n"
+    assert _snippet(upstream, "HEAD")["content"] == "class B {}\n"
+    assert _snippet(upstream, first[:7])["content"] == "class A {}\n"
+    assert _snippet(upstream, "no-such-branch")["error"] == "Commit not found: no-such-branch"
@@ -0,0 +1,45 @@
+import pytest
+
+from result_store import ResultStore
+
+HASHES = ["a1b2c3d", "a1b2f00", "0c0ffee", "deadbee"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    run_id = store.save_run("https://example.com/acme.git", {}, HASHES, [], None)
+    return store, run_id
+
+
+def test_commit_nr_by_number(store):
+    store, run_id = store
+    assert store.commit_nr(run_id, "1") == 1
+    assert store.commit_nr(run_id, "4") == 4
+    assert store.commit_nr(run_id, "0") is None
+    assert store.commit_nr(run_id, "5") is None
+    assert store.commit_nr(run_id + 1, "1") is None
+
+
+def test_commit_nr_by_hash_prefix(store):
+    store, run_id = store
+    assert store.commit_nr(run_id, "a1b2c") == 1
+    assert store.commit_nr(run_id, "A1B2F00") == 2
+    assert store.commit_nr(run_id, "0c0ffee") == 3
+    # a full hash starts with the stored abbreviation
+    assert store.commit_nr(run_id, "deadbee" + "4" * 33) == 4
+
+
+def test_commit_nr_uses_the_whole_prefix(store):
+    store, run_id = store
+    assert store.commit_nr(run_id, "a1b2c3dXX") is None
+    assert store.commit_nr(run_id, "a1b2c3e") is None
+    assert store.commit_nr(run_id, "a1b_") is None
+
+
+def test_commit_nr_rejects_short_or_ambiguous_prefixes(store):
+    store, run_id = store
+    with pytest.raises(ValueError):
+        store.commit_nr(run_id, "dea")
+    with pytest.raises(ValueError):
+        store.commit_nr(run_id, "a1b2")
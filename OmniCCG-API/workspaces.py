@@ -0,0 +1,243 @@
+import os
+import re
+import stat
+import shutil
+import hashlib
+import time
+import threading
+import subprocess
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    from .blob_reader import BlobReader, BlobCache
+except:
+    from blob_reader import BlobReader, BlobCache
+
+# Repository stores and job workspaces live under <package>/cloned_repositories
+WORKSPACES_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cloned_repositories")
+# Blob readers of repositories nobody holds that are kept running; older ones are stopped
+MAX_IDLE_READERS = int(os.environ.get("OMNICCG_MAX_IDLE_READERS", "8"))
+
+
+def _git(args: List[str], cwd: Optional[str] = None, check: bool = True) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          text=True, check=check, stdin=subprocess.DEVNULL)
+
+
+def _make_writable(func, path, excinfo):
+    # Git writes its objects read-only, which stops rmtree on Windows
+    try:
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+    except OSError:
+        pass
+
+
+def _remove_tree(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, onerror=_make_writable)
+
+
+def repository_key(source: str) -> str:
+    """
+    Directory name of a repository: its name plus a digest of the URL (or local path), so that
+    two forks with the same name do not share a store.
+    """
+    source = (source or "").strip()
+    if source and "://" not in source and not re.match(r"^[\w.-]+@[\w.-]+:", source):
+        # local path
+        source = os.path.abspath(source)
+    normalized = source.rstrip("/\\")
+    if normalized.endswith(".git"):
+        normalized = normalized[:-4]
+    name = re.split(r"[/\\:]", normalized)[-1] if normalized else ""
+    name = re.sub(r"[^\w.-]", "_", name).strip(".") or "repo"
+    digest = hashlib.sha1(normalized.casefold().encode("utf-8")).hexdigest()[:10]
+    return f"{name}-{digest}"
+
+
+def repository_dir(source: str) -> str:
+    """Directory shared by every job of a repository (store, checkpoints, published results)."""
+    return os.path.join(WORKSPACES_ROOT, repository_key(source))
+
+
+class RepositoryStore:
+    """
+    Bare copy of one repository, shared by every extraction and snippet lookup of it.
+
+    Only clone and fetch write to the store, and they run one at a time under its update lock.
+    Everything else reads objects, which git allows concurrently. Extractions work in their own
+    workspace cloned from the store with --shared, so a job never sees another job's checkout
+    and the repository is only downloaded once. Files are read straight from the objects through
+    a long-lived `git cat-file --batch` process, backed by an LRU of (commit, path) contents.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.key = repository_key(source)
+        self.dir = os.path.join(WORKSPACES_ROOT, self.key)
+        self.git_dir = os.path.join(self.dir, "store.git")
+        self.jobs_dir = os.path.join(self.dir, "jobs")
+        # Jobs and lookups currently holding the store; see acquire()/release()
+        self.users = 0
+        self.last_used = 0.0
+        self.reader = BlobReader(self.git_dir)
+        self._update_lock = threading.Lock()
+        self._swept = False
+
+    @property
+    def exists(self) -> bool:
+        return os.path.isfile(os.path.join(self.git_dir, "HEAD"))
+
+    def resolve_commit(self, name: str) -> Optional[str]:
+        """Object id of the commit `name` (an id or a prefix of one, a branch, a tag, HEAD), or None."""
+        if not name or not self.exists:
+            return None
+        found = self.reader.lookup(f"{name}^{{commit}}")
+        return found[0] if found is not None else None
+
+    def has_commit(self, commit: str) -> bool:
+        """
+        Whether the store has `commit` for good. Only a commit id (or a prefix of one) counts:
+        branches, tags and HEAD may have moved upstream since the last fetch.
+        """
+        oid = self.resolve_commit(commit)
+        return oid is not None and oid.startswith(commit.lower())
+
+    def update(self, commits: Optional[Iterable[str]] = None) -> None:
+        """
+        Clone the store when it does not exist yet, otherwise fetch new commits. When `commits`
+        are given, the fetch is skipped if the store already has all of them.
+        """
+        with self._update_lock:
+            if not self._swept:
+                self._sweep()
+            if not self.exists:
+                self._clone()
+            elif commits is None or not all(self.has_commit(c) for c in set(commits)):
+                _git(["--git-dir", self.git_dir, "fetch", "--quiet", "--prune", "--tags", "origin"])
+                # the reader resolved names against the refs and packs it saw before the fetch
+                self.reader.close()
+
+    def _sweep(self) -> None:
+        """
+        Remove what a previous server process left behind: workspaces of jobs that no longer run
+        and stale lock files of an interrupted fetch. Runs before the first job creates its
+        workspace, while no other user can be inside the store.
+        """
+        _remove_tree(self.jobs_dir)
+        if self.exists:
+            for lock_file in Path(self.git_dir).rglob("*.lock"):
+                try:
+                    lock_file.unlink()
+                except OSError:
+                    pass
+        self._swept = True
+
+    def _clone(self) -> None:
+        # Clone next to the store and move it in place, so a failed clone leaves no broken store
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = os.path.join(self.dir, f"store.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            _git(["clone", "--quiet", "--bare", self.source, tmp])
+            # Keep the branches as local heads, so job workspaces see them as origin/<branch>
+            _git(["--git-dir", tmp, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"])
+            # Workspaces borrow objects from the store; it must never prune them
+            _git(["--git-dir", tmp, "config", "gc.auto", "0"])
+            _remove_tree(self.git_dir)
+            os.replace(tmp, self.git_dir)
+        finally:
+            _remove_tree(tmp)
+
+    def read_blob(self, oid: str, path: str) -> Optional[bytes]:
+        """
+        Content of `path` at the commit `oid` (None if it has no such file), read without a
+        checkout. `oid` is the full id given by resolve_commit(), so that a cached file is never
+        served for a branch or tag that has moved on.
+        """
+        key = (self.key, oid, path)
+        data = blob_cache.get(key)
+        if data is None:
+            data = self.reader.read_blob(f"{oid}:{path}")
+            if data is not None:
+                blob_cache.put(key, data)
+        return data
+
+
+@dataclass
+class Workspace:
+    """Private directory of one extraction, with its own clone of the repository at <dir>/repo."""
+    store: RepositoryStore
+    dir: str
+
+    @property
+    def repo_dir(self) -> str:
+        return os.path.join(self.dir, "repo")
+
+    def publish(self, path: str) -> None:
+        """Move a result file of the job to the repository directory, replacing the previous one."""
+        if os.path.exists(path):
+            os.replace(path, os.path.join(self.store.dir, os.path.basename(path)))
+
+
+_stores: Dict[str, RepositoryStore] = {}
+_lock = threading.Lock()
+# Contents of (repository, commit id, path), shared by all snippet lookups
+blob_cache = BlobCache()
+
+
+def acquire(source: str) -> RepositoryStore:
+    """Store of `source`, held until release(); every job or lookup of a repository shares it."""
+    key = repository_key(source)
+    with _lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = RepositoryStore(source)
+        store.users += 1
+    return store
+
+
+def release(store: RepositoryStore) -> None:
+    """
+    Stop holding the store. It stays registered, so its reader serves the next lookup at once;
+    only the MAX_IDLE_READERS most recently used idle stores keep their reader running.
+    """
+    with _lock:
+        store.users -= 1
+        store.last_used = time.monotonic()
+        idle = sorted((s for s in _stores.values() if s.users == 0 and s.reader.running),
+                      key=lambda s: s.last_used, reverse=True)
+        # nobody holds these stores, so no lookup is in flight on their readers
+        for stale in idle[MAX_IDLE_READERS:]:
+            stale.reader.close()
+
+
+@contextmanager
+def repository(source: str, commits: Optional[Iterable[str]] = None) -> Iterator[RepositoryStore]:
+    """Hold the store of `source` for reading objects; it is fetched first unless it has all `commits`."""
+    store = acquire(source)
+    try:
+        store.update(commits)
+        yield store
+    finally:
+        release(store)
+
+
+@contextmanager
+def job_workspace(source: str) -> Iterator[Workspace]:
+    """
+    Create a workspace for one extraction of `source`. The store is brought up to date and the
+    workspace gets its own clone of it, which is removed together with the workspace.
+    """
+    with repository(source) as store:
+        workspace = Workspace(store=store, dir=os.path.join(store.jobs_dir, uuid.uuid4().hex[:12]))
+        os.makedirs(workspace.dir)
+        try:
+            _git(["clone", "--quiet", "--shared", store.git_dir, workspace.repo_dir])
+            yield workspace
+        finally:
+            _remove_tree(workspace.dir)
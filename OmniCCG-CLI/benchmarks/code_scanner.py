@@ -0,0 +1,84 @@
+"""
+Comment stripping and tokenization: the original character loops of code_operations plus
+hash_operations.tokenize versus code_scanner plus hash_operations.tokenize.
+
+    python benchmarks/code_scanner.py [--random 2000] [--mb 4] [--seed 1]
+
+The samples and the reference loops come from comment_reference.py, the corpus that
+tests/test_code_scanner.py also runs. Both implementations must give the same normalized code and
+the same tokens for every sample.
+"""
+import argparse
+import random
+import time
+
+from comment_reference import EDGE_CASES, reference, reference_normalize, repository_samples, random_samples
+from omniccg.domain.code_scanner import normalize_code, COMMENT_STYLE
+from omniccg.domain.hash_operations import tokenize
+
+
+def scan(segment, ext):
+    """What a fragment goes through now: code_scanner, then tokenize in generate_simhashes."""
+    normalized = normalize_code(segment, ext)
+    return normalized, tokenize(normalized)
+
+
+def check_parity(samples):
+    checked = 0
+    for ext, segment in samples:
+        expected = reference(segment, ext)
+        actual = scan(segment, ext)
+        if actual != expected:
+            raise SystemExit(f"{ext}: code_scanner differs from the reference for {segment!r}\n"
+                             f"  expected {expected!r}\n  got      {actual!r}")
+        checked += 1
+    return checked
+
+
+def throughput(fn, texts):
+    size = sum(len(text.encode("utf-8")) for _, text in texts) / 1e6
+    start = time.perf_counter()
+    for ext, text in texts:
+        fn(text, ext)
+    elapsed = time.perf_counter() - start
+    return size / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--random", type=int, default=2000, help="random samples per run")
+    parser.add_argument("--segments", type=int, default=20, help="random segments per repository file")
+    parser.add_argument("--mb", type=float, default=4.0, help="approximate input size per language for throughput")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    edge = [(ext, case) for ext, cases in EDGE_CASES.items() for case in cases]
+    repo = list(repository_samples(rng, args.segments))
+    print(f"parity: {check_parity(edge)} edge cases, {check_parity(repo)} repository segments, "
+          f"{check_parity(random_samples(rng, args.random))} random samples -- identical")
+
+    # "normalize" is comment stripping plus blank line removal, "scan" adds tokenization
+    print(f"{'ext':<6} | {'normalize MB/s (old / new)':>27} | {'speedup':>7} | {'scan MB/s (old / new)':>22} | {'speedup':>7}")
+    for ext in sorted(COMMENT_STYLE):
+        pool = [case for e, case in edge if e == ext] + [text for e, text in repo if e == ext]
+        target = int(args.mb * 1e6)
+        # fragment-sized inputs (~2 KB) so that per-call overhead does not dominate for the
+        # languages whose pool only holds the short edge cases
+        texts, size = [], 0
+        while size < target:
+            parts, length = [], 0
+            while length < 2000:
+                part = rng.choice(pool)
+                parts.append(part if part.endswith("\n") else part + "\n")
+                length += len(parts[-1])
+            texts.append((ext, "".join(parts)))
+            size += length
+        old_norm, new_norm = throughput(reference_normalize, texts), throughput(normalize_code, texts)
+        old_scan, new_scan = throughput(reference, texts), throughput(scan, texts)
+        print(f"{ext:<6} | {old_norm:12.2f} / {new_norm:12.2f} | {new_norm / old_norm:6.1f}x | "
+              f"{old_scan:9.2f} / {new_scan:10.2f} | {new_scan / old_scan:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
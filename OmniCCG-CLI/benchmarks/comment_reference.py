@@ -0,0 +1,267 @@
+"""
+Parity corpus of the comment stripper (omniccg.domain.code_scanner).
+
+The character-by-character loops below are the comment stripping that code_operations used before
+code_scanner; they are only kept here as the reference the regex scanner is checked against, by
+tests/test_code_scanner.py and benchmarks/code_scanner.py. The samples are
+  - hand-written edge cases for every supported language (strings with escapes, comment markers
+    inside strings, unterminated strings and comments, CRLF and form feed line breaks, Ruby
+    =begin/=end blocks, PHP '#' comments),
+  - random segments of the .c and .py files of this repository,
+  - random text built from the characters the scanners react to.
+"""
+import re
+from pathlib import Path
+
+from omniccg.domain.code_scanner import COMMENT_STYLE
+from omniccg.domain.hash_operations import tokenize
+
+
+def _strip_c_style_comments(code: str, hash_comment: bool = False) -> str:
+    """
+    Remove C-style comments:
+    // line comment
+    /* block comment */
+    If hash_comment=True, also treat '#' as line comment (for PHP).
+    """
+    result = []
+    i = 0
+    n = len(code)
+    in_block = False
+    in_line = False
+    in_string = False
+    string_char = ""
+    escaping = False
+
+    while i < n:
+        ch = code[i]
+        nxt = code[i + 1] if i + 1 < n else ""
+
+        if in_block:
+            # end of block comment
+            if ch == "*" and nxt == "/":
+                in_block = False
+                i += 2
+            else:
+                # preserve newlines
+                if ch == "\n":
+                    result.append("\n")
+                i += 1
+            continue
+
+        if in_line:
+            # end of line comment
+            if ch == "\n":
+                in_line = False
+                result.append("\n")
+            i += 1
+            continue
+
+        if in_string:
+            result.append(ch)
+            if escaping:
+                escaping = False
+            elif ch == "\\":
+                escaping = True
+            elif ch == string_char:
+                in_string = False
+            i += 1
+            continue
+
+        # outside string/comment: handle strings
+        if ch in ("'", '"'):
+            in_string = True
+            string_char = ch
+            result.append(ch)
+            i += 1
+            continue
+
+        # handle // and /* */
+        if ch == "/" and nxt == "/":
+            in_line = True
+            i += 2
+            continue
+        if ch == "/" and nxt == "*":
+            in_block = True
+            i += 2
+            continue
+
+        # handle '#' as comment start (PHP)
+        if hash_comment and ch == "#":
+            in_line = True
+            i += 1
+            continue
+
+        result.append(ch)
+        i += 1
+
+    return "".join(result)
+
+
+def _strip_hash_comments(code: str, ruby_block_comments: bool = False) -> str:
+    """
+    Remove '#' based comments:
+    - Python: '#' to end of line (respecting simple strings)
+    - Ruby: same + =begin/=end block comments when enabled.
+    """
+    lines = code.splitlines(keepends=True)
+    result_lines = []
+    in_ruby_block = False
+
+    for line in lines:
+        stripped = line.lstrip()
+
+        # Ruby block comments =begin / =end
+        if ruby_block_comments:
+            if not in_ruby_block and re.match(r"^=begin\b", stripped):
+                in_ruby_block = True
+                continue
+            if in_ruby_block:
+                if re.match(r"^=end\b", stripped):
+                    in_ruby_block = False
+                continue
+
+        new_line = _remove_hash_comment_line(line)
+        result_lines.append(new_line)
+
+    return "".join(result_lines)
+
+
+def _remove_hash_comment_line(line: str) -> str:
+    """
+    Remove everything after '#' in a single line,
+    ignoring '#' that appear inside simple/double-quoted strings.
+    """
+    result = []
+    in_string = False
+    string_char = ""
+    escaping = False
+    in_comment = False
+
+    for ch in line:
+        # If we're already in a comment, keep only the newline (if any)
+        if in_comment:
+            if ch in ("\n", "\r"):
+                result.append(ch)
+                in_comment = False
+            continue
+
+        if in_string:
+            result.append(ch)
+            if escaping:
+                escaping = False
+            elif ch == "\\":
+                escaping = True
+            elif ch == string_char:
+                in_string = False
+            continue
+
+        # Outside string / comment
+        if ch in ("'", '"'):
+            in_string = True
+            string_char = ch
+            result.append(ch)
+            continue
+
+        if ch == "#":
+            # Start of a comment: ignore everything until newline
+            in_comment = True
+            continue
+
+        result.append(ch)
+
+    return "".join(result)
+
+
+EDGE_CASES = {
+    ".java": [
+        'int a = 1; // trailing\nint b = 2; /* block */ int c = 3;\n',
+        'String s = "// not a comment"; String t = "/* nor this */";\n',
+        'char q = \'"\'; char e = \'\\\'\'; // quote chars\n',
+        'String u = "escaped \\" quote // still string";\n',
+        '/**\n * Javadoc\n *\n */\npublic void f() {}\n',
+        'a = b / c; d = e /2;\n',
+        'x = 1; /* unterminated\n block\n',
+        'String s = "unterminated\n next line // comment?\n',
+        'int a; /* a */ /* b */ // c\r\nint b;\r\n',
+        'return "\\\\"; // backslash at end of string\n',
+    ],
+    ".c": [
+        '#include <stdio.h>\n/* header */\nint main(void) { return 0; } // done\n',
+        'printf("%d // %s\\n", a, "/*");\n',
+        'x = y/*inline*/+z;\n\n\n   \n',
+        '/* a */// b\n/*/ tricky */ int x;\n',
+    ],
+    ".cs": [
+        'var s = @"verbatim";  // comment\n/// <summary>doc</summary>\nclass A {}\n',
+        'var c = \'/\'; var d = \'*\'; /**/ var e = 1;\n',
+    ],
+    ".php": [
+        '<?php\n$a = 1; # hash comment\n$b = "# in string"; // slash\n/* block */ echo $a;\n',
+        "$s = 'it\\'s # fine'; #comment\n",
+        '$x = 5 # unfinished\n',
+    ],
+    ".py": [
+        'x = 1  # comment\ny = "# not comment"\nz = \'#\' # yes\n',
+        's = "unterminated # string\nt = 2 # comment\n',
+        'u = "esc \\" # still string" # comment\r\nv = 3\r\n',
+        '# only comment\n\n    \n\tpass\n',
+        'a = 1 # form feed\x0cb = 2 # again\x0bc = 3\n',
+        'd = "#"#x\re = 4\n',
+    ],
+    ".rb": [
+        'puts "hi" # comment\n=begin\nblock comment\n=end\nputs "after"\n',
+        '  =begin indented\n  hidden\n  =end\nvisible # c\n',
+        '=beginning is not a block\nx = 1\n',
+        '=begin\nunterminated block\nstill hidden\n',
+        "s = 'a # b' # c\n",
+    ],
+    ".txt": [
+        'no // comment /* handling */ here # at all\n\n',
+    ],
+}
+
+# Characters the scanners branch on, mixed with filler
+ALPHABET = ['"', "'", "\\", "/", "*", "#", "\n", "\r\n", "\r", "\x0c", " ", "\t", "=begin", "=end", "a", "b1", "_x", "(", ")", ";"]
+
+
+def reference_normalize(segment, ext):
+    """code_without_comments_and_blank_lines before code_scanner."""
+    if ext in {".c", ".cs", ".java"}:
+        cleaned = _strip_c_style_comments(segment)
+    elif ext == ".php":
+        cleaned = _strip_c_style_comments(segment, hash_comment=True)
+    elif ext == ".py":
+        cleaned = _strip_hash_comments(segment)
+    elif ext == ".rb":
+        cleaned = _strip_hash_comments(segment, ruby_block_comments=True)
+    else:
+        cleaned = segment
+    return "\n".join([line.rstrip() for line in cleaned.splitlines() if line.strip() != ""])
+
+
+def reference(segment, ext):
+    """The pipeline before code_scanner: character loops, normalization, then tokenize."""
+    normalized = reference_normalize(segment, ext)
+    return normalized, tokenize(normalized)
+
+
+def repository_samples(rng, per_file):
+    root = Path(__file__).resolve().parent.parent
+    for path in sorted(root.rglob("*")):
+        ext = path.suffix.lower()
+        if ext not in COMMENT_STYLE or "cloned_repositories" in path.parts or not path.is_file():
+            continue
+        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines(True)
+        if not lines:
+            continue
+        yield ext, "".join(lines)
+        for _ in range(per_file):
+            ls = rng.randrange(len(lines))
+            yield ext, "".join(lines[ls:ls + rng.randint(1, 60)])
+
+
+def random_samples(rng, count):
+    exts = sorted(EDGE_CASES)
+    for _ in range(count):
+        yield rng.choice(exts), "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 120)))
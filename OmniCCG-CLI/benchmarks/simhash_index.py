@@ -0,0 +1,69 @@
+"""
+Near-neighbour SimHash lookup: pairwise scan (match_hashes over every fragment, as
+CloneFragment.matches does) versus the multi-index SimHashIndex.
+
+    python benchmarks/simhash_index.py [--sizes 10000,100000,1000000] [--queries 20]
+
+Both methods must return the same neighbours for every query.
+"""
+import argparse
+import random
+import time
+
+from omniccg.domain.hash_operations import HASH_BITS, match_hashes
+from omniccg.domain.SimHashIndex import SimHashIndex, MATCH_THRESHOLD, MATCH_DISTANCE
+
+
+def make_hashes(n, rng):
+    hashes = [rng.getrandbits(HASH_BITS) for _ in range(n)]
+    # Plant near duplicates so queries have neighbours at every distance up to the threshold
+    for i in range(0, n, 10):
+        h = hashes[i]
+        for bit in rng.sample(range(HASH_BITS), rng.randint(0, MATCH_DISTANCE + 2)):
+            h ^= 1 << bit
+        hashes[i + 1 if i + 1 < n else i] = h
+    return hashes
+
+
+def pairwise(hashes, query):
+    return {i for i, h in enumerate(hashes) if match_hashes(h, query, threshold=MATCH_THRESHOLD)[0]}
+
+
+def run(n, queries, seed):
+    rng = random.Random(seed)
+    hashes = make_hashes(n, rng)
+    probes = [hashes[rng.randrange(n)] ^ (1 << rng.randrange(HASH_BITS)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = SimHashIndex()
+    for i, h in enumerate(hashes):
+        index.add(i, h)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [index.query(q) for q in probes]
+    t_index = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    scanned = [pairwise(hashes, q) for q in probes]
+    t_scan = (time.perf_counter() - start) / queries
+
+    if indexed != scanned:
+        raise SystemExit(f"n={n}: index and pairwise scan disagree")
+    found = sum(len(r) for r in indexed)
+    print(f"{n:>9} fragments | build {build:7.2f}s | pairwise {t_scan * 1e3:10.2f} ms/query | "
+          f"index {t_index * 1e3:8.3f} ms/query | speedup {t_scan / t_index:8.0f}x | neighbours {found}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for n in (int(s) for s in args.sizes.split(",")):
+        run(n, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -133,8 +133,13 @@ def count_functions_in_file(file_path: str, language: str | None = None) -> int:
 
     with open(file_path, "r", encoding="utf-8", errors="ignore") as fh:
         code = fh.read()
-    cleaned = _clean_source_for_language(code, detected_language)
-    return sum(1 for _ in SUPPORTED_LANGUAGE_REGEX[detected_language].finditer(cleaned))
+    return count_functions_in_source(code, detected_language)
+
+
+def count_functions_in_source(code: str, language: str) -> int:
+    """Count the functions of source text in an already detected language."""
+    cleaned = _clean_source_for_language(code, language)
+    return sum(1 for _ in SUPPORTED_LANGUAGE_REGEX[language].finditer(cleaned))
 
 
 def count_java_methods_in_file(java_file_path: str) -> int:
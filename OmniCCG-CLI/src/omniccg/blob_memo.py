@@ -0,0 +1,142 @@
+import os
+import zlib
+import pickle
+import sqlite3
+import hashlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Default memory bound of the in-process memo
+DEFAULT_MEMO_SIZE = 256 * 1024 ** 2
+# Pending SQLite writes are written in one transaction once this many accumulate (and on flush())
+COMMIT_EVERY = 256
+
+_MISSING = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    blob  TEXT NOT NULL,
+    kind  TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (blob, kind)
+)
+"""
+
+
+def blob_id(data: bytes) -> str:
+    """Git blob id (`git hash-object`) of the given file contents."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class BlobMemo:
+    """
+    Per-file analysis results keyed by (blob id, kind), shared by every commit of a run: a file that
+    did not change between two commits is analysed once and then served from the memo.
+
+    Entries live in an in-process LRU bounded by max_size (approximate bytes, as estimated by the
+    callers). Kinds stored with persist=True are also written to an optional SQLite database, so
+    that later runs (and the other worker processes of a run) find them without recomputing.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MEMO_SIZE, db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Tuple[str, str], Any] = {}
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._total = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._writes = []
+
+    def configure(self, max_size: int, db_path: Optional[str]) -> None:
+        """Apply run settings; the in-memory entries are kept, they only depend on file contents."""
+        if db_path != self.db_path:
+            self.close()
+            self.db_path = db_path
+        self.max_size = max_size
+        self._evict()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        # A connection must not cross a fork: worker processes open their own
+        if self._db is None or self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=60)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(_SCHEMA)
+            self._db_pid = os.getpid()
+            self._writes = []
+        return self._db
+
+    def get(self, blob: str, kind: str, compute: Callable[[], Any],
+            size: Callable[[Any], int] = lambda value: 64, persist: bool = False) -> Any:
+        """Return the memoized value of `kind` for `blob`, computing (and storing) it on a miss."""
+        key = (blob, kind)
+        value = self._entries.pop(key, _MISSING)
+        if value is not _MISSING:
+            # re-inserting keeps the dict in least-recently-used order
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+        db = self._connection() if persist else None
+        if db is not None:
+            try:
+                row = db.execute("SELECT value FROM memo WHERE blob = ? AND kind = ?", key).fetchone()
+                if row is not None:
+                    value = pickle.loads(zlib.decompress(row[0]))
+            except (sqlite3.Error, zlib.error, pickle.UnpicklingError):
+                # the memo is only a cache: an unreadable row is recomputed
+                value = _MISSING
+        if value is _MISSING:
+            self.misses += 1
+            value = compute()
+            if db is not None:
+                # buffered, so that no write transaction stays open while other processes analyse
+                self._writes.append((blob, kind, zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))))
+                if len(self._writes) >= COMMIT_EVERY:
+                    self.flush()
+        else:
+            self.hits += 1
+
+        self._entries[key] = value
+        self._sizes[key] = size(value)
+        self._total += self._sizes[key]
+        self._evict()
+        return value
+
+    def _evict(self) -> None:
+        while self._total > self.max_size and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            del self._entries[oldest]
+            self._total -= self._sizes.pop(oldest)
+
+    def flush(self) -> None:
+        """Write the pending entries to SQLite."""
+        if self._db is not None and self._db_pid == os.getpid() and self._writes:
+            try:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO memo (blob, kind, value) VALUES (?, ?, ?)", self._writes)
+            except sqlite3.Error:
+                # e.g. the database stayed locked by another process: these entries are simply recomputed next time
+                pass
+            self._writes = []
+
+    def close(self) -> None:
+        if self._db is not None and self._db_pid == os.getpid():
+            self.flush()
+            self._db.close()
+        self._db = None
+        self._db_pid = None
+
+    def clear(self) -> None:
+        """Drop the in-memory entries (the SQLite database is left as is)."""
+        self._entries.clear()
+        self._sizes.clear()
+        self._total = 0
+
+
+# Process-wide memo used by the file models and the density analysis
+blob_memo = BlobMemo()
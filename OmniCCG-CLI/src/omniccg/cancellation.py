@@ -0,0 +1,113 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional, Sequence
+
+# How often a running detector is checked for cancellation, and how long it may take to exit
+POLL_INTERVAL = 0.2
+TERMINATE_GRACE = 5.0
+
+
+class AnalysisCancelled(Exception):
+    """Raised at the next check point once an analysis was cancelled."""
+
+
+class CancelToken:
+    """
+    Cancellation request of one analysis. The pipeline calls check() between its stages and starts
+    the clone detectors through run(), which terminates them as soon as the token is cancelled.
+
+    With a flag_file the request is shared with other processes: cancel() creates the file and every
+    token with the same flag_file sees it. Only the flag file is pickled, so a token can be handed
+    to the --jobs worker processes.
+    """
+
+    def __init__(self, flag_file: Optional[str] = None):
+        self.flag_file = flag_file
+        self._event = threading.Event()
+
+    def __getstate__(self):
+        return {"flag_file": self.flag_file}
+
+    def __setstate__(self, state):
+        self.__init__(state["flag_file"])
+
+    def attach(self, flag_file: str) -> None:
+        """Share the token through flag_file; a flag left there by an earlier run is removed."""
+        self.flag_file = flag_file
+        if self._event.is_set():
+            self.cancel()
+        else:
+            self.clear_flag()
+
+    def cancel(self) -> None:
+        self._event.set()
+        if self.flag_file:
+            os.makedirs(os.path.dirname(os.path.abspath(self.flag_file)), exist_ok=True)
+            with open(self.flag_file, "w", encoding="utf-8") as fp:
+                fp.write(str(os.getpid()))
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.flag_file and os.path.exists(self.flag_file):
+            self._event.set()
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise AnalysisCancelled()
+
+    def clear_flag(self) -> None:
+        """Remove the flag file, e.g. one left over by a cancelled run of the same workspace."""
+        if self.flag_file:
+            try:
+                os.remove(self.flag_file)
+            except FileNotFoundError:
+                pass
+
+    def run(self, args: Sequence[str], check: bool = False, **popen_kwargs) -> int:
+        """
+        Like subprocess.run(args, check=check), but the process (with its children, e.g. the txl
+        processes of nicad6) is terminated once the token is cancelled, and AnalysisCancelled is
+        raised instead of returning.
+        """
+        self.check()
+        if os.name == "posix":
+            # own process group, so the whole tree can be signalled (and a terminal Ctrl+C is
+            # handled by the token instead of hitting the detector directly)
+            popen_kwargs.setdefault("start_new_session", True)
+        proc = subprocess.Popen(args, **popen_kwargs)
+        terminated_at: Optional[float] = None
+        while True:
+            try:
+                returncode = proc.wait(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                if not self.cancelled:
+                    continue
+                if terminated_at is None:
+                    _signal(proc, signal.SIGTERM)
+                    terminated_at = time.monotonic()
+                elif time.monotonic() - terminated_at > TERMINATE_GRACE:
+                    _signal(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+        self.check()
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, list(args))
+        return returncode
+
+
+def _signal(proc: subprocess.Popen, sig: int) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, sig)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def ignore_interrupts() -> None:
+    """Worker process initializer: Ctrl+C cancels through the token of the main process instead."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
@@ -1,7 +1,11 @@
-from core import execute_omniccg
+from core import execute_omniccg, Settings, _derive_repo_name, CancelToken, AnalysisCancelled
 from cli_operations import write_xml_result, enforce_single_selector, is_valid_url
+from detector_cache import DetectorCache, parse_size, format_size, describe_age
+from journal import materialize_journal
+from pathlib import Path
 import click
 import json
+import signal
 from copy import deepcopy
 
 
@@ -19,7 +23,31 @@ DEFAULT_SETTINGS = {
 }
 
 
-def build_default_settings(output_path, language):
+def run_analysis(settings):
+    """
+    execute_omniccg where Ctrl+C cancels gracefully: the clone detector is stopped and the
+    processed commits are saved as a checkpoint for --resume. A second Ctrl+C aborts at once.
+    """
+    token = CancelToken()
+
+    def on_interrupt(signum, frame):
+        if token.cancelled:
+            raise KeyboardInterrupt
+        click.echo("\nCancelling: stopping the clone detector and saving a checkpoint (Ctrl+C again to abort)...", err=True)
+        token.cancel()
+
+    previous = signal.signal(signal.SIGINT, on_interrupt)
+    try:
+        return execute_omniccg(settings, cancel=token)
+    except AnalysisCancelled:
+        click.echo("Analysis cancelled. Run the same command with --resume to continue it.", err=True)
+        raise click.exceptions.Exit(130)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+def build_default_settings(output_path, language, jobs=None, staging=None, skip_unchanged=None, detector_cache=None,
+                           resume=False, archive_after=None, blob_memo_db=None, output_format=None):
     settings = deepcopy(DEFAULT_SETTINGS)
     user_settings = settings.setdefault("user_settings", {})
 
@@ -28,6 +56,20 @@ def build_default_settings(output_path, language):
 
     user_settings.setdefault("clone_detector", settings.get("clone_detector", "nicad"))
     user_settings["language"] = language or user_settings.get("language")
+    user_settings["jobs"] = jobs or user_settings.get("jobs")
+    user_settings["staging"] = staging or user_settings.get("staging")
+    if skip_unchanged is not None:
+        user_settings["skip_unchanged"] = skip_unchanged
+    if detector_cache is not None:
+        user_settings["detector_cache"] = detector_cache
+    if resume:
+        user_settings["resume"] = True
+    if archive_after is not None:
+        user_settings["archive_after"] = archive_after
+    if blob_memo_db is not None:
+        user_settings["blob_memo_db"] = blob_memo_db
+    if output_format is not None:
+        user_settings["output_format"] = output_format
     settings["output_path"] = output_path or "."
 
     return settings
@@ -54,8 +96,30 @@ def build_default_settings(output_path, language):
 @click.option("--language", "-l",
               default=None,
               help="Programming language of the repository (e.g. java, python, c, cs)")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=None,
+              help="Number of commits checked out and analyzed in parallel (default: 1)")
+@click.option("--staging", type=click.Choice(["full", "incremental"]), default=None,
+              help="'full' copies every source file per commit (default); "
+                   "'incremental' only applies the files changed since the previous commit")
+@click.option("--skip-unchanged/--no-skip-unchanged", default=None,
+              help="Reuse the previous result for commits that do not change any source file "
+                   "of the configured language (default: enabled)")
+@click.option("--detector-cache/--no-detector-cache", default=None,
+              help="Reuse cached clone detector results for source sets analysed before (default: enabled)")
+@click.option("--resume", is_flag=True,
+              help="Continue an interrupted analysis from its last checkpoint")
+@click.option("--archive-after", type=click.IntRange(min=0), default=None,
+              help="Stop matching clone classes against lineages unchanged for N commits; "
+                   "they are still reported (default: 0, never)")
+@click.option("--blob-memo-db/--no-blob-memo-db", default=None,
+              help="Keep per-file analysis results in a SQLite memo under the repository cache, "
+                   "reused by later runs (default: disabled, memory only)")
+@click.option("--output-format", type=click.Choice(["xml", "table", "both"]), default=None,
+              help="'xml' writes ccg_data.xml (default); 'table' writes the compact columnar ccg_data.occg "
+                   "instead; 'both' writes both")
 def main(config, git_repo, from_first_commit, from_commit, days_prior,
-         merge_commit, fixed_leaps, clone_detector, detection_api, output_path, language):
+         merge_commit, fixed_leaps, clone_detector, detection_api, output_path, language, jobs, staging,
+         skip_unchanged, detector_cache, resume, archive_after, blob_memo_db, output_format):
     """OmniCCG CLI — enforce single selection; default from_first_commit=True; optional detection-api."""
 
     # --- 1) Config file path provided ---
@@ -92,28 +156,45 @@ def main(config, git_repo, from_first_commit, from_commit, days_prior,
         cfg_language = us.get("language")
         us["language"] = language or cfg_language
 
+        # jobs / staging: CLI flags override config
+        us["jobs"] = jobs or us.get("jobs")
+        us["staging"] = staging or us.get("staging")
+        if skip_unchanged is not None:
+            us["skip_unchanged"] = skip_unchanged
+        if detector_cache is not None:
+            us["detector_cache"] = detector_cache
+        if resume:
+            us["resume"] = True
+        if archive_after is not None:
+            us["archive_after"] = archive_after
+        if blob_memo_db is not None:
+            us["blob_memo_db"] = blob_memo_db
+        if output_format is not None:
+            us["output_format"] = output_format
+
         # --- output path (config + CLI override) ---
         cfg_output_path = settings.get("output_path")
         result_path = output_path or cfg_output_path or "."
         settings["output_path"] = result_path  # deixa disponível para outras partes, se necessário
 
         try:
-            genealogy_xml, lineages_xml, metrics_xml = execute_omniccg(settings)
-            write_xml_result(lineages_xml, metrics_xml, result_path)
+            genealogy_xml, lineages, metrics_xml = run_analysis(settings)
+            write_xml_result(lineages, metrics_xml, result_path, us.get("output_format") or "xml")
             return
         except ValueError as e:
             raise click.UsageError(str(e))
 
     # --- 2) No config file: build from CLI flags ---
     if not git_repo:
-        settings = build_default_settings(output_path, language)
+        settings = build_default_settings(output_path, language, jobs, staging, skip_unchanged, detector_cache, resume,
+                                          archive_after, blob_memo_db, output_format)
 
         try:
-            _, lineages_xml, metrics_xml = execute_omniccg(settings)
-            if lineages_xml is None and metrics_xml is None:
+            _, lineages, metrics_xml = run_analysis(settings)
+            if lineages is None and metrics_xml is None:
                 click.echo(f"Don't have code clone genealogy to {settings['git_repository']}")
                 return
-            write_xml_result(lineages_xml, metrics_xml, settings["output_path"])
+            write_xml_result(lineages, metrics_xml, settings["output_path"], output_format or "xml")
             return
         except ValueError as e:
             raise click.UsageError(str(e))
@@ -130,6 +211,14 @@ def main(config, git_repo, from_first_commit, from_commit, days_prior,
         "fixed_leaps": fixed_leaps,
 
         "language": language,
+        "jobs": jobs,
+        "staging": staging,
+        "skip_unchanged": skip_unchanged,
+        "detector_cache": detector_cache,
+        "resume": resume,
+        "archive_after": archive_after,
+        "blob_memo_db": blob_memo_db,
+        "output_format": output_format,
     }
 
     # Enforce single selector; default to from_first_commit=True if none given
@@ -154,15 +243,75 @@ def main(config, git_repo, from_first_commit, from_commit, days_prior,
         settings["user_settings"]["clone_detector"] = clone_detector
 
     try:
-        _, lineages_xml, metrics_xml = execute_omniccg(settings)
-        if lineages_xml is None and metrics_xml is None:
+        _, lineages, metrics_xml = run_analysis(settings)
+        if lineages is None and metrics_xml is None:
             click.echo(f"Don't have code clone genealogy to {settings['git_repository']}")
             return
-        write_xml_result(lineages_xml, metrics_xml, result_path)
+        write_xml_result(lineages, metrics_xml, result_path, output_format or "xml")
         return
     except ValueError as e:
         raise click.UsageError(str(e))
 
 
+@click.command()
+@click.option("--git-repo", "-g", help="Repository whose cache to inspect (default: every cached repository)")
+@click.option("--max-size", help="Evict least recently used entries until the cache fits, e.g. 500M or 2G")
+def cache(git_repo, max_size):
+    """Report the size of the clone detector cache and prune it with LRU eviction."""
+    workspace_root = Path(__file__).resolve().parent / "cloned_repositories"
+    if git_repo:
+        repo_names = [_derive_repo_name(Settings(git_url=git_repo))]
+    elif workspace_root.is_dir():
+        repo_names = sorted(d.name for d in workspace_root.iterdir() if (d / "cache").is_dir())
+    else:
+        repo_names = []
+
+    try:
+        limit = parse_size(max_size) if max_size else None
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    if not repo_names:
+        click.echo("No detector cache found.")
+        return
+
+    for name in repo_names:
+        detector_cache = DetectorCache(str(workspace_root / name / "cache"))
+        if limit is not None:
+            removed, freed = detector_cache.prune(limit)
+            click.echo(f"{name}: evicted {removed} entries ({format_size(freed)})")
+        st = detector_cache.stats()
+        click.echo(
+            f"{name}: {st['entries']} entries, {format_size(st['size'])} "
+            f"(least recently used: {describe_age(st['oldest'])}, most recent: {describe_age(st['newest'])})"
+        )
+
+
+
+@click.command()
+@click.option("--git-repo", "-g", help="Repository whose lineage journal to read")
+@click.option("--journal", "journal_path", type=click.Path(exists=True, dir_okay=False),
+              help="Path of a genealogy.journal file, instead of --git-repo")
+@click.option("--output", "-o", type=click.Path(dir_okay=False),
+              help="File to write the genealogy XML to (default: standard output)")
+def journal(git_repo, journal_path, output):
+    """Rebuild the genealogy XML of a running or interrupted analysis from its lineage journal."""
+    if bool(git_repo) == bool(journal_path):
+        raise click.UsageError("Give exactly one of --git-repo and --journal.")
+    if git_repo:
+        workspace_root = Path(__file__).resolve().parent / "cloned_repositories"
+        journal_path = workspace_root / _derive_repo_name(Settings(git_url=git_repo)) / "genealogy.journal"
+        if not journal_path.is_file():
+            raise click.UsageError(f"No lineage journal for {git_repo} ({journal_path}).")
+
+    xml_txt = materialize_journal(str(journal_path))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(xml_txt)
+        click.echo(f"Genealogy written to {output}", err=True)
+    else:
+        click.echo(xml_txt, nl=False)
+
+
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 from urllib.parse import urlparse
 from pathlib import Path
 import click
+from omniccg.genealogy_table import GenealogyTable, TABLE_SUFFIX, save_table
 
 def is_valid_url(url: str) -> bool:
     try:
@@ -9,24 +10,36 @@ def is_valid_url(url: str) -> bool:
     except Exception:
         return False
 
-def write_xml_result(lineages_xml, metrics_xml, result_path: str | None = None):
+def write_xml_result(lineages, metrics_xml, result_path: str | None = None, output_format: str = "xml"):
     """
-    Save XML contents to files:
-      - ccg_data.xml
+    Save the results to files:
+      - ccg_data.xml     (output_format "xml" or "both")
+      - ccg_data.occg    (output_format "table" or "both"; columnar, see omniccg.genealogy_table)
       - ccg_metrics.xml
+    `lineages` is the lineage XML or a GenealogyTable; each is converted to the other as needed.
     If result_path is provided, files are written there; otherwise to CWD.
     """
     out_dir = Path(result_path) if result_path else Path.cwd()
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    dst_lineages = out_dir / "ccg_data.xml"
-    dst_metrics = out_dir / "ccg_metrics.xml"
+    written = []
+    if output_format in ("table", "both"):
+        table = lineages if isinstance(lineages, GenealogyTable) else GenealogyTable.from_xml(lineages)
+        dst_table = out_dir / f"ccg_data{TABLE_SUFFIX}"
+        save_table(str(dst_table), table)
+        written.append(dst_table)
+    if output_format in ("xml", "both"):
+        lineages_xml = lineages.to_xml() if isinstance(lineages, GenealogyTable) else lineages
+        dst_lineages = out_dir / "ccg_data.xml"
+        dst_lineages.write_text(lineages_xml, encoding="utf-8")
+        written.append(dst_lineages)
 
-    dst_lineages.write_text(lineages_xml, encoding="utf-8")
+    dst_metrics = out_dir / "ccg_metrics.xml"
     dst_metrics.write_text(metrics_xml, encoding="utf-8")
+    written.append(dst_metrics)
 
-    click.echo(f"Wrote: {dst_lineages}")
-    click.echo(f"Wrote: {dst_metrics}")
+    for dst in written:
+        click.echo(f"Wrote: {dst}")
 
 
 def enforce_single_selector(user_settings: dict) -> None:
@@ -0,0 +1,93 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# (file, startline, endline) of one clone fragment; a line is None when the detector left it out
+Source = Tuple[str, Optional[int], Optional[int]]
+
+# Element of a clone class and of its fragments, per schema:
+#   NiCad and the detection API:  <clones><class><source file startline endline/>
+#   Simian:                       <simian><check><set><block sourceFile startLineNumber endLineNumber/>
+CLASS_TAGS = {"class": ("source", ("file", "startline", "endline")),
+              "set": ("block", ("sourceFile", "startLineNumber", "endLineNumber"))}
+ROOT_TAGS = ("clones", "simian")
+
+CHUNK_SIZE = 1 << 16
+
+
+def _line(value: Optional[str]) -> Optional[int]:
+    return int(value) if value not in (None, "") else None
+
+
+def _xml_start(head: str) -> int:
+    """
+    Offset where the XML document starts. Simian prints its banner on stdout before the
+    declaration, so the text before the declaration (or the root element) is skipped.
+    """
+    for marker in ("<?xml", "<simian", "<clones"):
+        pos = head.find(marker)
+        if pos != -1:
+            return pos
+    return head.find("<")
+
+
+def _chunks(xml_input: Union[str, bytes], chunk_size: int) -> Iterator[str]:
+    """Text of a detector result (a file path or the XML itself), starting at the document."""
+    if isinstance(xml_input, bytes):
+        xml_input = xml_input.decode("utf-8", errors="ignore")
+    if xml_input.lstrip().startswith("<") or "\n" in xml_input:
+        fp = None
+        reader = iter([xml_input])
+    else:
+        if not os.path.exists(xml_input):
+            raise FileNotFoundError(f"XML file not found: {xml_input}")
+        fp = open(xml_input, "r", encoding="utf-8", errors="ignore")
+        reader = iter(lambda: fp.read(chunk_size), "")
+    try:
+        head = ""
+        for chunk in reader:
+            head += chunk
+            pos = _xml_start(head)
+            if pos != -1:
+                yield head[pos:]
+                break
+        else:
+            raise ValueError("Content does not appear to contain valid XML.")
+        yield from reader
+    finally:
+        if fp is not None:
+            fp.close()
+
+
+def _classes(events: Iterable[Tuple[str, ET.Element]], stack: List[ET.Element]) -> Iterator[List[Source]]:
+    for event, elem in events:
+        if event == "start":
+            if not stack and elem.tag not in ROOT_TAGS:
+                raise ValueError(f"Unexpected root tag '{elem.tag}', expected 'clones' or 'simian'.")
+            stack.append(elem)
+            continue
+        stack.pop()
+        schema = CLASS_TAGS.get(elem.tag)
+        if schema is None:
+            continue
+        fragment_tag, (file_attr, start_attr, end_attr) = schema
+        yield [(src.get(file_attr), _line(src.get(start_attr)), _line(src.get(end_attr)))
+               for src in elem.iter(fragment_tag)]
+        # Drop the finished class from the tree, so memory stays bounded by the largest class
+        if stack:
+            del stack[-1][:]
+
+
+def iter_clone_classes(xml_input: Union[str, bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[List[Source]]:
+    """
+    Yield the fragments of every clone class of a detector result, in document order, while the
+    XML is read. NiCad, Simian and detection API results are read as they are written by the
+    detector, without converting them to another file first.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack: List[ET.Element] = []
+    for chunk in _chunks(xml_input, chunk_size):
+        parser.feed(chunk)
+        yield from _classes(parser.read_events(), stack)
+    parser.close()
+    yield from _classes(parser.read_events(), stack)
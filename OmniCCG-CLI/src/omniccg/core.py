@@ -1,19 +1,18 @@
 import os
-import json
 import time
 import shutil
 import hashlib
-import re
 import platform
 import requests
 import subprocess
 import stat
-from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from xml.dom import minidom
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
-from typing import Union, Dict, Any, List, Iterable, Optional, Tuple
+from typing import Union, Dict, Any, List, Iterable, Iterator, Optional, Tuple
 from git import Repo
 from git.exc import BadName
 from omniccg.process_languages.clean_cs_code import process_directory_cs
@@ -23,10 +22,22 @@ from omniccg.domain.Lineage import Lineage
 from omniccg.domain.CloneFragment import CloneFragment
 from omniccg.domain.CloneClass import CloneClass
 from omniccg.domain.CloneVersion import CloneVersion
+from omniccg.domain.LineageIndex import LineageIndex
+from omniccg.domain.hash_operations import stable_hash, generate_simhashes
+from omniccg.domain.code_operations import decode_with_fallback, clone_fragment_text
 from omniccg.compute_time import timed
-from omniccg.get_method_name import get_enclosing_java_method
-from omniccg.metrics import generate_detailed_report
-from omniccg.analysis import count_functions_in_file
+from omniccg.file_model import FileModelCache
+from omniccg.clone_xml import iter_clone_classes
+from omniccg.metrics import LineageMetrics
+from omniccg.snapshots import SnapshotProvider
+from omniccg.detector_cache import DetectorCache, detector_fingerprint, source_tree_id, parse_size
+from omniccg.blob_memo import blob_memo, DEFAULT_MEMO_SIZE
+from omniccg.dataset_index import dataset_index
+from omniccg.staging import STAGING_MODES, stage_changes, sanitize_directory, write_staged_commit, touches_sources
+from omniccg.journal import LineageJournal
+from omniccg.checkpoint import Checkpoint, hashes_digest, settings_key, save_checkpoint, load_checkpoint, remove_checkpoint
+from omniccg.cancellation import CancelToken, AnalysisCancelled, ignore_interrupts
+from omniccg.genealogy_table import GenealogyTable, OUTPUT_FORMATS, save_table
 
 # =========================
 # Cross‑platform helpers
@@ -195,6 +206,29 @@ class Settings:
 
     language: Optional[str] = None 
 
+    # Number of commits checked out and run through the detector at once
+    jobs: int = 1
+    # "full" re-copies every source file per commit; "incremental" applies the git diff
+    staging: str = "full"
+    # Reuse the previous result for commits that do not touch *.<language> sources
+    skip_unchanged: bool = True
+    # Reuse clone detector results of identical source sets across runs
+    detector_cache: bool = True
+    # Continue from the last checkpoint instead of starting over
+    resume: bool = False
+    # Number of processed commits between two checkpoints
+    checkpoint_interval: int = 10
+    # Rewrite the full genealogy XML every N commits (0 = only at the end; the journal is always kept)
+    lineage_snapshot_interval: int = 0
+    # Stop matching against lineages whose last version is more than N commits old (0 = never)
+    archive_after: int = 0
+    # Also keep per-file analysis results (by blob id) in a SQLite file reused by later runs
+    blob_memo_db: bool = False
+    # Memory bound of the in-process per-file memo
+    blob_memo_size: int = DEFAULT_MEMO_SIZE
+    # "xml" writes genealogy.xml, "table" the columnar genealogy.occg instead, "both" writes both
+    output_format: str = "xml"
+
 @dataclass
 class Paths:
     script_dir: str = "scripts"
@@ -212,13 +246,28 @@ class Paths:
     hist_file: str = field(default_factory=lambda: os.path.join("workspace", "githistory.txt"))  # overwritten in main()
     metrics_xml: str = field(default_factory=lambda: os.path.join("workspace", "metrics.xml"))  # overwritten in main()
     p_res_file: str = field(default_factory=lambda: os.path.join("final_results", "production_results.xml"))
+    p_table_file: str = field(default_factory=lambda: os.path.join("final_results", "production_results.occg"))
     p_dens_file: str = field(default_factory=lambda: os.path.join("final_results", "production_density.csv"))
+    p_repo_dens_file: str = field(default_factory=lambda: os.path.join("final_results", "function_density.csv"))
+    cache_dir: str = "cache"  # overwritten in main()
+    checkpoint_file: str = "checkpoint.bin"  # overwritten in main()
+    journal_file: str = "genealogy.journal"  # overwritten in main()
+    blob_memo_file: str = "blob_memo.sqlite"  # overwritten in main()
+    cancel_file: str = "cancel.flag"  # overwritten in main()
 
 @dataclass
 class State:
     # Data accumulated in memory
     p_lin_data: List["Lineage"] = field(default_factory=list)
     p_dens_data: List[Tuple[int, float, float]] = field(default_factory=list)
+    # (commit, cloned functions over all functions of the dataset)
+    p_repo_dens_data: List[Tuple[int, float]] = field(default_factory=list)
+    # Records the lineage changes of each commit; None when nothing is journaled
+    journal: Optional[LineageJournal] = None
+    # Lookup of the active (not archived) lineages a clone class may match; built on first use
+    lineage_index: Optional[LineageIndex] = None
+    # Counters of the metrics report, updated with every lineage change
+    lineage_metrics: LineageMetrics = field(default_factory=LineageMetrics)
 
 
 @dataclass
@@ -226,6 +275,22 @@ class Context:
     settings: Settings
     paths: Paths
     state: State
+    # Checked between pipeline stages; never cancelled unless the caller passes its own
+    cancel: CancelToken = field(default_factory=CancelToken)
+
+
+@dataclass
+class CommitAnalysis:
+    # Result of the per-commit stages that run ahead of the genealogy step
+    nr: int
+    hash: str
+    has_source: bool = False
+    cloneclasses: List["CloneClass"] = field(default_factory=list)
+    density_f_p: float = 0.0
+    density_f_repo: float = 0.0
+    total_loc: int = 0
+    # Set when no relevant source changed since the last analysed commit
+    reused: bool = False
 
 # =========================
 # Auxiliary parsers
@@ -282,8 +347,8 @@ def parseLineageFile(filename):
                         cc,
                         version.get("hash"),
                         int(version.get("nr")),
-                        version.get("evolution"),
-                        version.get("change"),
+                        evo=version.get("evolution"),
+                        chan=version.get("change"),
                     )
                     lin.versions.append(cv)
                 lineages.append(lin)
@@ -297,35 +362,12 @@ def parseLineageFile(filename):
 def _read_text_with_fallback(path):
     with open(path, "rb") as f:
         data = f.read()
-    for enc in ("utf-8", "cp1252", "latin-1"):
-        try:
-            return data.decode(enc)
-        except UnicodeDecodeError:
-            continue
-    return data.decode("utf-8", errors="ignore")
+    return decode_with_fallback(data)
 
 
 def GetCloneFragment(filename, startline, endline):
     text = _read_text_with_fallback(filename)
-    lines_out = [""]
-    remove_ws = False
-    for i, raw in enumerate(text.splitlines(True)):
-        if i >= (startline - 1):
-            base = raw.split("//", 1)[0]
-            if base.strip() == "":
-                continue
-            l = base.rstrip()
-            if remove_ws:
-                l = l.lstrip()
-                remove_ws = False
-            if len(l) > 2 and l[-1] not in ";{":
-                remove_ws = True
-            else:
-                l = l + "\n"
-            lines_out.append(l)
-        if i >= (endline - 1):
-            break
-    return "".join(lines_out)
+    return clone_fragment_text(text.splitlines(True), startline, endline)
 
 
 def GetPattern(v1: CloneVersion, v2: CloneVersion):
@@ -491,6 +533,15 @@ def PrepareSourceCode(ctx: "Context") -> bool:
         printError(f"Repository directory not found: {repo_root}")
         return False
 
+    staged_commit_file = os.path.join(p.data_dir, "staged_commit.txt")
+    if s.staging == "incremental":
+        os.makedirs(p.res_dir, exist_ok=True)
+        os.makedirs(p.clone_detector_dir, exist_ok=True)
+        staged = stage_changes(repo_root, p.prod_data_dir, staged_commit_file, s.language)
+        if staged is not None:
+            print("Source code ready for clone analysis (incremental).\n")
+            return staged
+
     # Reset output dirs
     if os.path.exists(p.data_dir):
         safe_rmtree(p.data_dir)
@@ -530,77 +581,79 @@ def PrepareSourceCode(ctx: "Context") -> bool:
         else:
             found = True
 
+    if s.staging == "incremental":
+        sanitize_directory(p.prod_data_dir, s.language)
+        write_staged_commit(repo_root, staged_commit_file)
+
     print("Source code ready for clone analysis.\n")
     return found
 
 
-def StartFromPreviousVersion(ctx: "Context") -> int:
-    p = ctx.paths
-    if not os.path.exists(p.res_dir):
-        os.makedirs(p.res_dir, exist_ok=True)
-        return 0
-    return 0
+def GenealogySettingsKey(ctx: "Context") -> str:
+    s = ctx.settings
+    # archive_after decides which lineages a class can still match, so it shapes the genealogy too
+    return settings_key(s.git_url, s.local_path, s.language, s.clone_detector_tool, s.detection_api,
+                        s.archive_after)
 
 
-def parse_clones_xml(xml_input: Union[str, bytes]) -> Dict[str, Any]:
-    if isinstance(xml_input, (bytes,)):
-        root = ET.fromstring(xml_input)
-    elif isinstance(xml_input, str) and (xml_input.strip().startswith("<") or "\n" in xml_input):
-        root = ET.fromstring(xml_input)
-    else:
-        if not os.path.exists(xml_input):
-            raise FileNotFoundError(f"XML file not found: {xml_input}")
-        tree = ET.parse(xml_input)
-        root = tree.getroot()
+def StartFromPreviousVersion(ctx: "Context", hashes: List[str]) -> Optional[Checkpoint]:
+    """
+    Restore the genealogy state of the last checkpoint when resuming.
+    The checkpoint is only used if it was taken with the same settings and its processed
+    hashes are still the first hashes of the current history.
+    """
+    s, p, st = ctx.settings, ctx.paths, ctx.state
+    os.makedirs(p.res_dir, exist_ok=True)
+    if not s.resume:
+        remove_checkpoint(p.checkpoint_file)
+        return None
+
+    checkpoint = load_checkpoint(p.checkpoint_file)
+    if checkpoint is None:
+        printWarning("No usable checkpoint found; starting from the first commit.")
+        return None
+    if (
+        checkpoint.settings_key != GenealogySettingsKey(ctx)
+        or checkpoint.last_index > len(hashes)
+        or checkpoint.hashes_digest != hashes_digest(hashes[:checkpoint.last_index])
+    ):
+        printWarning("Checkpoint does not match the current settings or commit history; starting from the first commit.")
+        return None
+
+    st.p_lin_data = checkpoint.lineages
+    st.p_dens_data = checkpoint.densities
+    st.p_repo_dens_data = checkpoint.repo_densities
+    st.lineage_metrics.reset(st.p_lin_data)
+    printInfo(f"Resuming after commit nr.{checkpoint.last_index} of {len(hashes)}")
+    return checkpoint
+
+
+def SaveCheckpoint(ctx: "Context", hashes: List[str], last_index: int,
+                   previous_analysis: Optional[CommitAnalysis], elapsed: float) -> None:
+    st = ctx.state
+    save_checkpoint(ctx.paths.checkpoint_file, Checkpoint(
+        last_index=last_index,
+        hashes_digest=hashes_digest(hashes[:last_index]),
+        settings_key=GenealogySettingsKey(ctx),
+        lineages=st.p_lin_data,
+        densities=st.p_dens_data,
+        repo_densities=st.p_repo_dens_data,
+        previous_nr=previous_analysis.nr if previous_analysis else None,
+        previous_hash=previous_analysis.hash if previous_analysis else None,
+        previous_has_source=previous_analysis.has_source if previous_analysis else False,
+        elapsed=elapsed,
+        journal_offset=st.journal.tell() if st.journal else None,
+    ))
 
-    if root.tag != "clones":
-        raise ValueError(f"Unexpected root tag '{root.tag}', expected 'clones'.")
 
+def parse_clones_xml(xml_input: Union[str, bytes]) -> Dict[str, Any]:
     result: Dict[str, List[Dict[str, Any]]] = {"clones": []}
-    for class_el in root.findall("class"):
-        class_dict = {"sources": []}
-        for src in class_el.findall("source"):
-            file_path = src.get("file")
-            startline = int(src.get("startline")) if src.get("startline") is not None else None
-            endline = int(src.get("endline")) if src.get("endline") is not None else None
-            class_dict["sources"].append({"file": file_path, "startline": startline, "endline": endline})
-        result["clones"].append(class_dict)
+    for sources in iter_clone_classes(xml_input):
+        result["clones"].append({"sources": [{"file": file_path, "startline": startline, "endline": endline}
+                                             for file_path, startline, endline in sources]})
     return result
 
 
-def parse_simian_to_clones(simian_xml: str) -> None:
-    raw = open(simian_xml, 'r', encoding='utf-8', errors='ignore').read()
-    pos = raw.find("<simian")
-    if pos == -1:
-        pos = raw.find("<")
-        if pos == -1:
-            raise ValueError("Content does not appear to contain valid XML.")
-    xml = raw[pos:]
-    xml = re.sub(r"<!--.*?-->", "", xml, flags=re.DOTALL)
-    xml = re.sub(r"<\?.*?\?>", "", xml, flags=re.DOTALL)
-
-    clean_xml = xml.strip()
-    root = ET.fromstring(clean_xml)
-    check = root.find("check")
-    if check is None:
-        raise ValueError("Invalid XML: <check> node not found.")
-
-    clones = ET.Element("clones")
-    for set_node in check.findall("set"):
-        class_el = ET.SubElement(clones, "class")
-        for block in set_node.findall("block"):
-            source_file = block.get("sourceFile")
-            start = block.get("startLineNumber")
-            end = block.get("endLineNumber")
-            ET.SubElement(class_el, "source", {"file": source_file, "startline": start or "", "endline": end or ""})
-
-    rough = ET.tostring(clones, encoding="utf-8")
-    reparsed = minidom.parseString(rough)
-    result_xml = reparsed.toprettyxml(indent="  ", encoding="utf-8").decode("utf-8")
-    with open(simian_xml, "w", encoding="utf-8") as f:
-        f.write(result_xml)
-
-
 def find_method_end(lines, decl_line, brace_col):
     depth = 0
     for li in range(decl_line - 1, len(lines)):
@@ -674,24 +727,31 @@ def RunCloneDetection(ctx: "Context", current_hash: str):
 
 
     tool = (s.clone_detector_tool or "").casefold()
-    if s.language == "py":
-        process_directory_py(p.prod_data_dir)
-    elif s.language == "cs":
-        process_directory_cs(p.prod_data_dir)
-    elif s.language == "rb":
-        process_directory_rb(p.prod_data_dir)
+    # Incremental staging already sanitized each file when it was copied
+    if s.staging != "incremental":
+        if s.language == "py":
+            process_directory_py(p.prod_data_dir)
+        elif s.language == "cs":
+            process_directory_cs(p.prod_data_dir)
+        elif s.language == "rb":
+            process_directory_rb(p.prod_data_dir)
 
     if tool == "nicad":
         print(" >>> Running nicad6...")
         os.makedirs(p.cur_res_dir, exist_ok=True)
 
-        subprocess.run(["./nicad6", "functions", s.language, p.prod_data_dir],
-                    cwd=Path(p.tools_dir) / "NiCad",
-                    check=True)
+        clones_dir = Path(f"{p.prod_data_dir}_functions-clones")
+        try:
+            ctx.cancel.run(["./nicad6", "functions", s.language, p.prod_data_dir],
+                           cwd=Path(p.tools_dir) / "NiCad",
+                           check=True)
+        except AnalysisCancelled:
+            # nicad6 was terminated: drop its partial output right away
+            shutil.rmtree(clones_dir, ignore_errors=True)
+            raise
 
         nicad_xml = f"{p.prod_data_dir}_functions-clones/production_functions-clones-0.30-classes.xml"
         shutil.move(nicad_xml, p.clone_detector_xml)
-        clones_dir = Path(f"{p.prod_data_dir}_functions-clones")
         shutil.rmtree(clones_dir, ignore_errors=True)
 
         data_dir = Path(ctx.paths.data_dir)
@@ -703,18 +763,16 @@ def RunCloneDetection(ctx: "Context", current_hash: str):
             except PermissionError:
                 pass
 
-        xml_path = Path(p.clone_detector_xml)
-        new_xml_data = xml_path.read_text(encoding="utf-8")
-        xml_path.write_text(new_xml_data, encoding="utf-8")
         return
 
     if tool == "simian":
         print(" >>> Running Simian...")
-        java_jar_command = f"java -jar {os.path.join(p.tools_dir, 'simian', 'simian-4.0.0.jar')}"
-        options_command = "-formatter=xml -threshold=20"
-        simian_command = f'{java_jar_command} {options_command} "{p.prod_data_dir}/**/*.java" > "{p.clone_detector_xml}"'
-        os.system(simian_command)
-        parse_simian_to_clones(p.clone_detector_xml)
+        simian_command = ["java", "-jar", os.path.join(p.tools_dir, 'simian', 'simian-4.0.0.jar'),
+                          "-formatter=xml", "-threshold=20", f"{p.prod_data_dir}/**/*.java"]
+        # Simian expands the pattern itself; its exit code reports whether duplicates were found
+        with open(p.clone_detector_xml, "wb") as out:
+            ctx.cancel.run(simian_command, stdout=out)
+        # The raw Simian report is read as is by parseCloneClassFile
         print("Finished clone detection.\n")
         return
 
@@ -724,23 +782,54 @@ def RunCloneDetection(ctx: "Context", current_hash: str):
     print("Finished clone detection.\n")
 
 
+def DetectClones(ctx: "Context", current_hash: str):
+    """Run clone detection, or restore its result XML from the detector cache when the source set was seen before."""
+    s, p = ctx.settings, ctx.paths
+    tool = (s.clone_detector_tool or "").casefold()
+    cacheable = s.detector_cache and tool in ("nicad", "simian") and not (isinstance(s.detection_api, str) and s.detection_api.strip())
+    tree_id = source_tree_id(p.repo_dir, s.language) if cacheable else None
+    if not tree_id:
+        RunCloneDetection(ctx, current_hash)
+        return
+
+    cache = DetectorCache(p.cache_dir)
+    version, options = detector_fingerprint(tool, p.tools_dir)
+    key = cache.make_key(tree_id, tool, version, options, s.language)
+    os.makedirs(p.clone_detector_dir, exist_ok=True)
+    if cache.get(key, p.prod_data_dir, p.clone_detector_xml):
+        print(" >>> Clone detection result restored from cache.\n")
+        return
+
+    RunCloneDetection(ctx, current_hash)
+    if os.path.exists(p.clone_detector_xml):
+        cache.put(key, p.clone_detector_xml, p.prod_data_dir)
+
+
 def parseCloneClassFile(ctx: "Context", cloneclass_filename: str) -> List[CloneClass]:
     cloneclasses: List[CloneClass] = []
+    # Every source file is read once per commit, however many fragments it holds
+    files = FileModelCache()
     try:
-        file_xml = ET.parse(cloneclass_filename)
-        root = file_xml.getroot()
-        for child in root:
-            cc = CloneClass()
-            fragments = list(child)
+        classes = []
+        # Streamed: the detector XML is never held in memory as a whole
+        for fragments in iter_clone_classes(cloneclass_filename):
             if not fragments:
                 continue
-            for fragment in fragments:
-                file_path = fragment.get("file")
-                startline = int(fragment.get("startline"))
-                endline = int(fragment.get("endline"))
-                method_name = get_enclosing_java_method(file_path, startline, endline)
-                cf = CloneFragment(file_path, startline, endline, method_name)
-                cf.function_hash = hash(GetCloneFragment(cf.file, cf.ls, cf.le))
+            entries = []
+            for file_path, startline, endline in fragments:
+                source = files.get(file_path)
+                method_name = source.method_at(startline, endline)
+                entries.append((file_path, startline, endline, method_name, source.code_content(startline, endline)))
+            classes.append(entries)
+
+        # SimHash all fragments of the commit in one batch
+        simhashes = iter(generate_simhashes([entry[4] for entries in classes for entry in entries]))
+        for entries in classes:
+            cc = CloneClass()
+            for file_path, startline, endline, method_name, code_content in entries:
+                cf = CloneFragment(file_path, startline, endline, method_name,
+                                   code_content=code_content, simhash=next(simhashes))
+                cf.function_hash = stable_hash(files.get(cf.file).fragment_text(cf.ls, cf.le))
                 cc.fragments.append(cf)
             cloneclasses.append(cc)
     except Exception as e:
@@ -750,15 +839,8 @@ def parseCloneClassFile(ctx: "Context", cloneclass_filename: str) -> List[CloneC
 
 
 def CheckDoubleMatch(cc_original: CloneClass, cc1: CloneClass, cc2: CloneClass) -> int:
-    cc1_strict_match = False
-    cc2_strict_match = False
-    for fragment in cc_original.fragments:
-        for f1 in cc1.fragments:
-            if fragment.matchesStrictly(f1):
-                cc1_strict_match = True
-        for f2 in cc2.fragments:
-            if fragment.matchesStrictly(f2):
-                cc2_strict_match = True
+    cc1_strict_match = any(cc1.containsStrictly(fragment) for fragment in cc_original.fragments)
+    cc2_strict_match = any(cc2.containsStrictly(fragment) for fragment in cc_original.fragments)
     if cc1_strict_match == cc2_strict_match:
         return 0
     if cc1_strict_match:
@@ -769,87 +851,96 @@ def CheckDoubleMatch(cc_original: CloneClass, cc1: CloneClass, cc2: CloneClass)
 
 
 # =========================
-# Metrics (cloc cross‑platform)
+# Metrics
 # =========================
 
-def _cloc_total_loc(path: str) -> int:
-    """Try to compute total LOC using cloc --json. Fallback to manual counting."""
-    # Prefer cloc under tools/cloc; otherwise use PATH
-    candidates = [
-        os.path.join(Path(path).parents[2], "tools", "cloc", "cloc-1.72.pl"),  # original layout
-        which("cloc"),  # cloc exe
-    ]
-    cloc_path = next((c for c in candidates if c and os.path.exists(str(c))), None)
-
-    if cloc_path:
-        # Try JSON output to avoid grep/pipe
-        try:
-            if cloc_path.endswith(".pl"):
-                perl = which("perl")
-                if not perl:
-                    raise FileNotFoundError("Perl not found for cloc-1.72.pl; will use Python fallback.")
-                proc = run_cmd([perl, cloc_path, "--json", path])
-            else:
-                proc = run_cmd([cloc_path, "--json", path])
-            data = json.loads(proc.stdout or '{}')
-            if "SUM" in data and isinstance(data["SUM"], dict):
-                # JSON has code/comment/blank
-                return int(data["SUM"].get("code", 0)) + int(data["SUM"].get("comment", 0)) + int(data["SUM"].get("blank", 0))
-        except Exception as e:
-            printWarning(f"cloc JSON parsing failed, using fallback: {e}")
-
-    # Fallback: manual LOC (non-empty lines)
-    total = 0
-    for file in Path(path).rglob("*"):
-        if file.is_file():
-            try:
-                with open(file, "r", encoding="utf-8", errors="ignore") as f:
-                    total += sum(1 for line in f)
-            except Exception:
-                pass
-    return total
-
-
-def RunDensityAnalysis(ctx: "Context", commitNr: int, pcloneclasses: List[CloneClass]):
-    s, p, st = ctx.settings, ctx.paths, ctx.state
-    if not os.path.exists(p.clone_detector_xml):
-        st.p_dens_data.append((commitNr, 0, 0))
+def PrepareDensityAnalysis(ctx: "Context", analysis: CommitAnalysis):
+    """Measure the parts of the clone density that only depend on the checked-out commit."""
+    s, p = ctx.settings, ctx.paths
+    if len(analysis.cloneclasses) == 0:
         return
 
-    current_clones = parseCloneClassFile(ctx, p.clone_detector_xml)
-    if len(current_clones) == 0:
-        st.p_dens_data.append((commitNr, 0, 0))
-        return
+    # Per-file LOC and function counts of the staged dataset, updated for the changed files only
+    index = dataset_index(p.prod_data_dir, p.repo_dir, s.language, s.staging == "incremental")
 
     all_paths = set()
-    for clone in current_clones:
+    for clone in analysis.cloneclasses:
         for fr in clone.fragments:
             all_paths.add(fr.file)
 
-    total_amount_of_p_functions = sum([count_functions_in_file(path, s.language) for path in all_paths])
+    total_amount_of_p_functions = sum([index.function_count(path) for path in all_paths])
 
     all_sources: List[CloneFragment] = []
-    for clone in current_clones:
+    for clone in analysis.cloneclasses:
         all_sources.extend(clone.fragments)
 
     amount_of_cloned_p_functions = len(all_sources)
     try:
-        density_f_p = 100 * (float(amount_of_cloned_p_functions) / total_amount_of_p_functions)
+        analysis.density_f_p = 100 * (float(amount_of_cloned_p_functions) / total_amount_of_p_functions)
     except Exception:
-        density_f_p = 0.0
+        analysis.density_f_p = 0.0
+    # Cloned functions over all functions of the dataset, not only those of the cloned files
+    analysis.density_f_repo = 100 * (float(amount_of_cloned_p_functions) / index.functions) if index.functions else 0.0
 
-    total_amount_of_p_loc = _cloc_total_loc(ctx.paths.prod_data_dir)
+    # Counted in-process, as cloc would (code + comment + blank, identical files once)
+    analysis.total_loc = index.loc
+
+
+def RunDensityAnalysis(ctx: "Context", commitNr: int, pcloneclasses: List[CloneClass], analysis: CommitAnalysis):
+    st = ctx.state
+    if len(analysis.cloneclasses) == 0:
+        st.p_dens_data.append((commitNr, 0, 0))
+        st.p_repo_dens_data.append((commitNr, 0))
+        return
+
+    total_amount_of_p_loc = analysis.total_loc
 
     amount_of_cloned_p_loc = sum(cc.countLOC() for cc in pcloneclasses)
     density_loc_p = 100 * (float(amount_of_cloned_p_loc) / total_amount_of_p_loc) if total_amount_of_p_loc else 0.0
 
-    st.p_dens_data.append((commitNr, density_f_p, density_loc_p))
+    st.p_dens_data.append((commitNr, analysis.density_f_p, density_loc_p))
+    st.p_repo_dens_data.append((commitNr, analysis.density_f_repo))
+
+
+def AddLineage(st: "State", version: CloneVersion):
+    l = Lineage()
+    l.versions.append(version)
+    st.p_lin_data.append(l)
+    if st.journal:
+        st.journal.added(l)
+    st.lineage_metrics.added(l)
+    if st.lineage_index:
+        st.lineage_index.added(l)
+
 
+def MarkLineageChanged(st: "State", lineage: Lineage, first: int):
+    # Versions of the lineage from index `first` on are about to be added or modified
+    if st.journal:
+        st.journal.changed(lineage, first)
+    st.lineage_metrics.changed(lineage, first)
+    if st.lineage_index:
+        st.lineage_index.invalidate(lineage)
 
-def RunGenealogyAnalysis(ctx: "Context", commitNr: int, hash_: str):
+
+def GetActiveLineages(ctx: "Context", commitNr: int) -> LineageIndex:
+    """
+    Return the lineage index after archiving the lineages that stopped evolving.
+    Archived lineages stay in st.p_lin_data, so they are still written and measured.
+    """
+    s, st = ctx.settings, ctx.state
+    if st.lineage_index is None:
+        st.lineage_index = LineageIndex(st.p_lin_data)
+    if s.archive_after > 0:
+        archived = st.lineage_index.archive_older_than(commitNr, s.archive_after)
+        if archived:
+            printInfo(f"Archived {archived} lineage(s) without changes in the last {s.archive_after} commits")
+    return st.lineage_index
+
+
+def RunGenealogyAnalysis(ctx: "Context", commitNr: int, hash_: str, analysis: CommitAnalysis):
     s, p, st = ctx.settings, ctx.paths, ctx.state
     print(f"Extract Code Code Genealogy (CCG) - Hash Commit {hash_}")
-    pcloneclasses = parseCloneClassFile(ctx, p.clone_detector_xml)
+    pcloneclasses = list(analysis.cloneclasses)
 
     if commitNr == 3:
         print('')
@@ -858,14 +949,14 @@ def RunGenealogyAnalysis(ctx: "Context", commitNr: int, hash_: str):
         print('')
     if not st.p_lin_data:
         for pcc in pcloneclasses:
-            v = CloneVersion(pcc, hash_, commitNr)
-            l = Lineage()
-            l.versions.append(v)
-            st.p_lin_data.append(l)
+            AddLineage(st, CloneVersion(pcc, hash_, commitNr))
     else:
+        lineage_index = GetActiveLineages(ctx, commitNr)
         for pcc in pcloneclasses:
             found = False
-            for lineage in st.p_lin_data:
+            # Same scan as over all of st.p_lin_data, restricted to active lineages that can match
+            for position in lineage_index.candidates(pcc):
+                lineage = st.p_lin_data[position]
                 if lineage.matches(pcc):
                     if lineage.versions[-1].nr == commitNr:
                         if len(lineage.versions) < 2:
@@ -879,6 +970,7 @@ def RunGenealogyAnalysis(ctx: "Context", commitNr: int, hash_: str):
                             continue
                         elif checkDoubleMatch == 2:
                             pcloneclasses.append(lineage.versions[-1].cloneclass)
+                            MarkLineageChanged(st, lineage, len(lineage.versions) - 1)
                             lineage.versions.pop()
 
                     evolution, change = GetPattern(lineage.versions[-1], CloneVersion(pcc))
@@ -888,19 +980,43 @@ def RunGenealogyAnalysis(ctx: "Context", commitNr: int, hash_: str):
                         and lineage.versions[-1].evolution_pattern == "Same"
                         and lineage.versions[-1].change_pattern == "Same"
                     ):
+                        MarkLineageChanged(st, lineage, len(lineage.versions) - 1)
                         lineage.versions[-1].nr = commitNr
                         lineage.versions[-1].hash = hash_
                     else:
-                        lineage.versions.append(CloneVersion(pcc, hash_, commitNr, evolution, change))
+                        MarkLineageChanged(st, lineage, len(lineage.versions))
+                        lineage.versions.append(CloneVersion(pcc, hash_, commitNr, evo=evolution, chan=change))
                     found = True
                     break
             if not found:
-                v = CloneVersion(pcc, hash_, commitNr)
-                l = Lineage()
-                l.versions.append(v)
-                st.p_lin_data.append(l)
+                AddLineage(st, CloneVersion(pcc, hash_, commitNr))
+
+    RunDensityAnalysis(ctx, commitNr, pcloneclasses, analysis)
+
+
+def RunUnchangedCommit(ctx: "Context", commitNr: int, hash_: str, previousNr: int):
+    """
+    Extend the genealogy for a commit whose sources equal those of commit `previousNr`:
+    every lineage alive there gets a Same/Same version and the density point is repeated.
+    """
+    st = ctx.state
+    print(f"Extract Code Code Genealogy (CCG) - Hash Commit {hash_} (no source changes)")
+    for lineage in GetActiveLineages(ctx, commitNr).active():
+        last = lineage.versions[-1]
+        if last.nr != previousNr:
+            continue
+        if last.evolution_pattern == "Same" and last.change_pattern == "Same":
+            MarkLineageChanged(st, lineage, len(lineage.versions) - 1)
+            last.nr = commitNr
+            last.hash = hash_
+        else:
+            MarkLineageChanged(st, lineage, len(lineage.versions))
+            lineage.versions.append(CloneVersion(last.cloneclass, hash_, commitNr, evo="Same", chan="Same"))
 
-    RunDensityAnalysis(ctx, commitNr, pcloneclasses)
+    _, density_f_p, density_loc_p = st.p_dens_data[-1] if st.p_dens_data else (previousNr, 0, 0)
+    st.p_dens_data.append((commitNr, density_f_p, density_loc_p))
+    _, density_f_repo = st.p_repo_dens_data[-1] if st.p_repo_dens_data else (previousNr, 0)
+    st.p_repo_dens_data.append((commitNr, density_f_repo))
 
 
 def build_no_clones_message(detector: Optional[str]) -> str:
@@ -960,23 +1076,26 @@ def build_genealogy_xml(lineages_xml: str, metrics_xml: str) -> str:
 
 
 def WriteLineageFile(ctx: "Context", lineages: List[Lineage], filename: str):
-    xml_txt = "<lineages>\n"
+    xml_txt = "".join(["<lineages>\n", *(lineage.toXML() for lineage in lineages), "</lineages>\n"])
 
     with open(filename, "w+", encoding="utf-8") as output_file:
-        output_file.write("<lineages>\n")
-        for lineage in lineages:
-            output_file.write(lineage.toXML())
-            xml_txt += lineage.toXML()
-        output_file.write("</lineages>\n")
-        xml_txt += "</lineages>\n"
+        output_file.write(xml_txt)
 
     return xml_txt
 
 
-def WriteDensityFile(ctx: "Context", densitys: List[Tuple[int, float, float]], filename: str):
+def WriteGenealogyTable(ctx: "Context", last_version: int, filename: str) -> GenealogyTable:
+    """Write the genealogy as a columnar table (see omniccg.genealogy_table); no XML is built."""
+    table = GenealogyTable.from_lineages(ctx.state.p_lin_data, last_version, ctx.state.p_dens_data,
+                                         ctx.state.p_repo_dens_data)
+    save_table(filename, table)
+    return table
+
+
+def WriteDensityFile(ctx: "Context", densitys: List[Tuple], filename: str):
     with open(filename, "w+", encoding="utf-8") as output_file:
         for density in densitys:
-            output_file.write(f"{density[0]}, {density[1]}, {density[2]}\n")
+            output_file.write(", ".join(str(value) for value in density) + "\n")
 
 
 def timeToString(seconds):
@@ -992,6 +1111,172 @@ def timeToString(seconds):
     return result
 
 
+# =========================
+# Commit pipeline (serial or windowed over a process pool)
+# =========================
+
+def AnalyzeCommit(ctx: "Context", commitNr: int, current_hash: str, snapshots: SnapshotProvider, slot: int) -> CommitAnalysis:
+    """Materialize, stage, detect and parse one commit; everything before the genealogy step."""
+    p = ctx.paths
+    p.cur_res_dir = os.path.join(p.res_dir, f"{commitNr}_{current_hash}")
+    analysis = CommitAnalysis(commitNr, current_hash)
+
+    ctx.cancel.check()
+    snapshots.materialize(slot, current_hash)
+
+    if not PrepareSourceCode(ctx):
+        return analysis
+    analysis.has_source = True
+
+    ctx.cancel.check()
+    DetectClones(ctx, current_hash)
+    ctx.cancel.check()
+    s = ctx.settings
+    # Worker processes configure their own copy of the memo
+    blob_memo.configure(s.blob_memo_size, p.blob_memo_file if s.blob_memo_db else None)
+    analysis.cloneclasses = parseCloneClassFile(ctx, p.clone_detector_xml)
+    PrepareDensityAnalysis(ctx, analysis)
+    blob_memo.flush()
+    safe_rmtree(p.cur_res_dir)
+
+    # Fragments must point at the main repo path, whichever worktree produced them
+    snapshot_dir = os.path.abspath(p.repo_dir)
+    canonical_repo_dir = os.path.abspath(snapshots.repo_dir)
+    for cc in analysis.cloneclasses:
+        for fragment in cc.fragments:
+            if fragment.file.startswith(snapshot_dir):
+                fragment.file = canonical_repo_dir + fragment.file[len(snapshot_dir):]
+    return analysis
+
+
+def SetupSnapshots(ctx: "Context", jobs: int) -> Tuple[SnapshotProvider, List[Paths]]:
+    """Create the worktree pool and one workspace per worktree."""
+    p = ctx.paths
+    snapshots = SnapshotProvider(repo_dir=p.repo_dir, root_dir=os.path.join(p.ws_dir, "workers"), size=jobs)
+    snapshots.setup()
+    return snapshots, [SnapshotPaths(p, snapshots, slot) for slot in range(jobs)]
+
+
+def SnapshotPaths(p: Paths, snapshots: SnapshotProvider, slot: int) -> Paths:
+    """Paths of the workspace that analyzes the commits checked out in the worktree of `slot`."""
+    ws_dir = snapshots.workspace_dir(slot)
+    data_dir = os.path.join(ws_dir, "dataset")
+    clone_detector_dir = os.path.join(ws_dir, "aggregated_results")
+    return replace(
+        p,
+        ws_dir=ws_dir,
+        repo_dir=snapshots.worktree_dir(slot),
+        data_dir=data_dir,
+        prod_data_dir=os.path.join(data_dir, "production"),
+        res_dir=os.path.join(ws_dir, "final_result"),
+        cur_res_dir=os.path.join(ws_dir, "final_result", "0000000"),
+        clone_detector_dir=clone_detector_dir,
+        clone_detector_xml=os.path.join(clone_detector_dir, "result.xml"),
+    )
+
+
+def SelectRelevantCommits(ctx: "Context", hashes: List[str], start: int = 0,
+                          last_analysed: Optional[str] = None) -> List[bool]:
+    """
+    Flag the hashes from `start` on that need clone detection: the first one (unless
+    `last_analysed` is given), and every commit where some *.<language> non-test file
+    changed since the last flagged commit.
+    """
+    s, p = ctx.settings, ctx.paths
+    relevant = [False] * start + [True] * (len(hashes) - start)
+    if not s.skip_unchanged:
+        return relevant
+
+    for hash_index in range(start, len(hashes)):
+        ctx.cancel.check()
+        current_hash = hashes[hash_index]
+        if last_analysed is not None and not touches_sources(p.repo_dir, last_analysed, current_hash, s.language):
+            relevant[hash_index] = False
+            continue
+        last_analysed = current_hash
+
+    skipped = relevant.count(False) - start
+    if skipped:
+        printInfo(f"{skipped} of {len(hashes) - start} commit(s) do not change .{s.language} sources and reuse the previous result")
+    return relevant
+
+
+def _iter_detected_commits(ctx: "Context", hashes: List[str], indices: List[int]) -> Iterator[CommitAnalysis]:
+    jobs = max(1, int(ctx.settings.jobs or 1))
+    if len(indices) < 2:
+        jobs = 1
+    snapshots, workspaces = SetupSnapshots(ctx, jobs)
+    try:
+        if jobs == 1:
+            worker_ctx = Context(settings=ctx.settings, paths=workspaces[0], state=ctx.state, cancel=ctx.cancel)
+            for hash_index in indices:
+                current_hash = hashes[hash_index]
+                printInfo("Analyzing commit nr." + str(hash_index + 1) + " with hash " + current_hash + f"| total commits: {len(hashes)}")
+                yield AnalyzeCommit(worker_ctx, hash_index + 1, current_hash, snapshots, 0)
+            return
+
+        free_slots = list(range(jobs))
+        pending: Dict[Any, Tuple[int, int]] = {}
+        ready: Dict[int, CommitAnalysis] = {}
+        next_submit = 0
+        next_yield = 0
+        # Bound how far detection may run ahead of the genealogy step
+        window = 2 * jobs
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=ignore_interrupts) as pool:
+            try:
+                while next_yield < len(indices):
+                    while free_slots and next_submit < len(indices) and next_submit - next_yield < window:
+                        slot = free_slots.pop()
+                        hash_index = indices[next_submit]
+                        current_hash = hashes[hash_index]
+                        worker_ctx = Context(settings=ctx.settings, paths=replace(workspaces[slot]), state=State(), cancel=ctx.cancel)
+                        printInfo("Analyzing commit nr." + str(hash_index + 1) + " with hash " + current_hash + f"| total commits: {len(hashes)} | worker {slot}")
+                        future = pool.submit(AnalyzeCommit, worker_ctx, hash_index + 1, current_hash, snapshots, slot)
+                        pending[future] = (next_submit, slot)
+                        next_submit += 1
+
+                    if next_yield not in ready:
+                        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                        for future in done:
+                            position, slot = pending.pop(future)
+                            free_slots.append(slot)
+                            ready[position] = future.result()
+
+                    while next_yield in ready:
+                        yield ready.pop(next_yield)
+                        next_yield += 1
+            finally:
+                # Stopped early (cancelled or failed): drop the commits no worker started yet
+                for future in pending:
+                    future.cancel()
+    finally:
+        # Unregister the worktrees from the clone; the next run creates them again
+        snapshots.close()
+
+
+def IterCommitAnalyses(ctx: "Context", hashes: List[str], start: int = 0,
+                       last_analysed: Optional[str] = None) -> Iterator[CommitAnalysis]:
+    """
+    Yield the analysis of every hash from `start` on, in commit order.
+    Each relevant commit is materialized in a worktree of the snapshot pool; with jobs > 1, up to
+    `jobs` commits are detected concurrently while the caller still consumes them in order.
+    Commits without relevant source changes are yielded as `reused` without any detection.
+    """
+    relevant = SelectRelevantCommits(ctx, hashes, start, last_analysed)
+    detected = _iter_detected_commits(ctx, hashes, [i for i, r in enumerate(relevant) if r])
+    try:
+        for hash_index in range(start, len(hashes)):
+            current_hash = hashes[hash_index]
+            if relevant[hash_index]:
+                yield next(detected)
+            else:
+                yield CommitAnalysis(hash_index + 1, current_hash, reused=True)
+    finally:
+        # Shuts the worker pool down when the caller stops early
+        detected.close()
+
+
 # =========================
 # Settings initialization from user dictionary
 # =========================
@@ -1021,6 +1306,15 @@ def init_settings_from_user(general_settings: Dict[str, Any]) -> Settings:
     fixed_leaps = user.get("fixed_leaps")       # optional
 
     clone_detector = user.get("clone_detector")  # optional now; ignored if detection_api set
+    jobs = user.get("jobs") or 1                 # optional; 1 = serial
+    staging = user.get("staging") or "full"      # optional; "full" | "incremental"
+    skip_unchanged = user.get("skip_unchanged")  # optional; defaults to True
+    detector_cache = user.get("detector_cache")  # optional; defaults to True
+    checkpoint_interval = user.get("checkpoint_interval") or 10  # optional; commits between checkpoints
+    lineage_snapshot_interval = user.get("lineage_snapshot_interval") or 0  # optional; 0 = only at the end
+    archive_after = user.get("archive_after") or 0  # optional; 0 = never archive lineages
+    blob_memo_size = user.get("blob_memo_size")  # optional; e.g. "256M"
+    output_format = user.get("output_format") or "xml"  # optional; "xml" | "table" | "both"
 
     s = Settings(
         git_url=git_repository,
@@ -1039,6 +1333,17 @@ def init_settings_from_user(general_settings: Dict[str, Any]) -> Settings:
         commit_leaps=fixed_leaps,
 
         language=user.get("language"),
+        jobs=int(jobs),
+        staging=staging,
+        skip_unchanged=True if skip_unchanged is None else bool(skip_unchanged),
+        detector_cache=True if detector_cache is None else bool(detector_cache),
+        resume=bool(user.get("resume")),
+        checkpoint_interval=int(checkpoint_interval),
+        lineage_snapshot_interval=int(lineage_snapshot_interval),
+        archive_after=int(archive_after),
+        blob_memo_db=bool(user.get("blob_memo_db")),
+        blob_memo_size=DEFAULT_MEMO_SIZE if blob_memo_size is None else parse_size(str(blob_memo_size)),
+        output_format=output_format,
     )
     return s
 
@@ -1088,13 +1393,69 @@ def validate_user_input_or_raise(general_settings: Dict[str, Any]) -> None:
     if dp is not None and not dp_ok:
         raise ValueError("'days_prior' must be an integer > 0 when provided.")
 
+    jobs = user.get("jobs")
+    if jobs is not None and not (isinstance(jobs, int) and jobs > 0):
+        raise ValueError("'jobs' must be an integer > 0 when provided.")
+
+    staging = user.get("staging")
+    if staging is not None and staging not in STAGING_MODES:
+        raise ValueError(f"'staging' must be one of: {', '.join(STAGING_MODES)}.")
+
+    checkpoint_interval = user.get("checkpoint_interval")
+    if checkpoint_interval is not None and not (isinstance(checkpoint_interval, int) and checkpoint_interval > 0):
+        raise ValueError("'checkpoint_interval' must be an integer > 0 when provided.")
+
+    lineage_snapshot_interval = user.get("lineage_snapshot_interval")
+    if lineage_snapshot_interval is not None and not (isinstance(lineage_snapshot_interval, int) and lineage_snapshot_interval >= 0):
+        raise ValueError("'lineage_snapshot_interval' must be an integer >= 0 when provided.")
+
+    archive_after = user.get("archive_after")
+    if archive_after is not None and not (isinstance(archive_after, int) and archive_after >= 0):
+        raise ValueError("'archive_after' must be an integer >= 0 when provided.")
+
+    blob_memo_size = user.get("blob_memo_size")
+    if blob_memo_size is not None:
+        try:
+            parse_size(str(blob_memo_size))
+        except ValueError:
+            raise ValueError("'blob_memo_size' must be a size such as 256M or 1G when provided.")
+
+    output_format = user.get("output_format")
+    if output_format is not None and output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"'output_format' must be one of: {', '.join(OUTPUT_FORMATS)}.")
+
+def ReleaseWorkspace(ctx: "Context"):
+    """
+    Remove the per-commit leftovers of an interrupted analysis, so the workspace can be reused at once.
+    Commits are analyzed in the snapshot workspaces (workers/w<slot>), so each of them is cleaned
+    as well as the top-level one.
+    """
+    p = ctx.paths
+    snapshots = SnapshotProvider(repo_dir=p.repo_dir, root_dir=os.path.join(p.ws_dir, "workers"))
+    for paths in [p] + [SnapshotPaths(p, snapshots, slot) for slot in snapshots.existing_slots()]:
+        for directory in (paths.res_dir, paths.clone_detector_dir, f"{paths.prod_data_dir}_functions-clones"):
+            if os.path.isdir(directory):
+                safe_rmtree(directory)
+    ctx.cancel.clear_flag()
+
+
 @timed()
-def execute_omniccg(general_settings: Dict[str, Any]) -> str:
+def execute_omniccg(general_settings: Dict[str, Any], cancel: Optional[CancelToken] = None) -> str:
+    """
+    Extract the clone genealogy of the configured repository.
+
+    When `cancel` is cancelled, the analysis stops at the next stage boundary (a running clone
+    detector is terminated), the genealogy of the commits processed so far is saved as a
+    checkpoint to continue from with `resume`, and AnalysisCancelled is raised.
+
+    Returns (genealogy_xml, lineages, metrics_xml). With the "table" or "both" output_format the
+    lineages are a GenealogyTable instead of the lineage XML; genealogy_xml is None for "table".
+    """
     validate_user_input_or_raise(general_settings)
     settings = init_settings_from_user(general_settings)
     paths = Paths()
     state = State()
-    ctx = Context(settings=settings, paths=paths, state=state)
+    ctx = Context(settings=settings, paths=paths, state=state, cancel=cancel or CancelToken())
 
     # Resolve package assets relative to this module instead of the process cwd.
     pkg_root_str = str(Path(__file__).resolve().parent)
@@ -1111,7 +1472,14 @@ def execute_omniccg(general_settings: Dict[str, Any]) -> str:
     paths.hist_file = os.path.join(base_dir, "githistory.txt")
     paths.metrics_xml = os.path.join(base_dir, "metrics.xml")
     paths.p_res_file = os.path.join(base_dir, "genealogy.xml")
+    paths.p_table_file = os.path.join(base_dir, "genealogy.occg")
     paths.p_dens_file = os.path.join(base_dir, "density.csv")
+    paths.p_repo_dens_file = os.path.join(base_dir, "function_density.csv")
+    paths.cache_dir = os.path.join(base_dir, "cache")
+    paths.checkpoint_file = os.path.join(base_dir, "checkpoint.bin")
+    paths.journal_file = os.path.join(base_dir, "genealogy.journal")
+    paths.blob_memo_file = os.path.join(paths.cache_dir, "blob_memo.sqlite")
+    paths.cancel_file = os.path.join(base_dir, "cancel.flag")
 
     # Results & detector output
     paths.res_dir = os.path.join(base_dir, "final_result")
@@ -1130,70 +1498,96 @@ def execute_omniccg(general_settings: Dict[str, Any]) -> str:
         safe_rmtree(paths.res_dir)
         os.makedirs(paths.res_dir, exist_ok=True)
 
+    # The flag file carries a cancellation to the --jobs worker processes
+    ctx.cancel.attach(paths.cancel_file)
+
     print("STARTING DATA COLLECTION SCRIPT\n")
+    ctx.cancel.check()
     SetupRepo(ctx)
+    ctx.cancel.check()
     PrepareGitHistory(ctx)
     hashes = GetHashes(ctx)
-    time.sleep(1)
 
     analysis_index = 0
     total_time = 0
-
-    repo = Repo(paths.repo_dir)
-
-    for hash_index in range(len(hashes)):
-        iteration_start_time = time.time()
-        analysis_index += 1
-        current_hash = hashes[hash_index]
-        hi_plus = hash_index + 1
-
-        printInfo("Analyzing commit nr." + str(hi_plus) + " with hash " + current_hash + f"| total commits: {len(hashes)}")
-        paths.cur_res_dir = os.path.join(paths.res_dir, f"{hi_plus}_{current_hash}")
-
-        # Ensure we are at the correct commit
-        try:
-            head_short = repo.git.rev_parse("--short", "HEAD")
-        except Exception:
-            head_short = ""
-        if current_hash not in head_short:
-            try:
-                # Clean Git locks before checkout
-                clean_git_locks(paths.repo_dir)
-                repo.git.checkout(current_hash, f=True)
-            except Exception as e:
-                # Retry once after cleaning locks
-                try:
-                    clean_git_locks(paths.repo_dir)
-                    time.sleep(1)
-                    repo.git.checkout(current_hash, f=True)
-                except Exception:
-                    raise RuntimeError(f"git checkout {current_hash} failed: {e}")
-            time.sleep(0.5)
-
-        # Prepare source and run detection
-        if not PrepareSourceCode(ctx):
-            continue
-
-        RunCloneDetection(ctx, current_hash)
-        RunGenealogyAnalysis(ctx, hi_plus, current_hash)
-        WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
-
-        # Cleanup
-        safe_rmtree(paths.cur_res_dir)
-
-        # Timing
-        iteration_end_time = time.time()
-        iteration_time = iteration_end_time - iteration_start_time
-        total_time += iteration_time
-
-        print("Iteration finished in " + timeToString(int(iteration_time)))
-        avg = int(total_time / analysis_index) if analysis_index else 0
-        remaining = int((total_time / analysis_index) * (len(hashes) - analysis_index)) if analysis_index else 0
-        print(" >>> Average iteration time: " + timeToString(avg))
-        print(" >>> Estimated remaining time: " + timeToString(remaining))
-
-        WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
-        time.sleep(0.5)
+    previous_analysis: Optional[CommitAnalysis] = None
+
+    checkpoint = StartFromPreviousVersion(ctx, hashes)
+    if checkpoint is not None:
+        analysis_index = checkpoint.last_index
+        total_time = checkpoint.elapsed
+        if checkpoint.previous_nr is not None:
+            previous_analysis = CommitAnalysis(checkpoint.previous_nr, checkpoint.previous_hash,
+                                               has_source=checkpoint.previous_has_source)
+    last_checkpoint_index = analysis_index
+    last_snapshot_index = analysis_index
+
+    # Lineage changes are appended per commit; the full XML is only rebuilt when needed
+    state.journal = LineageJournal(paths.journal_file)
+    state.journal.open(state.p_lin_data, checkpoint.journal_offset if checkpoint else None)
+    iteration_start_time = time.time()
+
+    analyses = IterCommitAnalyses(ctx, hashes, analysis_index,
+                                  previous_analysis.hash if previous_analysis else None)
+    try:
+        for analysis in analyses:
+            analysis_index += 1
+
+            if analysis.reused:
+                # Same sources as the last analysed commit: extend its result instead
+                if previous_analysis is None or not previous_analysis.has_source:
+                    iteration_start_time = time.time()
+                    continue
+                RunUnchangedCommit(ctx, analysis.nr, analysis.hash, previous_analysis.nr)
+                previous_analysis = replace(previous_analysis, nr=analysis.nr, hash=analysis.hash)
+            else:
+                previous_analysis = analysis
+
+                # Commits without source files are skipped
+                if not analysis.has_source:
+                    iteration_start_time = time.time()
+                    continue
+
+                RunGenealogyAnalysis(ctx, analysis.nr, analysis.hash, analysis)
+            state.journal.flush(analysis.nr, analysis.hash)
+            state.lineage_metrics.flush()
+
+            # Timing
+            iteration_end_time = time.time()
+            iteration_time = iteration_end_time - iteration_start_time
+            total_time += iteration_time
+
+            print("Iteration finished in " + timeToString(int(iteration_time)))
+            avg = int(total_time / analysis_index) if analysis_index else 0
+            remaining = int((total_time / analysis_index) * (len(hashes) - analysis_index)) if analysis_index else 0
+            print(" >>> Average iteration time: " + timeToString(avg))
+            print(" >>> Estimated remaining time: " + timeToString(remaining))
+
+            if settings.lineage_snapshot_interval and analysis_index - last_snapshot_index >= settings.lineage_snapshot_interval:
+                WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
+                last_snapshot_index = analysis_index
+            if analysis_index - last_checkpoint_index >= settings.checkpoint_interval:
+                SaveCheckpoint(ctx, hashes, analysis_index, previous_analysis, total_time)
+                last_checkpoint_index = analysis_index
+            iteration_start_time = time.time()
+            # Between commits the genealogy is consistent, so a cancellation can stop here
+            ctx.cancel.check()
+    except AnalysisCancelled:
+        analyses.close()
+        # Keep what was processed so far, so that the analysis can be resumed later
+        if analysis_index != last_checkpoint_index:
+            SaveCheckpoint(ctx, hashes, analysis_index, previous_analysis, total_time)
+        state.journal.close()
+        blob_memo.close()
+        ReleaseWorkspace(ctx)
+        printWarning(f"Analysis cancelled after {analysis_index} of {len(hashes)} commit(s). "
+                     "Run it again with resume to continue from there.")
+        raise
+
+    if analysis_index != last_checkpoint_index:
+        SaveCheckpoint(ctx, hashes, analysis_index, previous_analysis, total_time)
+    state.journal.close()
+    blob_memo.close()
 
     # If nothing was accumulated, return a clear XML message
     if len(ctx.state.p_lin_data) == 0:
@@ -1201,10 +1595,24 @@ def execute_omniccg(general_settings: Dict[str, Any]) -> str:
 
     # Otherwise, finalize outputs
     WriteDensityFile(ctx, ctx.state.p_dens_data, paths.p_dens_file)
-    lineages_xml = WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
-    metrics_xml = generate_detailed_report(lineages_xml, len(hashes), ctx.state.p_dens_data)
+    WriteDensityFile(ctx, ctx.state.p_repo_dens_data, paths.p_repo_dens_file)
+    if settings.output_format == "xml":
+        lineages_xml = WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
+        metrics_xml = state.lineage_metrics.report(len(hashes), ctx.state.p_dens_data, ctx.state.p_repo_dens_data)
+        Path(ctx.paths.metrics_xml).write_text(metrics_xml, encoding="utf-8")
+        genealogy_xml = build_genealogy_xml(lineages_xml, metrics_xml)
+
+        print("\nDONE")
+        return genealogy_xml, lineages_xml, metrics_xml
+
+    # Table output: the lineages are returned as the table
+    table = WriteGenealogyTable(ctx, len(hashes), paths.p_table_file)
+    metrics_xml = state.lineage_metrics.report(len(hashes), ctx.state.p_dens_data, ctx.state.p_repo_dens_data)
     Path(ctx.paths.metrics_xml).write_text(metrics_xml, encoding="utf-8")
-    genealogy_xml = build_genealogy_xml(lineages_xml, metrics_xml)
+    genealogy_xml = None
+    if settings.output_format == "both":
+        lineages_xml = WriteLineageFile(ctx, ctx.state.p_lin_data, paths.p_res_file)
+        genealogy_xml = build_genealogy_xml(lineages_xml, metrics_xml)
 
     print("\nDONE")
-    return genealogy_xml, lineages_xml, metrics_xml
+    return genealogy_xml, table, metrics_xml
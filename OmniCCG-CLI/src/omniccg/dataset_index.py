@@ -0,0 +1,157 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from omniccg.analysis import _detect_language
+from omniccg.blob_memo import blob_memo, blob_id
+from omniccg.file_model import FileModel, memo_function_count
+from omniccg.staging import head_commit, diff_name_status
+
+
+def count_lines(data: bytes) -> int:
+    """
+    Physical lines of a file as cloc reports them (code + comment + blank): every '\\n'-terminated
+    line plus a last line without terminator.
+    """
+    n = data.count(b"\n")
+    if data and not data.endswith(b"\n"):
+        n += 1
+    return n
+
+
+def _file_language(path: str, language: Optional[str]) -> Optional[str]:
+    # Language count_functions_in_file would use, None where it would refuse the file
+    try:
+        return _detect_language(path, language)
+    except ValueError:
+        return None
+
+
+class DatasetIndex:
+    """
+    Per-file table of a staged dataset: blob id, physical lines and number of functions of every
+    file, with the dataset totals kept up to date file by file.
+
+    The LOC total counts byte-identical files once, as cloc does by default; the function total
+    counts every file. Both values of a file come from the blob memo, so a file version that was
+    already seen costs a hash, not a count.
+
+    Functions are counted in the files of `source_root`, the checkout the dataset was staged from:
+    clone fragments point there (CloneFragment maps the dataset back to the repository), and a
+    sanitizer may have rewritten the staged copy.
+    """
+
+    def __init__(self, root: str, language: Optional[str] = None, source_root: Optional[str] = None):
+        self.root = root
+        self.language = language
+        self.source_root = source_root or root
+        # commit the indexed dataset reflects; None when unknown
+        self.commit: Optional[str] = None
+        self.loc = 0
+        self.functions = 0
+        # path relative to root -> (blob id, functions or None when the language is unsupported)
+        self._files: Dict[str, Tuple[str, Optional[int]]] = {}
+        self._blobs: Dict[str, List[int]] = {}  # blob id -> [number of files, lines]
+
+    def _drop(self, rel_path: str) -> None:
+        entry = self._files.pop(rel_path, None)
+        if entry is None:
+            return
+        blob, functions = entry
+        self.functions -= functions or 0
+        counted = self._blobs[blob]
+        counted[0] -= 1
+        if counted[0] == 0:
+            self.loc -= counted[1]
+            del self._blobs[blob]
+
+    def refresh(self, rel_path: str) -> None:
+        """Recount one file (relative path with '/' separators); missing files are removed."""
+        self._drop(rel_path)
+        path = Path(self.root) / rel_path
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return
+        blob = blob_id(data)
+        language = _file_language(str(path), self.language)
+        functions = None
+        if language:
+            source, source_blob = data, blob
+            if self.source_root != self.root:
+                try:
+                    source = (Path(self.source_root) / rel_path).read_bytes()
+                except OSError:
+                    pass
+                else:
+                    source_blob = blob if source == data else blob_id(source)
+            functions = memo_function_count(source, source_blob, language)
+        self._files[rel_path] = (blob, functions)
+        self.functions += functions or 0
+        counted = self._blobs.get(blob)
+        if counted is None:
+            lines = blob_memo.get(blob, "loc", lambda: count_lines(data))
+            self._blobs[blob] = [1, lines]
+            self.loc += lines
+        else:
+            counted[0] += 1
+
+    def rescan(self, commit: Optional[str] = None) -> None:
+        """Index the whole dataset."""
+        self._files.clear()
+        self._blobs.clear()
+        self.loc = self.functions = 0
+        root = Path(self.root)
+        if root.is_dir():
+            for file in root.rglob("*"):
+                if file.is_file():
+                    self.refresh(file.relative_to(root).as_posix())
+        self.commit = commit
+
+    def apply_changes(self, changes: List[Tuple[str, str, Optional[str]]], commit: Optional[str]) -> None:
+        """Recount only the paths of a diff_name_status() result."""
+        for _, path, new_path in changes:
+            self.refresh(path)
+            if new_path is not None:
+                self.refresh(new_path)
+        self.commit = commit
+
+    def function_count(self, path: str) -> int:
+        """
+        Same result as count_functions_in_file(path, language) for the path of a clone fragment,
+        from the table when the file is part of the dataset.
+        """
+        rel_path = os.path.relpath(os.path.abspath(path), self.source_root)
+        entry = self._files.get(Path(rel_path).as_posix())
+        if entry is not None and entry[1] is not None:
+            return entry[1]
+        # outside the dataset or refused: let the file model decide (and raise) as before
+        return FileModel(path).function_count(self.language)
+
+
+# One index per staged dataset (worker slot) and language seen by this process
+_indexes: Dict[Tuple[str, Optional[str]], DatasetIndex] = {}
+
+
+def dataset_index(prod_data_dir: str, repo_dir: str, language: Optional[str], incremental: bool) -> DatasetIndex:
+    """
+    Index of the staged dataset of the commit checked out in repo_dir.
+
+    With incremental staging the dataset only changes where git diff says so, so the previous index
+    is updated from the diff against the last indexed commit: O(changed files). A full staging
+    rewrites (and re-sanitizes) the whole dataset every commit, so it is rescanned; unchanged
+    files are then still only hashed.
+    """
+    key = (os.path.abspath(prod_data_dir), language)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = DatasetIndex(key[0], language, os.path.abspath(repo_dir))
+
+    commit = head_commit(repo_dir) if incremental else None
+    changes = None
+    if incremental and index.commit and commit:
+        changes = [] if index.commit == commit else diff_name_status(repo_dir, index.commit, commit, language)
+    if changes is None:
+        index.rescan(commit)
+    else:
+        index.apply_changes(changes, commit)
+    return index
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import hashlib
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from omniccg.staging import is_staged_source
+
+# Placeholder for the staged dataset directory inside cached <clones> XML
+DATASET_TOKEN = "{OMNICCG_DATASET}"
+
+# Detector versions shipped under tools/
+DETECTOR_VERSIONS = {
+    "nicad": "6.2",
+    "simian": "4.0.0",
+}
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as '500M', '2G' or '1048576' into bytes."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*", (text or "").upper())
+    if not m:
+        raise ValueError(f"Invalid size: {text!r} (expected e.g. 500M or 2G)")
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2)])
+
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit]:
+            return f"{size / SIZE_UNITS[unit]:.1f}{unit}B"
+    return f"{size}B"
+
+
+def source_tree_id(repo_dir: str, language: Optional[str]) -> Optional[str]:
+    """
+    Content id of the source set a staging selects from the commit checked out in repo_dir:
+    a hash over the (mode, blob id, path) entries that staging would copy.
+    """
+    proc = subprocess.run(["git", "ls-tree", "-r", "-z", "HEAD"], cwd=repo_dir,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    if proc.returncode != 0:
+        return None
+    digest = hashlib.sha1()
+    for entry in proc.stdout.split(b"\0"):
+        if not entry:
+            continue
+        meta, _, path = entry.partition(b"\t")
+        if is_staged_source(path.decode("utf-8", errors="surrogateescape"), language):
+            digest.update(meta + b"\t" + path + b"\0")
+    return digest.hexdigest()
+
+
+def detector_fingerprint(tool: str, tools_dir: str) -> Tuple[str, str]:
+    """Return (version, options) identifying how a built-in detector produces its output."""
+    tool = (tool or "").casefold()
+    version = DETECTOR_VERSIONS.get(tool, "")
+    if tool == "nicad":
+        cfg = Path(tools_dir) / "NiCad" / "config" / "default.cfg"
+        cfg_hash = hashlib.sha1(cfg.read_bytes()).hexdigest() if cfg.is_file() else ""
+        return version, f"functions;default.cfg={cfg_hash}"
+    if tool == "simian":
+        return version, "-formatter=xml -threshold=20"
+    return version, ""
+
+
+class DetectorCache:
+    """
+    Persistent, content-addressed store of clone detector results (NiCad <clones> or Simian XML).
+
+    Entries are keyed by the source tree id, detector name, version and options, and the language.
+    Reading an entry refreshes its modification time, which prune() uses as LRU order.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def make_key(tree_id: str, tool: str, version: str, options: str, language: Optional[str]) -> str:
+        raw = json.dumps([tree_id, tool, version, options, language or ""])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.xml")
+
+    def get(self, key: str, dataset_dir: str, dest: str) -> bool:
+        """Copy the entry to dest (line by line, the XML can be large); False when there is none."""
+        path = self._entry_path(key)
+        dataset = os.path.abspath(dataset_dir)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        try:
+            with open(path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as out:
+                for line in src:
+                    out.write(line.replace(DATASET_TOKEN, dataset))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        os.replace(tmp, dest)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key: str, source: str, dataset_dir: str) -> None:
+        """Store the detector result file `source`, with the dataset directory made relocatable."""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dataset = os.path.abspath(dataset_dir)
+        # Write then rename, so concurrent workers never read a partial entry
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(source, "r", encoding="utf-8", errors="ignore") as src, open(tmp, "w", encoding="utf-8") as out:
+            for line in src:
+                out.write(line.replace(dataset, DATASET_TOKEN))
+        os.replace(tmp, path)
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """(path, size, last use) of every entry, least recently used first."""
+        found: List[Tuple[str, int, float]] = []
+        if not os.path.isdir(self.root):
+            return found
+        for path in Path(self.root).rglob("*.xml"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            found.append((str(path), st.st_size, st.st_mtime))
+        found.sort(key=lambda e: e[2])
+        return found
+
+    def stats(self) -> Dict[str, float]:
+        entries = self.entries()
+        return {
+            "entries": len(entries),
+            "size": sum(e[1] for e in entries),
+            "oldest": entries[0][2] if entries else 0.0,
+            "newest": entries[-1][2] if entries else 0.0,
+        }
+
+    def prune(self, max_size: int) -> Tuple[int, int]:
+        """Evict least recently used entries until the cache fits in max_size bytes."""
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = freed = 0
+        for path, size, _ in entries:
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+
+def describe_age(timestamp: float) -> str:
+    if not timestamp:
+        return "-"
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
@@ -1,16 +1,85 @@
-from typing import List
+from typing import Dict, List, Tuple
 from .CloneFragment import CloneFragment
+from .SimHashIndex import SimHashIndex
+
+# Below this many fragments a plain scan is cheaper than building a lookup
+LOOKUP_MIN_FRAGMENTS = 8
+
+
+class _FragmentLookup:
+    """
+    Answers CloneFragment.matches / matchesStrictly against all fragments of a class at once.
+    Named fragments of both sides only compare (file, function_name); every other pair compares
+    coordinates or SimHashes, so each table is kept separately for named and unnamed fragments.
+    """
+
+    def __init__(self, fragments: List[CloneFragment]):
+        self.size = len(fragments)
+        self.names: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self.locations = {"named": set(), "unnamed": set()}
+        self.file_hashes = {"named": set(), "unnamed": set()}
+        self.simhashes = {"named": SimHashIndex(), "unnamed": SimHashIndex()}
+        for n, f in enumerate(fragments):
+            kind = "named" if f.function_name else "unnamed"
+            if f.function_name:
+                self.names.setdefault((f.file, f.function_name), []).append((f.ls, f.function_hash))
+            self.locations[kind].add((f.file, f.ls, f.le))
+            self.file_hashes[kind].add((f.file, f.hash))
+            self.simhashes[kind].add(n, f.hash)
+
+    def matches(self, other: CloneFragment) -> bool:
+        if other.function_name and (other.file, other.function_name) in self.names:
+            return True
+        kinds = ("unnamed",) if other.function_name else ("named", "unnamed")
+        location = (other.file, other.ls, other.le)
+        return any(location in self.locations[kind] or self.simhashes[kind].query(other.hash) for kind in kinds)
+
+    def matches_strictly(self, other: CloneFragment) -> bool:
+        if other.function_name:
+            for ls, function_hash in self.names.get((other.file, other.function_name), ()):
+                if ls == other.ls or function_hash == other.function_hash:
+                    return True
+        kinds = ("unnamed",) if other.function_name else ("named", "unnamed")
+        return any((other.file, other.hash) in self.file_hashes[kind] for kind in kinds)
+
 
 class CloneClass:
     def __init__(self):
         self.fragments: List[CloneFragment] = []
+        self._lookup = None
+
+    def __getstate__(self):
+        # The lookup is a cache; rebuild it where needed instead of shipping it
+        state = self.__dict__.copy()
+        state["_lookup"] = None
+        return state
+
+    def _get_lookup(self):
+        if len(self.fragments) < LOOKUP_MIN_FRAGMENTS:
+            return None
+        lookup = getattr(self, "_lookup", None)
+        if lookup is None or lookup.size != len(self.fragments):
+            lookup = self._lookup = _FragmentLookup(self.fragments)
+        return lookup
 
     def contains(self, fragment):
+        lookup = self._get_lookup()
+        if lookup is not None:
+            return lookup.matches(fragment)
         for f in self.fragments:
             if f.matches(fragment):
                 return True
         return False
 
+    def containsStrictly(self, fragment):
+        lookup = self._get_lookup()
+        if lookup is not None:
+            return lookup.matches_strictly(fragment)
+        for f in self.fragments:
+            if fragment.matchesStrictly(f):
+                return True
+        return False
+
     def matches(self, cc: "CloneClass"):
         n = 0
         for fragment in cc.fragments:
@@ -2,14 +2,18 @@ from .code_operations import get_code_without_comments_and_blank_lines
 from .hash_operations import generate_simhash, match_hashes
 
 class CloneFragment:
-    def __init__(self, file, ls, le, function_name="", function_hash=0):
+    def __init__(self, file, ls, le, function_name="", function_hash=0, code_content=None, simhash=None):
         # replace /dataset/production with /repo to keep compatibility with the original pipeline
         self.file = file.replace("/dataset/production", "/repo")
         self.ls = ls
         self.le = le
         self.function_name = function_name or ""
-        self.code_content = get_code_without_comments_and_blank_lines(file, ls, le)
-        self.hash = generate_simhash(self.code_content)
+        # code_content and simhash may be passed in when the caller already computed them
+        # (see file_model and generate_simhashes)
+        if code_content is None:
+            code_content = get_code_without_comments_and_blank_lines(file, ls, le)
+        self.code_content = code_content
+        self.hash = generate_simhash(self.code_content) if simhash is None else simhash
         self.function_hash = function_hash or self.hash
 
     def contains(self, other):
@@ -1,6 +1,8 @@
 class Lineage:
     def __init__(self):
         self.versions = []
+        # Position of the lineage in the genealogy, assigned by the lineage journal
+        self.id = None
 
     def matches(self, cc):
         for fragment in cc.fragments:
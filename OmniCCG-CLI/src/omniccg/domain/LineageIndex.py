@@ -0,0 +1,118 @@
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+from .CloneClass import CloneClass
+from .SimHashIndex import SimHashIndex
+
+
+class LineageIndex:
+    """
+    Inverted index over the last version of every lineage, used to find the lineages a clone
+    class may match without scanning them all.
+
+    CloneFragment.matches compares two named fragments by (file, function_name) only; any other
+    pair matches on identical coordinates or on a SimHash similarity of at least 90%.
+    The index therefore keeps, for the fragments of each lineage's last version:
+      - named fragments by (file, function_name),
+      - every fragment by (file, startline, endline) and in a SimHashIndex,
+        separately for named and unnamed fragments.
+    candidates() returns a superset of the matching lineages; callers still confirm with
+    Lineage.matches, so matching results are unchanged.
+
+    Lineages that stopped evolving can be archived: they stay in the lineage list (and so in the
+    output) but leave the index and are never offered as candidates again.
+    """
+
+    def __init__(self, lineages: List):
+        self.lineages = lineages
+        self._positions: Dict[int, int] = {}
+        self._keys: Dict[int, List[Tuple]] = {}
+        self._dirty: Set[int] = set()
+        self._active: Set[int] = set()
+        self._tables: Dict[Tuple, Set[int]] = defaultdict(set)
+        # Items are (lineage position, fragment number) of the lineage's last version
+        self._simhashes = {"named": SimHashIndex(), "unnamed": SimHashIndex()}
+        for position, lineage in enumerate(lineages):
+            self._positions[id(lineage)] = position
+            self._dirty.add(position)
+            self._active.add(position)
+
+    def added(self, lineage) -> None:
+        """Register a lineage that was just appended to the indexed list."""
+        position = len(self._positions)
+        self._positions[id(lineage)] = position
+        self._dirty.add(position)
+        self._active.add(position)
+
+    def invalidate(self, lineage) -> None:
+        """The last version of `lineage` is about to change; re-index it before the next lookup."""
+        position = self._positions.get(id(lineage))
+        if position is not None and position in self._active:
+            self._dirty.add(position)
+
+    def active(self) -> List:
+        """Lineages that are not archived, in list order."""
+        return [self.lineages[position] for position in sorted(self._active)]
+
+    def archive_older_than(self, commit_nr: int, max_age: int) -> int:
+        """Archive the lineages whose last version is more than `max_age` commits before `commit_nr`."""
+        stale = [
+            position for position in self._active
+            if commit_nr - self.lineages[position].versions[-1].nr > max_age
+        ]
+        for position in stale:
+            self._unindex(position)
+            self._dirty.discard(position)
+            self._active.discard(position)
+        return len(stale)
+
+    @staticmethod
+    def _fragment_keys(fragment) -> List[Tuple]:
+        kind = "named" if fragment.function_name else "unnamed"
+        keys: List[Tuple] = [(kind, fragment.file, fragment.ls, fragment.le)]
+        if fragment.function_name:
+            keys.append(("name", fragment.file, fragment.function_name))
+        return keys
+
+    def _unindex(self, position: int) -> None:
+        for key in self._keys.pop(position, ()):
+            if key[0] == "simhash":
+                self._simhashes[key[1]].remove((position, key[2]))
+                continue
+            bucket = self._tables.get(key)
+            if bucket is not None:
+                bucket.discard(position)
+                if not bucket:
+                    del self._tables[key]
+
+    def _refresh(self) -> None:
+        for position in self._dirty:
+            self._unindex(position)
+            lineage = self.lineages[position]
+            if not lineage.versions:
+                continue
+            keys = set()
+            for n, fragment in enumerate(lineage.versions[-1].cloneclass.fragments):
+                keys.update(self._fragment_keys(fragment))
+                kind = "named" if fragment.function_name else "unnamed"
+                self._simhashes[kind].add((position, n), fragment.hash)
+                keys.add(("simhash", kind, n))
+            for key in keys:
+                if key[0] != "simhash":
+                    self._tables[key].add(position)
+            self._keys[position] = list(keys)
+        self._dirty.clear()
+
+    def candidates(self, cc: CloneClass) -> List[int]:
+        """Positions, in ascending order, of the lineages whose last version may match `cc`."""
+        self._refresh()
+        found: Set[int] = set()
+        tables = self._tables
+        for fragment in cc.fragments:
+            # Named fragments only pair with unnamed ones through coordinates or SimHash
+            kinds = ("unnamed",) if fragment.function_name else ("named", "unnamed")
+            if fragment.function_name:
+                found.update(tables.get(("name", fragment.file, fragment.function_name), ()))
+            for kind in kinds:
+                found.update(tables.get((kind, fragment.file, fragment.ls, fragment.le), ()))
+                found.update(position for position, _ in self._simhashes[kind].query(fragment.hash))
+        return sorted(found)
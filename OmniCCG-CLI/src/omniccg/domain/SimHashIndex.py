@@ -0,0 +1,108 @@
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Hashable, List, Set, Tuple
+from .hash_operations import HASH_BITS, hamming_distance
+
+# Same threshold as CloneFragment.matches
+MATCH_THRESHOLD = 0.90
+
+
+def max_distance_for(threshold: float) -> int:
+    """Largest Hamming distance whose similarity (1 - d / HASH_BITS) still reaches the threshold."""
+    d = 0
+    while d < HASH_BITS and 1.0 - ((d + 1) / HASH_BITS) >= threshold:
+        d += 1
+    return d
+
+
+def block_layout(blocks: int) -> List[Tuple[int, int]]:
+    """(shift, mask) of `blocks` contiguous bit ranges covering the whole hash."""
+    layout = []
+    start = 0
+    for i in range(blocks):
+        width = HASH_BITS // blocks + (1 if i < HASH_BITS % blocks else 0)
+        layout.append((start, (1 << width) - 1))
+        start += width
+    return layout
+
+
+def _flip_masks(width: int, radius: int) -> List[int]:
+    # Every value with at most `radius` bits set among `width` bits
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(width), r):
+            m = 0
+            for b in bits:
+                m |= 1 << b
+            masks.append(m)
+    return masks
+
+
+MATCH_DISTANCE = max_distance_for(MATCH_THRESHOLD)
+# 16-bit blocks: buckets stay small up to millions of hashes and a 6-bit search probes 17 values per block
+DEFAULT_BLOCKS = 4
+
+
+class SimHashIndex:
+    """
+    Multi-index hashing over SimHashes: finds every stored hash within `max_distance` bits of a
+    query without comparing against all of them.
+
+    Hashes are cut into `blocks` blocks, each with its own exact-match table. Two hashes that
+    differ in at most max_distance bits differ in at most max_distance // blocks bits on at least
+    one block (pigeonhole), so probing every block value within that radius of the query finds
+    every neighbour; the candidates are then filtered by the real Hamming distance.
+    """
+
+    def __init__(self, max_distance: int = MATCH_DISTANCE, blocks: int = DEFAULT_BLOCKS):
+        self.max_distance = max_distance
+        self._blocks = block_layout(max(1, min(blocks, max_distance + 1)))
+        radius = max_distance // len(self._blocks)
+        self._probes = [_flip_masks(mask.bit_length(), radius) for _, mask in self._blocks]
+        self._tables: List[Dict[int, Set[Hashable]]] = [defaultdict(set) for _ in self._blocks]
+        self._hashes: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._hashes
+
+    def add(self, item: Hashable, simhash: int) -> None:
+        if item in self._hashes:
+            self.remove(item)
+        self._hashes[item] = simhash
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            table[(simhash >> shift) & mask].add(item)
+
+    def remove(self, item: Hashable) -> None:
+        simhash = self._hashes.pop(item, None)
+        if simhash is None:
+            return
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            key = (simhash >> shift) & mask
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(item)
+                if not bucket:
+                    del table[key]
+
+    def candidates(self, simhash: int) -> Set[Hashable]:
+        """Items close to `simhash` on at least one block (a superset of the neighbours)."""
+        found: Set[Hashable] = set()
+        for table, (shift, mask), probes in zip(self._tables, self._blocks, self._probes):
+            value = (simhash >> shift) & mask
+            for flip in probes:
+                bucket = table.get(value ^ flip)
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query(self, simhash: int, max_distance: int = None) -> Set[Hashable]:
+        """Items whose hash is within `max_distance` bits (default: the index distance) of `simhash`."""
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError(f"Index supports distances up to {self.max_distance}, got {max_distance}")
+        hashes = self._hashes
+        return {item for item in self.candidates(simhash) if hamming_distance(hashes[item], simhash) <= max_distance}
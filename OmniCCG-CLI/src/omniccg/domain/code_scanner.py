@@ -0,0 +1,88 @@
+import re
+
+# Comment syntax per file extension; unknown extensions keep their comments
+COMMENT_STYLE = {
+    ".c": "c",
+    ".cs": "c",
+    ".java": "c",
+    ".php": "php",
+    ".py": "hash",
+    ".rb": "ruby",
+}
+
+_STRINGS = r"""
+    "[^"\\]*(?:\\[\s\S][^"\\]*)*"?      # double-quoted, escapes included, may be unterminated
+    | '[^'\\]*(?:\\[\s\S][^'\\]*)*'?    # single-quoted
+"""
+
+# One alternation per style: strings are matched only to skip over them, comments are removed
+_C_STYLE = re.compile(_STRINGS + r"""
+    | (?P<block>/\*[\s\S]*?(?:\*/|\Z))
+    | (?P<line>//[^\n]*)
+""", re.VERBOSE)
+
+_PHP_STYLE = re.compile(_STRINGS + r"""
+    | (?P<block>/\*[\s\S]*?(?:\*/|\Z))
+    | (?P<line>//[^\n]*|\#[^\n]*)
+""", re.VERBOSE)
+
+# Hash comments are handled line by line (strings never continue on the next line)
+_HASH_STYLE = re.compile(_STRINGS + r"""
+    | (?P<line>\#[^\r\n]*)
+""", re.VERBOSE)
+
+_RUBY_BEGIN = re.compile(r"^=begin\b")
+_RUBY_END = re.compile(r"^=end\b")
+
+
+def _drop_comment(m: "re.Match") -> str:
+    if m.group("line") is not None:
+        return ""
+    block = m.groupdict().get("block")
+    if block is not None:
+        # keep the line structure of the removed block
+        return "\n" * block.count("\n")
+    return m.group(0)
+
+
+def _strip_hash_comments(code: str, ruby_block_comments: bool) -> str:
+    out = []
+    in_ruby_block = False
+    for line in code.splitlines(keepends=True):
+        if ruby_block_comments:
+            stripped = line.lstrip()
+            if not in_ruby_block and _RUBY_BEGIN.match(stripped):
+                in_ruby_block = True
+                continue
+            if in_ruby_block:
+                if _RUBY_END.match(stripped):
+                    in_ruby_block = False
+                continue
+        # a line without '#' has no comment to remove
+        out.append(_HASH_STYLE.sub(_drop_comment, line) if "#" in line else line)
+    return "".join(out)
+
+
+def strip_comments(code: str, ext: str) -> str:
+    """
+    Remove comments while keeping string literals and line breaks, in one regex-driven pass.
+    Same result as the character loops code_operations used before (kept as the parity reference
+    in benchmarks/comment_reference.py).
+    """
+    style = COMMENT_STYLE.get(ext)
+    if style == "c":
+        return _C_STYLE.sub(_drop_comment, code) if "/" in code else code
+    if style == "php":
+        return _PHP_STYLE.sub(_drop_comment, code) if ("/" in code or "#" in code) else code
+    if style == "hash":
+        return _strip_hash_comments(code, ruby_block_comments=False)
+    if style == "ruby":
+        return _strip_hash_comments(code, ruby_block_comments=True)
+    return code
+
+
+def normalize_code(segment: str, ext: str) -> str:
+    """Comment-free code with blank lines dropped and trailing spaces removed."""
+    # a line is blank exactly when its rstrip() is empty, so one rstrip per line does both
+    return "\n".join([line for line in map(str.rstrip, strip_comments(segment, ext).splitlines()) if line])
+
@@ -1,26 +1,40 @@
 import re
+import struct
 import hashlib
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional, see the "fast" extra
+    np = None
 
 HASH_BITS = 64  # number of bits in the SimHash
 
+# Width of the per-bit counters packed side by side in one integer (see _token_lanes)
+LANE_BITS = 32
+# Number of SimHashes remembered by normalized code text
+SIMHASH_MEMO_SIZE = 1 << 16
+
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    [A-Za-z_]\w*          # identifiers / keywords
+    | \d+\.\d+            # floating-point numbers
+    | \d+                 # integers
+    | ==|!=|<=|>=|&&|\|\| # common multi-character operators
+    | [^\s]               # any other non-whitespace character (symbols, punctuation)
+    """,
+    re.VERBOSE,
+)
+
 
 def tokenize(code_content: str) -> List[str]:
     """
     Tokenize the code into identifiers, numbers, operators, and symbols.
     This is a simple tokenization, not language-specific parsing.
     """
-    token_pattern = re.compile(
-        r"""
-        [A-Za-z_]\w*          # identifiers / keywords
-        | \d+\.\d+            # floating-point numbers
-        | \d+                 # integers
-        | ==|!=|<=|>=|&&|\|\| # common multi-character operators
-        | [^\s]               # any other non-whitespace character (symbols, punctuation)
-        """,
-        re.VERBOSE,
-    )
-    return token_pattern.findall(code_content)
+    return TOKEN_PATTERN.findall(code_content)
 
 
 def token_hash(token: str) -> int:
@@ -32,11 +46,136 @@ def token_hash(token: str) -> int:
     return int(h, 16) & ((1 << HASH_BITS) - 1)
 
 
+def stable_hash(text: str) -> int:
+    """
+    Produce a 64-bit hash of a text that is identical across processes.
+    Unlike the builtin hash(), it does not depend on PYTHONHASHSEED.
+    """
+    return token_hash(text)
+
+
+@lru_cache(maxsize=1 << 16)
+def _cached_token_hash(token: str) -> int:
+    return token_hash(token)
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_lanes(token: str) -> int:
+    """
+    The token hash with bit i moved to bit i * LANE_BITS.
+    Adding these integers counts, for all 64 bit positions at once, how many tokens set the bit.
+    """
+    th = _cached_token_hash(token)
+    lanes = 0
+    for i in range(HASH_BITS):
+        if th >> i & 1:
+            lanes |= 1 << (i * LANE_BITS)
+    return lanes
+
+
+_LANES_STRUCT = struct.Struct("<%d%s" % (HASH_BITS, "I" if LANE_BITS == 32 else "Q"))
+
+
+def _simhash_from_tokens(tokens: List[str]) -> int:
+    # Packed equivalent of _generate_simhash_reference: bit i is set when more tokens have it set than not
+    if not tokens:
+        return 0
+    counts = sum(map(_token_lanes, tokens))
+    n = len(tokens)
+    simhash = 0
+    for i, count in enumerate(_LANES_STRUCT.unpack(counts.to_bytes(HASH_BITS * LANE_BITS // 8, "little"))):
+        if 2 * count > n:
+            simhash |= 1 << i
+    return simhash
+
+
+_simhash_memo: Dict[str, int] = {}
+
+
+def _memo_get(code_content: str):
+    value = _simhash_memo.pop(code_content, None)
+    if value is not None:
+        # Re-insert to keep the dict in least-recently-used order
+        _simhash_memo[code_content] = value
+    return value
+
+
+def _memo_put(code_content: str, value: int) -> None:
+    _simhash_memo[code_content] = value
+    while len(_simhash_memo) > SIMHASH_MEMO_SIZE:
+        del _simhash_memo[next(iter(_simhash_memo))]
+
+
 def generate_simhash(code_content: str) -> int:
     """
     Generate a SimHash (64-bit integer) for the given code snippet.
     Similar code snippets will have SimHashes that differ in only a few bits.
+    Results are memoized by code text, so unchanged fragments are not hashed again.
     """
+    if not code_content:
+        return 0
+    simhash = _memo_get(code_content)
+    if simhash is None:
+        simhash = _simhash_from_tokens(tokenize(code_content))
+        _memo_put(code_content, simhash)
+    return simhash
+
+
+def generate_simhashes(code_contents: Sequence[str]) -> List[int]:
+    """
+    SimHash of many code snippets at once (e.g. every fragment of a commit).
+    Identical to [generate_simhash(c) for c in code_contents]; with NumPy installed, the snippets
+    that are not memoized yet are hashed together over one token bit matrix.
+    """
+    result: List[int] = [0] * len(code_contents)
+    missing: Dict[str, List[int]] = {}
+    for i, code_content in enumerate(code_contents):
+        if not code_content:
+            continue
+        simhash = _memo_get(code_content)
+        if simhash is None:
+            missing.setdefault(code_content, []).append(i)
+        else:
+            result[i] = simhash
+
+    if np is not None and len(missing) > 1:
+        computed = _simhashes_numpy(list(missing))
+    else:
+        computed = [_simhash_from_tokens(tokenize(c)) for c in missing]
+
+    for (code_content, positions), simhash in zip(missing.items(), computed):
+        _memo_put(code_content, simhash)
+        for i in positions:
+            result[i] = simhash
+    return result
+
+
+def _simhashes_numpy(code_contents: List[str]) -> List[int]:
+    token_lists = [tokenize(c) for c in code_contents]
+    sizes = np.array([len(t) for t in token_lists], dtype=np.int64)
+    hashed = [i for i, n in enumerate(sizes) if n]
+    simhashes = [0] * len(code_contents)
+    if not hashed:
+        return simhashes
+
+    token_hashes = np.fromiter(
+        (_cached_token_hash(t) for i in hashed for t in token_lists[i]),
+        dtype="<u8",
+        count=int(sizes.sum()),
+    )
+    # One row of 64 bits (least significant first) per token
+    bits = np.unpackbits(token_hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    starts = np.concatenate(([0], np.cumsum(sizes[hashed])[:-1]))
+    counts = np.add.reduceat(bits, starts, axis=0, dtype=np.int64)
+    majority = (2 * counts) > sizes[hashed][:, None]
+    packed = np.packbits(majority, axis=1, bitorder="little").view("<u8").ravel()
+    for i, simhash in zip(hashed, packed.tolist()):
+        simhashes[i] = simhash
+    return simhashes
+
+
+def _generate_simhash_reference(code_content: str) -> int:
+    """Straightforward per-token, per-bit SimHash; the definition the faster paths must match."""
     if not code_content:
         return 0
 
@@ -66,12 +205,16 @@ def generate_simhash(code_content: str) -> int:
     return simhash
 
 
+# int.bit_count exists from Python 3.10 on
+_popcount = int.bit_count if hasattr(int, "bit_count") else (lambda x: bin(x).count("1"))
+
+
 def hamming_distance(hash1: int, hash2: int) -> int:
     """
     Compute the Hamming distance between two integers.
     (Number of bits that differ.)
     """
-    return bin(hash1 ^ hash2).count("1")
+    return _popcount(hash1 ^ hash2)
 
 
 def similarity(hash1: int, hash2: int) -> float:
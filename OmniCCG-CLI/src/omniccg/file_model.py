@@ -0,0 +1,121 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+from omniccg.analysis import count_functions_in_source, _detect_language
+from omniccg.blob_memo import blob_memo, blob_id
+from omniccg.get_method_name import MethodSpans
+from omniccg.domain.code_operations import (
+    decode_with_fallback,
+    clone_fragment_text,
+    code_without_comments_and_blank_lines,
+)
+
+
+# Estimated per-line memory of a memoized line array or method span table, in bytes
+_LINE_OVERHEAD = 64
+
+
+def _lines_size(raw: bytes, n_lines: int) -> int:
+    return len(raw) + _LINE_OVERHEAD * n_lines
+
+
+def _universal_newlines(text: str) -> str:
+    # What a text-mode open() with newline=None hands back
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def memo_function_count(raw: bytes, blob: str, language: str) -> int:
+    """count_functions_in_source over file bytes decoded as count_functions_in_file reads them, memoized by blob."""
+    return blob_memo.get(blob, "functions:" + language,
+                         lambda: count_functions_in_source(_universal_newlines(raw.decode("utf-8", errors="ignore")), language),
+                         persist=True)
+
+
+def _readlines(text: str) -> List[str]:
+    # Same split as TextIO.readlines() on newline-normalized text
+    parts = text.split("\n")
+    lines = [part + "\n" for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+class FileModel:
+    """
+    One source file of a commit, read from disk once.
+
+    The views used while building clone fragments are derived lazily from the same bytes, each
+    decoded exactly like the function it replaces:
+      - method_at:          get_enclosing_java_method (strict utf-8, method span table)
+      - fragment_text:      GetCloneFragment (utf-8/cp1252/latin-1 fallback)
+      - code_content:       get_code_without_comments_and_blank_lines (utf-8, errors ignored)
+      - function_count:     count_functions_in_file
+
+    Everything derived from the contents alone is memoized in blob_memo by the file's blob id,
+    so a file left unchanged by later commits is only hashed, not analysed again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._raw: Optional[bytes] = None
+        self._blob: Optional[str] = None
+        self._method_spans: Optional[MethodSpans] = None
+        self._fallback_lines: Optional[List[str]] = None
+        self._code_lines: Optional[List[str]] = None
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = Path(self.path).read_bytes()
+        return self._raw
+
+    @property
+    def blob(self) -> str:
+        if self._blob is None:
+            self._blob = blob_id(self.raw)
+        return self._blob
+
+    def _code_text(self) -> str:
+        return _universal_newlines(self.raw.decode("utf-8", errors="ignore"))
+
+    def method_at(self, startline: int, endline: int) -> Optional[str]:
+        if self._method_spans is None:
+            # strict utf-8 like get_enclosing_java_method: undecodable files raise here
+            self._method_spans = blob_memo.get(
+                self.blob, "method_spans",
+                lambda: MethodSpans.from_source(_universal_newlines(self.raw.decode("utf-8"))),
+                size=lambda spans: _lines_size(self.raw, len(spans.lines)), persist=True)
+        return self._method_spans.enclosing(startline, endline)
+
+    def fragment_text(self, startline: int, endline: int) -> str:
+        if self._fallback_lines is None:
+            self._fallback_lines = blob_memo.get(
+                self.blob, "fallback_lines", lambda: decode_with_fallback(self.raw).splitlines(True),
+                size=lambda lines: _lines_size(self.raw, len(lines)))
+        return clone_fragment_text(self._fallback_lines, startline, endline)
+
+    def code_content(self, startline: int, endline: int) -> str:
+        if self._code_lines is None:
+            self._code_lines = blob_memo.get(
+                self.blob, "code_lines", lambda: _readlines(self._code_text()),
+                size=lambda lines: _lines_size(self.raw, len(lines)))
+        return code_without_comments_and_blank_lines(self._code_lines, Path(self.path).suffix.lower(), startline, endline)
+
+    def function_count(self, language: Optional[str] = None) -> int:
+        """Same result as count_functions_in_file(self.path, language)."""
+        if not os.path.isfile(self.path):
+            raise ValueError("Please provide a valid path to a source file.")
+        return memo_function_count(self.raw, self.blob, _detect_language(self.path, language))
+
+
+class FileModelCache:
+    """File models of one commit, keyed by path. Create a new cache for every commit."""
+
+    def __init__(self):
+        self._files: Dict[str, FileModel] = {}
+
+    def get(self, path: str) -> FileModel:
+        model = self._files.get(path)
+        if model is None:
+            model = self._files[path] = FileModel(path)
+        return model
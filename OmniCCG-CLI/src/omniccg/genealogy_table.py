@@ -0,0 +1,391 @@
+import os
+import sys
+import zlib
+import struct
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from xml.etree import ElementTree as ET
+
+# File signature and layout version of the columnar genealogy format
+TABLE_MAGIC = b"OCCGTABL"
+TABLE_VERSION = 1
+# Suffix of genealogy tables next to the XML files
+TABLE_SUFFIX = ".occg"
+# Genealogy outputs: the XML files, the table, or both
+OUTPUT_FORMATS = ("xml", "table", "both")
+
+# Unsigned, then signed, array type codes from the narrowest to the widest
+_UNSIGNED_TYPES = ("B", "H", "I", "Q")
+_SIGNED_TYPES = ("b", "h", "i", "q")
+
+
+class StringTable:
+    """Dictionary of the distinct strings of a column; rows keep only their index."""
+
+    def __init__(self, values: Sequence[str] = ()):
+        self.values: List[str] = list(values)
+        self._index: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def add(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[index]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+@dataclass
+class VersionRow:
+    """One version of a lineage, decoded from the table (attribute values as in the XML)."""
+    nr: int
+    hash: str
+    number_pr: str
+    evolution: str
+    change: str
+    author: str
+    n_evo: int
+    n_change: int
+    clones_loc: int
+    has_class: bool
+    # (file, startline, endline, function_name, hash) of the class and of the removed fragments
+    fragments: List[Tuple[str, int, int, str, int]]
+    removed_fragments: List[Tuple[str, int, int, str, int]]
+
+
+@dataclass
+class GenealogyTable:
+    """
+    Genealogy stored by column instead of as XML: commit hashes, labels, file paths and function
+    names live once in string tables, and every version or fragment attribute is one integer
+    column of indexes or values. Versions are grouped into lineages by the version count of each
+    lineage, fragments into versions by their class and removed counts, all in genealogy order.
+
+    The table also keeps the number of analysed commits and the density series, so the metrics
+    report can be computed from it without the XML (see metrics.generate_detailed_report).
+    """
+    last_version: int = 0
+    commits: StringTable = field(default_factory=StringTable)
+    labels: StringTable = field(default_factory=StringTable)
+    files: StringTable = field(default_factory=StringTable)
+    names: StringTable = field(default_factory=StringTable)
+
+    lineage_versions: List[int] = field(default_factory=list)
+
+    version_nr: List[int] = field(default_factory=list)
+    version_commit: List[int] = field(default_factory=list)
+    version_number_pr: List[int] = field(default_factory=list)
+    version_evolution: List[int] = field(default_factory=list)
+    version_change: List[int] = field(default_factory=list)
+    version_author: List[int] = field(default_factory=list)
+    version_n_evo: List[int] = field(default_factory=list)
+    version_n_change: List[int] = field(default_factory=list)
+    version_clones_loc: List[int] = field(default_factory=list)
+    version_has_class: List[int] = field(default_factory=list)
+    version_fragments: List[int] = field(default_factory=list)
+    version_removed: List[int] = field(default_factory=list)
+
+    fragment_file: List[int] = field(default_factory=list)
+    fragment_ls: List[int] = field(default_factory=list)
+    fragment_le: List[int] = field(default_factory=list)
+    fragment_name: List[int] = field(default_factory=list)
+    fragment_hash: List[int] = field(default_factory=list)
+
+    # (commit, density of cloned functions, density of cloned LOC)
+    densities: List[Tuple[int, float, float]] = field(default_factory=list)
+    # (commit, cloned functions over all functions of the dataset)
+    repo_densities: List[Tuple[int, float]] = field(default_factory=list)
+
+    @property
+    def lineage_count(self) -> int:
+        return len(self.lineage_versions)
+
+    @property
+    def version_count(self) -> int:
+        return len(self.version_nr)
+
+    # ---------- building ----------
+
+    def add_version(self, nr, commit, number_pr, evolution, change, author, n_evo, n_change, clones_loc,
+                    has_class: bool) -> None:
+        self.version_nr.append(int(nr))
+        self.version_commit.append(self.commits.add(str(commit)))
+        self.version_number_pr.append(self.labels.add(str(number_pr)))
+        self.version_evolution.append(self.labels.add(str(evolution)))
+        self.version_change.append(self.labels.add(str(change)))
+        self.version_author.append(self.labels.add(str(author)))
+        self.version_n_evo.append(int(n_evo))
+        self.version_n_change.append(int(n_change))
+        self.version_clones_loc.append(int(clones_loc))
+        self.version_has_class.append(1 if has_class else 0)
+        self.version_fragments.append(0)
+        self.version_removed.append(0)
+
+    def add_fragment(self, file, ls, le, function_name, function_hash, removed: bool = False) -> None:
+        """Add a fragment to the class (or the removed fragments) of the last added version."""
+        self.fragment_file.append(self.files.add(str(file)))
+        self.fragment_ls.append(int(ls))
+        self.fragment_le.append(int(le))
+        self.fragment_name.append(self.names.add(str(function_name)))
+        self.fragment_hash.append(int(function_hash))
+        if removed:
+            self.version_removed[-1] += 1
+        else:
+            self.version_fragments[-1] += 1
+
+    @classmethod
+    def from_lineages(cls, lineages: Sequence, last_version: int = 0,
+                      densities: Sequence[Tuple] = (), repo_densities: Sequence[Tuple] = ()) -> "GenealogyTable":
+        """Table of in-memory lineages (omniccg.domain.Lineage), in their genealogy order."""
+        table = cls(last_version=last_version,
+                    densities=[(int(v), float(d), float(l)) for v, d, l in densities],
+                    repo_densities=[(int(v), float(d)) for v, d in repo_densities])
+        for lineage in lineages:
+            table.lineage_versions.append(len(lineage.versions))
+            for version in lineage.versions:
+                cc = version.cloneclass
+                table.add_version(version.nr, version.hash, version.number_pr, version.evolution_pattern,
+                                  version.change_pattern, version.author_pr, version.n_evo, version.n_change,
+                                  version.clones_loc, cc is not None)
+                for f in (cc.fragments if cc is not None else ()):
+                    table.add_fragment(f.file, f.ls, f.le, f.function_name, f.function_hash)
+                for f in version.removed_fragments:
+                    table.add_fragment(f.file, f.ls, f.le, f.function_name, f.function_hash, removed=True)
+        return table
+
+    @classmethod
+    def from_xml(cls, lineages_xml: str, last_version: int = 0) -> "GenealogyTable":
+        """
+        Table of a <lineages> document as written by WriteLineageFile. The XML has no density
+        series; `last_version` (the number of analysed commits) is only needed for the metrics.
+        """
+        table = cls(last_version=last_version)
+        for lin in ET.fromstring(lineages_xml).findall("lineage"):
+            n_versions = 0
+            for elem in lin:
+                if elem.tag == "version":
+                    a = elem.attrib
+                    cc = elem.find("class")
+                    table.add_version(a.get("nr"), a.get("hash"), a.get("number_pr"), a.get("evolution"),
+                                      a.get("change"), a.get("author"), a.get("n_evo"), a.get("n_cha"),
+                                      a.get("clones_LOC"), cc is not None)
+                    for src in (cc.findall("source") if cc is not None else ()):
+                        table.add_fragment(*_source_attributes(src))
+                    n_versions += 1
+                elif elem.tag == "source" and n_versions:
+                    # removed fragments follow the version they were removed from
+                    table.add_fragment(*_source_attributes(elem), removed=True)
+            table.lineage_versions.append(n_versions)
+        return table
+
+    # ---------- reading ----------
+
+    def iter_lineages(self) -> Iterator[List[VersionRow]]:
+        """The versions of every lineage, decoded one lineage at a time."""
+        v = 0
+        f = 0
+        for n_versions in self.lineage_versions:
+            rows = []
+            for _ in range(n_versions):
+                n_fragments = self.version_fragments[v]
+                n_removed = self.version_removed[v]
+                fragments = [self._fragment(i) for i in range(f, f + n_fragments)]
+                f += n_fragments
+                removed = [self._fragment(i) for i in range(f, f + n_removed)]
+                f += n_removed
+                rows.append(VersionRow(
+                    nr=self.version_nr[v],
+                    hash=self.commits[self.version_commit[v]],
+                    number_pr=self.labels[self.version_number_pr[v]],
+                    evolution=self.labels[self.version_evolution[v]],
+                    change=self.labels[self.version_change[v]],
+                    author=self.labels[self.version_author[v]],
+                    n_evo=self.version_n_evo[v],
+                    n_change=self.version_n_change[v],
+                    clones_loc=self.version_clones_loc[v],
+                    has_class=bool(self.version_has_class[v]),
+                    fragments=fragments,
+                    removed_fragments=removed,
+                ))
+                v += 1
+            yield rows
+
+    def iter_version_labels(self) -> Iterator[List[Tuple[int, str, str]]]:
+        """(nr, evolution, change) of the versions of every lineage; reads no fragment column."""
+        v = 0
+        labels = self.labels
+        for n_versions in self.lineage_versions:
+            yield [(self.version_nr[i], labels[self.version_evolution[i]], labels[self.version_change[i]])
+                   for i in range(v, v + n_versions)]
+            v += n_versions
+
+    def _fragment(self, i: int) -> Tuple[str, int, int, str, int]:
+        return (self.files[self.fragment_file[i]], self.fragment_ls[i], self.fragment_le[i],
+                self.names[self.fragment_name[i]], self.fragment_hash[i])
+
+    def to_xml(self) -> str:
+        """The <lineages> XML of the table, byte for byte what WriteLineageFile writes."""
+        parts = ["<lineages>\n"]
+        for versions in self.iter_lineages():
+            parts.append("<lineage>\n")
+            for row in versions:
+                parts.append(
+                    '\t<version nr="%d" hash="%s" number_pr="%s" evolution="%s" change="%s" author="%s" '
+                    'n_evo="%d" n_cha="%d" clones_LOC="%d" >\n' % (
+                        row.nr, row.hash, row.number_pr, row.evolution, row.change, row.author,
+                        row.n_evo, row.n_change, row.clones_loc))
+                if row.has_class:
+                    parts.append('\t\t<class nclones="%d">\n' % len(row.fragments))
+                    parts.extend(_source_xml(f) for f in row.fragments)
+                    parts.append("\t\t</class>\n")
+                parts.append("\t</version>\n")
+                parts.extend(_source_xml(f) for f in row.removed_fragments)
+            parts.append("</lineage>\n")
+        parts.append("</lineages>\n")
+        return "".join(parts)
+
+
+def _source_attributes(src) -> Tuple[str, int, int, str, int]:
+    a = src.attrib
+    return a.get("file", ""), int(a.get("startline")), int(a.get("endline")), a.get("function_name", ""), int(a.get("hash"))
+
+
+def _source_xml(f: Tuple[str, int, int, str, int]) -> str:
+    return '\t\t\t<source file="%s" startline="%d" endline="%d" function_name="%s" hash="%d"></source>\n' % f
+
+
+# =========================
+# Binary encoding
+# =========================
+
+def _int_type(values: Sequence[int]) -> str:
+    """Narrowest array type code holding every value."""
+    if not values:
+        return "B"
+    low, high = min(values), max(values)
+    if low >= 0:
+        for code in _UNSIGNED_TYPES:
+            if high < 1 << (8 * array(code).itemsize):
+                return code
+    else:
+        for code in _SIGNED_TYPES:
+            bits = 8 * array(code).itemsize - 1
+            if -(1 << bits) <= low and high < 1 << bits:
+                return code
+    raise ValueError("Integer column does not fit in 64 bits")
+
+
+def _pack_column(values: Sequence, code: Optional[str] = None) -> bytes:
+    """Type code + row count + the values, little-endian."""
+    code = code or _int_type(values)
+    column = array(code, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return code.encode("ascii") + struct.pack("<Q", len(column)) + column.tobytes()
+
+
+def _pack_strings(table: StringTable) -> bytes:
+    blobs = [v.encode("utf-8", errors="surrogateescape") for v in table.values]
+    return _pack_column([len(b) for b in blobs]) + b"".join(blobs)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise ValueError("Truncated genealogy table")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def column(self) -> List:
+        code = self.take(1).decode("ascii")
+        (count,) = struct.unpack("<Q", self.take(8))
+        column = array(code)
+        column.frombytes(self.take(count * column.itemsize))
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column.tolist()
+
+    def strings(self) -> StringTable:
+        values = []
+        for size in self.column():
+            values.append(self.take(size).decode("utf-8", errors="surrogateescape"))
+        return StringTable(values)
+
+
+# Integer columns in file order
+_INT_COLUMNS = (
+    "lineage_versions",
+    "version_nr", "version_commit", "version_number_pr", "version_evolution", "version_change",
+    "version_author", "version_n_evo", "version_n_change", "version_clones_loc", "version_has_class",
+    "version_fragments", "version_removed",
+    "fragment_file", "fragment_ls", "fragment_le", "fragment_name", "fragment_hash",
+)
+_STRING_TABLES = ("commits", "labels", "files", "names")
+
+
+def encode_table(table: GenealogyTable) -> bytes:
+    """
+    Magic + version byte + zlib-compressed body. The body holds the commit count, the string
+    tables, the integer columns and the density series, each column as its narrowest array type.
+    """
+    body = [struct.pack("<Q", table.last_version)]
+    body.extend(_pack_strings(getattr(table, name)) for name in _STRING_TABLES)
+    body.extend(_pack_column(getattr(table, name)) for name in _INT_COLUMNS)
+    body.append(_pack_column([d[0] for d in table.densities]))
+    body.append(_pack_column([d[1] for d in table.densities], "d"))
+    body.append(_pack_column([d[2] for d in table.densities], "d"))
+    body.append(_pack_column([d[0] for d in table.repo_densities]))
+    body.append(_pack_column([d[1] for d in table.repo_densities], "d"))
+    return TABLE_MAGIC + bytes([TABLE_VERSION]) + zlib.compress(b"".join(body), 6)
+
+
+def decode_table(data: bytes) -> GenealogyTable:
+    header = len(TABLE_MAGIC) + 1
+    if len(data) < header or not data.startswith(TABLE_MAGIC):
+        raise ValueError("Not an OmniCCG genealogy table")
+    if data[header - 1] != TABLE_VERSION:
+        raise ValueError(f"Unsupported genealogy table version: {data[header - 1]}")
+    try:
+        body = zlib.decompress(data[header:])
+    except zlib.error as e:
+        raise ValueError(f"Truncated or corrupted genealogy table: {e}") from e
+    reader = _Reader(body)
+    (last_version,) = struct.unpack("<Q", reader.take(8))
+    table = GenealogyTable(last_version=last_version)
+    for name in _STRING_TABLES:
+        setattr(table, name, reader.strings())
+    for name in _INT_COLUMNS:
+        setattr(table, name, reader.column())
+    versions, densities, locs = reader.column(), reader.column(), reader.column()
+    table.densities = list(zip(versions, densities, locs))
+    versions, densities = reader.column(), reader.column()
+    table.repo_densities = list(zip(versions, densities))
+    if sum(table.lineage_versions) != table.version_count or \
+            sum(table.version_fragments) + sum(table.version_removed) != len(table.fragment_file):
+        raise ValueError("Inconsistent genealogy table")
+    return table
+
+
+def save_table(path: str, table: GenealogyTable) -> None:
+    """Write the table to `path`, replaced atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fp:
+        fp.write(encode_table(table))
+    os.replace(tmp, path)
+
+
+def load_table(path: str) -> GenealogyTable:
+    """Read a table written by save_table; raises ValueError when the file is not one."""
+    return decode_table(Path(path).read_bytes())
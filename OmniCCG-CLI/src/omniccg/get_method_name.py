@@ -1,4 +1,5 @@
 import re
+from bisect import bisect_right
 from collections import defaultdict
 
 CONTROL_KEYWORDS = {"if", "for", "while", "catch", "switch", "synchronized"}
@@ -83,6 +84,14 @@ def get_enclosing_java_method(file_path: str, startline: int, endline: int) -> s
     with open(file_path, "r", encoding="utf-8") as f:
         raw = f.read()
 
+    return MethodSpans.from_source(raw).enclosing(startline, endline)
+
+
+def map_java_methods(raw: str):
+    """
+    Strip comments from a Java source and map every line inside a method body to the method name.
+    Returns (lines, line_to_method), lines being the comment-free source lines.
+    """
     src = _strip_comments(raw)
     lines = src.splitlines()
 
@@ -162,6 +171,11 @@ def get_enclosing_java_method(file_path: str, startline: int, endline: int) -> s
                 awaiting_body_for = None
                 sig_buf = []
 
+    return lines, line_to_method
+
+
+def find_enclosing_method(lines, line_to_method, startline: int, endline: int) -> str | None:
+    """Method covering most of [startline, endline], using the result of map_java_methods."""
     # select the method that covers the largest part of the interval
     startline = max(1, startline)
     endline = max(startline, endline)
@@ -175,7 +189,11 @@ def get_enclosing_java_method(file_path: str, startline: int, endline: int) -> s
         # return the one with maximum coverage
         return max(coverage.items(), key=lambda kv: kv[1])[0]
 
-    # heuristic: look up to 50 lines above startline for a signature above
+    return _signature_above(lines, startline)
+
+
+def _signature_above(lines, startline: int) -> str | None:
+    """Heuristic for ranges outside any method body: the last signature in the 50 lines above."""
     lookback = max(1, startline - 50)
     text_above = "\n".join(lines[lookback - 1 : startline])
     # get last block that looks like a signature before a '{'
@@ -197,3 +215,50 @@ def get_enclosing_java_method(file_path: str, startline: int, endline: int) -> s
                 candidate = name
             acc = []
     return candidate
+
+
+class MethodSpans:
+    """
+    Method bodies of one Java source as sorted, non-overlapping runs of consecutive lines
+    (start, end, name), built once per file version.
+
+    enclosing() answers find_enclosing_method with a binary search over the runs: its cost
+    depends on the number of runs the range overlaps, not on the length of the range.
+    """
+
+    def __init__(self, lines, line_to_method):
+        self.lines = lines
+        self.starts = []
+        self.ends = []
+        self.names = []
+        for ln in sorted(line_to_method):
+            name = line_to_method[ln]
+            if self.names and self.ends[-1] == ln - 1 and self.names[-1] == name:
+                self.ends[-1] = ln
+            else:
+                self.starts.append(ln)
+                self.ends.append(ln)
+                self.names.append(name)
+
+    @classmethod
+    def from_source(cls, raw: str) -> "MethodSpans":
+        return cls(*map_java_methods(raw))
+
+    def enclosing(self, startline: int, endline: int) -> str | None:
+        """Same result as find_enclosing_method(lines, line_to_method, startline, endline)."""
+        startline = max(1, startline)
+        endline = min(max(startline, endline), len(self.lines))
+
+        # first run that ends at or after startline: runs are disjoint and sorted, so ends are too
+        i = bisect_right(self.ends, startline - 1)
+        coverage = {}
+        starts, ends, names = self.starts, self.ends, self.names
+        while i < len(starts) and starts[i] <= endline:
+            covered = min(ends[i], endline) - max(starts[i], startline) + 1
+            # dict order = first line covered, so ties resolve as in find_enclosing_method
+            coverage[names[i]] = coverage.get(names[i], 0) + covered
+            i += 1
+
+        if coverage:
+            return max(coverage.items(), key=lambda kv: kv[1])[0]
+        return _signature_above(self.lines, startline)
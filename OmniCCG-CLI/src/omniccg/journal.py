@@ -0,0 +1,139 @@
+import os
+from typing import Dict, List, Optional, Tuple
+from omniccg.domain.Lineage import Lineage
+
+
+class LineageJournal:
+    """
+    Append-only log of the lineage changes made by every analysed commit.
+
+    Instead of rewriting the whole genealogy after each commit, only the lineages touched by the
+    commit are written, as a delta record:
+
+        C <commit nr> <hash>
+        L <lineage id> <versions kept> <byte size of each following version, comma separated>
+        <XML of the versions after the kept ones>
+        E
+
+    Replaying the records in order rebuilds exactly the <lineages> XML that WriteLineageFile
+    produces for the same state (see materialize_journal).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fp = None
+        self._next_id = 0
+        # lineage id -> (lineage, number of already journaled versions that are unchanged)
+        self._dirty: Dict[int, Tuple[Lineage, int]] = {}
+
+    def open(self, lineages: List[Lineage], offset: Optional[int] = None) -> None:
+        """
+        Start journaling on top of `lineages`.
+        With an offset (from a checkpoint) the journal is cut back to it and continued; otherwise
+        it starts empty and the first flush records every lineage in full.
+        """
+        mode = "wb"
+        if offset is not None and os.path.exists(self.path) and os.path.getsize(self.path) >= offset:
+            mode = "r+b"
+        self._fp = open(self.path, mode)
+        if mode == "r+b":
+            self._fp.truncate(offset)
+            self._fp.seek(offset)
+
+        self._next_id = 0
+        for lineage in lineages:
+            if lineage.id is None:
+                lineage.id = self._next_id
+            self._next_id = max(self._next_id, lineage.id + 1)
+            if mode == "wb":
+                self._dirty[lineage.id] = (lineage, 0)
+
+    def added(self, lineage: Lineage) -> None:
+        lineage.id = self._next_id
+        self._next_id += 1
+        self._dirty[lineage.id] = (lineage, 0)
+
+    def changed(self, lineage: Lineage, first: int) -> None:
+        """Record that the versions of `lineage` from index `first` on are new or modified."""
+        _, keep = self._dirty.get(lineage.id, (lineage, first))
+        self._dirty[lineage.id] = (lineage, min(keep, first))
+
+    def flush(self, commit_nr: int, hash_: str) -> None:
+        if self._fp is None or not self._dirty:
+            return
+        chunks = [f"C {commit_nr} {hash_}\n".encode("utf-8")]
+        for lineage_id in sorted(self._dirty):
+            lineage, keep = self._dirty[lineage_id]
+            versions = [version.toXML().encode("utf-8") for version in lineage.versions[keep:]]
+            sizes = ",".join(str(len(v)) for v in versions)
+            chunks.append(f"L {lineage_id} {keep} {sizes}\n".encode("utf-8"))
+            chunks.extend(versions)
+        chunks.append(b"E\n")
+        self._fp.write(b"".join(chunks))
+        self._fp.flush()
+        self._dirty.clear()
+
+    def tell(self) -> Optional[int]:
+        return self._fp.tell() if self._fp is not None else None
+
+    def close(self) -> None:
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+def replay_journal(path: str) -> List[List[bytes]]:
+    """
+    Return the version XML of every lineage, in lineage id order, after applying all complete
+    commit records of the journal. A record cut off by a crash is ignored.
+    """
+    lineages: Dict[int, List[bytes]] = {}
+    with open(path, "rb") as fp:
+        data = fp.read()
+
+    pos = 0
+    while pos < len(data):
+        end = data.find(b"\n", pos)
+        if end < 0 or not data.startswith(b"C ", pos):
+            break
+        pos = end + 1
+        pending: List[Tuple[int, int, List[bytes]]] = []
+        complete = False
+        while pos < len(data):
+            end = data.find(b"\n", pos)
+            if end < 0:
+                break
+            header = data[pos:end]
+            if header == b"E":
+                pos = end + 1
+                complete = True
+                break
+            fields = header.split(b" ")
+            sizes = [int(n) for n in fields[3].split(b",")] if len(fields) > 3 and fields[3] else []
+            pos = end + 1
+            versions = []
+            for size in sizes:
+                versions.append(data[pos:pos + size])
+                pos += size
+            if pos > len(data):
+                break
+            pending.append((int(fields[1]), int(fields[2]), versions))
+        if not complete:
+            break
+        for lineage_id, keep, versions in pending:
+            current = lineages.setdefault(lineage_id, [])
+            del current[keep:]
+            current.extend(versions)
+
+    return [lineages[i] for i in sorted(lineages)]
+
+
+def materialize_journal(path: str) -> str:
+    """Build the <lineages> XML described by a journal, as WriteLineageFile would write it."""
+    out = [b"<lineages>\n"]
+    for versions in replay_journal(path):
+        out.append(b"<lineage>\n")
+        out.extend(versions)
+        out.append(b"</lineage>\n")
+    out.append(b"</lineages>\n")
+    return b"".join(out).decode("utf-8")
@@ -1,8 +1,9 @@
 from xml.etree import ElementTree as ET
 from xml.dom import minidom
-from collections import Counter
-from dataclasses import dataclass
-from typing import List, Tuple
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+from omniccg.genealogy_table import GenealogyTable, load_table
 
 # --- Configure your label mapping here (case-insensitive) ---
 CONSISTENT_CHANGE_LABELS = {"same", "consistent"}
@@ -70,6 +71,31 @@ def parse_lineages(xml_text: str, last_version: int) -> Tuple[List[LineageInfo],
 
     return infos, evolution_values, change_values
 
+def parse_lineage_table(table: GenealogyTable, last_version: int) -> Tuple[List[LineageInfo], List[str], List[str]]:
+    """Same as parse_lineages, read from the version columns of a genealogy table."""
+    infos: List[LineageInfo] = []
+    evolution_values: List[str] = []
+    change_values: List[str] = []
+
+    for versions in table.iter_version_labels():
+        if not versions:
+            continue
+        nrs = [nr for nr, _, _ in versions]
+        first_nr = min(nrs)
+        last_nr = max(nrs)
+
+        lineage_change = []
+        for _, evo, chg in versions:
+            evo = _norm(evo)
+            chg = _norm(chg)
+            evolution_values.append(evo if evo else "None")
+            change_values.append(chg if chg else "None")
+            lineage_change.append(chg if chg else "None")
+
+        infos.append(LineageInfo(first_nr, last_nr, (last_nr - first_nr) + 1, last_nr != last_version, lineage_change))
+
+    return infos, evolution_values, change_values
+
 def classify_lineage_change_category(change_values: List[str]) -> str:
     """
     Classify a lineage into one of:
@@ -94,12 +120,11 @@ def compute_kvolatile_points(ages: List[int], is_dead: List[bool]) -> List[Tuple
     """
     Returns list of tuples (k, count_dead_age_le_k, cdf_dead, rvolatile).
     """
-    total_all = len(ages)
     dead_ages = [a for a, d in zip(ages, is_dead) if d]
-    total_dead = len(dead_ages)
-    max_age = max(ages) if ages else 0
-    f_dead = Counter(dead_ages)
+    return _kvolatile_points(len(ages), max(ages) if ages else 0, Counter(dead_ages))
 
+def _kvolatile_points(total_all: int, max_age: int, f_dead: Counter) -> List[Tuple[int, int, float, float]]:
+    total_dead = sum(f_dead.values())
     points: List[Tuple[int, int, float, float]] = []
     cum_dead = 0
     for k in range(max_age + 1):
@@ -109,12 +134,142 @@ def compute_kvolatile_points(ages: List[int], is_dead: List[bool]) -> List[Tuple
         points.append((k, cum_dead, cdf_dead, rvolatile))
     return points
 
+def _change_bucket(lbl: str) -> Optional[str]:
+    """Version-level bucket of a lowercased change label; None for 'none' and unknown labels."""
+    if lbl == "same":
+        return "same"
+    if lbl in INCONSISTENT_CHANGE_LABELS:
+        return "inconsistent"
+    if lbl in CONSISTENT_CHANGE_LABELS:
+        return "consistent"
+    return None
+
+@dataclass
+class LineageStats:
+    """
+    Everything the report needs from the lineages, as counters:
+      - ages: lineages per age (in versions)
+      - ages_by_last: the same, per number of the lineage's last version (alive = last_version)
+      - categories: lineages per change category (same/consistent/inconsistent)
+      - evolution / change: versions per lowercased label ('none' included)
+    """
+    lineages: int = 0
+    ages: Counter = field(default_factory=Counter)
+    ages_by_last: Dict[int, Counter] = field(default_factory=lambda: defaultdict(Counter))
+    categories: Counter = field(default_factory=Counter)
+    evolution: Counter = field(default_factory=Counter)
+    change: Counter = field(default_factory=Counter)
+
+    def count_lineage(self, age: int, last_nr: int, category: str, n: int = 1) -> None:
+        """Add (n=1) or remove (n=-1) one lineage."""
+        self.lineages += n
+        self.ages[age] += n
+        self.ages_by_last[last_nr][age] += n
+        self.categories[category] += n
+        # keep the counters free of emptied entries; their keys are the min/max ages
+        if not self.ages[age]:
+            del self.ages[age]
+        if not self.ages_by_last[last_nr][age]:
+            del self.ages_by_last[last_nr][age]
+            if not self.ages_by_last[last_nr]:
+                del self.ages_by_last[last_nr]
+
+    @classmethod
+    def from_infos(cls, lineages: List[LineageInfo], evolution_values: List[str],
+                   change_values: List[str]) -> "LineageStats":
+        stats = cls()
+        for i in lineages:
+            stats.count_lineage(i.age_versions, i.last_nr, classify_lineage_change_category(i.change_labels))
+        stats.evolution.update(_lower(x) if x else "none" for x in evolution_values)
+        stats.change.update(_lower(x) if x else "none" for x in change_values)
+        return stats
+
+def _version_labels(version) -> Tuple[str, str]:
+    """Lowercased (evolution, change) of a CloneVersion, as parse_lineages reads them from the XML."""
+    return (_lower(str(version.evolution_pattern)) or "none", _lower(str(version.change_pattern)) or "none")
+
+class LineageMetrics:
+    """
+    Keeps a LineageStats of the genealogy up to date while it is built, so that the report needs
+    no pass over the lineages (and no lineage XML) at the end.
+
+    It is told about lineage changes like the lineage journal: added() for a new lineage and
+    changed(lineage, first) *before* its versions from index `first` on are modified, appended or
+    removed. changed() takes those versions out of the counters right away, while they still hold
+    their old values; flush() counts the lineage's versions from `first` on again. Only the
+    touched versions of the touched lineages are visited per commit.
+    """
+
+    def __init__(self):
+        self.stats = LineageStats()
+        # id(lineage) -> [lineage, change labels of its versions, counted (age, last nr, category)]
+        self._lineages: Dict[int, list] = {}
+        # id(lineage) -> first version index taken out of the counters
+        self._pending: Dict[int, int] = {}
+
+    def reset(self, lineages: List) -> None:
+        """Count `lineages` from scratch, e.g. those restored from a checkpoint."""
+        self.stats = LineageStats()
+        self._lineages.clear()
+        self._pending.clear()
+        for lineage in lineages:
+            self.added(lineage)
+        self.flush()
+
+    def added(self, lineage) -> None:
+        self._lineages[id(lineage)] = [lineage, Counter(), None]
+        self._pending[id(lineage)] = 0
+
+    def changed(self, lineage, first: int) -> None:
+        entry = self._lineages[id(lineage)]
+        pending = self._pending.get(id(lineage))
+        if pending is None:
+            self._uncount_lineage(entry)
+            pending = len(lineage.versions)
+        if first < pending:
+            self._count_versions(entry, lineage.versions[first:pending], -1)
+            pending = first
+        self._pending[id(lineage)] = pending
+
+    def flush(self) -> None:
+        """Count the versions changed since the last flush; called after every commit."""
+        for key, first in self._pending.items():
+            entry = self._lineages[key]
+            lineage = entry[0]
+            self._count_versions(entry, lineage.versions[first:], 1)
+            if lineage.versions:
+                # versions are appended in commit order, so the first and last hold the extreme nrs
+                first_nr, last_nr = lineage.versions[0].nr, lineage.versions[-1].nr
+                category = classify_lineage_change_category(list(+entry[1]))
+                entry[2] = (last_nr - first_nr + 1, last_nr, category)
+                self.stats.count_lineage(*entry[2])
+        self._pending.clear()
+
+    def report(self, last_version: int, clones_density: List[Tuple[int, float, float]],
+               function_density: Optional[List[Tuple[int, float]]] = None) -> str:
+        """The generate_detailed_report XML of the tracked lineages."""
+        self.flush()
+        return build_stats_xml(self.stats, last_version, clones_density, function_density)
+
+    def _uncount_lineage(self, entry: list) -> None:
+        if entry[2] is not None:
+            self.stats.count_lineage(*entry[2], n=-1)
+            entry[2] = None
+
+    def _count_versions(self, entry: list, versions: List, n: int) -> None:
+        for version in versions:
+            evo, chg = _version_labels(version)
+            self.stats.evolution[evo] += n
+            self.stats.change[chg] += n
+            entry[1][chg] += n
+
 def build_results_xml(
     lineages: List[LineageInfo],
     evolution_values: List[str],
     change_values: List[str],
     last_version: int,
-    clones_density: List[Tuple[int, float, float]]  # list of (version, density, extra) -> extra unused
+    clones_density: List[Tuple[int, float, float]],  # list of (version, density, extra) -> extra unused
+    function_density: Optional[List[Tuple[int, float]]] = None,
 ) -> str:
     """
     Build a rich XML report.
@@ -124,58 +279,53 @@ def build_results_xml(
     - Adds clone-density averages:
         avg_density_present      : average over provided points
         avg_density_full_range   : average across 1..last_version (missing versions = 0)
+    - Adds the same block as <function_density> when function_density (version, density) is given.
     - EXCLUDES 'None' labels from the *version-level* distributions as they mark lineage origin.
     - Formats ALL float metrics with two decimals.
     """
+    return build_stats_xml(LineageStats.from_infos(lineages, evolution_values, change_values),
+                           last_version, clones_density, function_density)
+
+def build_stats_xml(
+    stats: "LineageStats",
+    last_version: int,
+    clones_density: List[Tuple[int, float, float]],
+    function_density: Optional[List[Tuple[int, float]]] = None,
+) -> str:
+    """build_results_xml from the counters of a LineageStats."""
     clones_density = _dedup_consecutive_by_density(clones_density, tol=1e-9)
 
-    total_lineages = len(lineages)
-    ages = [i.age_versions for i in lineages]
-    is_dead_flags = [i.is_dead for i in lineages]
+    total_lineages = stats.lineages
+    alive_ages = stats.ages_by_last.get(last_version, Counter())
+    dead_ages = stats.ages - alive_ages
 
     # Status
-    dead_count = sum(1 for i in lineages if i.is_dead)
-    alive_count = total_lineages - dead_count
+    alive_count = sum(alive_ages.values())
+    dead_count = total_lineages - alive_count
 
     # Average lineage age (in versions)
-    avg_age_all = safe_avg([float(a) for a in ages])
+    avg_age_all = (sum(a * n for a, n in stats.ages.items()) / total_lineages) if total_lineages else 0.0
 
     # Lineage-level change categories (same/consistent/inconsistent)
-    lineage_cats = [classify_lineage_change_category(i.change_labels) for i in lineages]
-    lineage_cat_counts = Counter(lineage_cats)
+    lineage_cat_counts = stats.categories
     lineage_cat_ratios = {
         k: (lineage_cat_counts.get(k, 0) / total_lineages if total_lineages else 0.0)
         for k in ("consistent", "same", "inconsistent")
     }
 
     # Dead-lineage length stats
-    dead_ages = [a for a, d in zip(ages, is_dead_flags) if d]
     dead_min = min(dead_ages) if dead_ages else 0
-    dead_avg = safe_avg(dead_ages) if dead_ages else 0.0
+    dead_avg = (sum(a * n for a, n in dead_ages.items()) / dead_count) if dead_ages else 0.0
     dead_max = max(dead_ages) if dead_ages else 0
 
     # --- Version-level distributions (EXCLUDE 'none' because it marks lineage origin) ---
-    evo_labels = [_lower(x) if x else "none" for x in evolution_values]
-    chg_raw    = [_lower(x) if x else "none" for x in change_values]
-
-    evo_labels_no_none = [lbl for lbl in evo_labels if lbl != "none"]
-
-    def map_change_bucket(lbl: str) -> str:
-        lbl = _lower(lbl) if lbl else "none"
-        if lbl == "same":
-            return "same"
-        if lbl in INCONSISTENT_CHANGE_LABELS:
-            return "inconsistent"
-        if lbl in CONSISTENT_CHANGE_LABELS:
-            return "consistent"
+    evo_counts = Counter({lbl: n for lbl, n in stats.evolution.items() if lbl != "none" and n > 0})
+    chg_counts: Counter = Counter()
+    for lbl, n in stats.change.items():
+        bucket = _change_bucket(lbl)
         # 'none' (origin) and unknowns are excluded from version-level stats
-        return "exclude"
-
-    chg_buckets_no_none = [map_change_bucket(x) for x in chg_raw if (_lower(x) if x else "none") != "none"]
-    chg_buckets_no_none = [b for b in chg_buckets_no_none if b != "exclude"]
-
-    evo_counts = Counter(evo_labels_no_none)
-    chg_counts = Counter(chg_buckets_no_none)
+        if bucket is not None and n > 0:
+            chg_counts[bucket] += n
 
     total_versions_evo = sum(evo_counts.values())
     total_versions_chg = sum(chg_counts.values())
@@ -184,45 +334,17 @@ def build_results_xml(
         return (100.0 * v / total) if total else 0.0
 
     # k-volatile points
-    k_points = compute_kvolatile_points(ages, is_dead_flags)
+    k_points = _kvolatile_points(total_lineages, max(stats.ages) if stats.ages else 0, dead_ages)
 
     # ---- Build XML ----
     root = ET.Element("results")
 
     # ---------- clone density block (list of tuples + averages) ----------
-    cd_block = ET.SubElement(root, "clone_density")
-
-    versions_seen: List[int] = []
-    densities: List[float] = []
-
-    for tup in clones_density or []:
-        ver = tup[0] if len(tup) > 0 else None
-        dens = tup[1] if len(tup) > 1 else None
-
-        pt = ET.SubElement(cd_block, "point")
-        ET.SubElement(pt, "version").text = "" if ver is None else str(ver)
-        ET.SubElement(pt, "clones_density").text = "" if dens is None else fmt2(dens)
-
-        if ver is not None and dens is not None:
-            versions_seen.append(int(ver))
-            try:
-                densities.append(float(dens))
-            except Exception:
-                pass
-
-    avg_density_present = safe_avg(densities)
-
-    if isinstance(last_version, int) and last_version > 0:
-        dens_by_ver = {int(v): float(d) for v, d in zip(versions_seen, densities)}
-        full_series = [dens_by_ver.get(v, 0.0) for v in range(1, last_version + 1)]
-        avg_density_full_range = safe_avg(full_series)
-    else:
-        avg_density_full_range = avg_density_present
-
-    cd_summary = ET.SubElement(cd_block, "summary")
-    ET.SubElement(cd_summary, "versions_count_present").text = str(len(densities))
-    ET.SubElement(cd_summary, "avg_density_present").text = fmt2(avg_density_present)
-    ET.SubElement(cd_summary, "avg_density_full_range").text = fmt2(avg_density_full_range)
+    _add_density_block(root, "clone_density", "clones_density", clones_density, last_version)
+    if function_density is not None:
+        # cloned functions over all functions of the dataset, as opposed to those of the cloned files
+        _add_density_block(root, "function_density", "function_density",
+                           _dedup_consecutive_by_density(function_density, tol=1e-9), last_version)
 
     # ---------- global lineage metrics ----------
     ET.SubElement(root, "total_clone_lineages").text = str(total_lineages)
@@ -274,6 +396,42 @@ def build_results_xml(
 
     return _pretty_xml(root)
 
+def _add_density_block(root, tag: str, value_tag: str, points: List[Tuple], last_version: int) -> None:
+    """<tag> with a <point> (version, density) per tuple and the averages of the series."""
+    cd_block = ET.SubElement(root, tag)
+
+    versions_seen: List[int] = []
+    densities: List[float] = []
+
+    for tup in points or []:
+        ver = tup[0] if len(tup) > 0 else None
+        dens = tup[1] if len(tup) > 1 else None
+
+        pt = ET.SubElement(cd_block, "point")
+        ET.SubElement(pt, "version").text = "" if ver is None else str(ver)
+        ET.SubElement(pt, value_tag).text = "" if dens is None else fmt2(dens)
+
+        if ver is not None and dens is not None:
+            versions_seen.append(int(ver))
+            try:
+                densities.append(float(dens))
+            except Exception:
+                pass
+
+    avg_density_present = safe_avg(densities)
+
+    if isinstance(last_version, int) and last_version > 0:
+        dens_by_ver = {int(v): float(d) for v, d in zip(versions_seen, densities)}
+        full_series = [dens_by_ver.get(v, 0.0) for v in range(1, last_version + 1)]
+        avg_density_full_range = safe_avg(full_series)
+    else:
+        avg_density_full_range = avg_density_present
+
+    cd_summary = ET.SubElement(cd_block, "summary")
+    ET.SubElement(cd_summary, "versions_count_present").text = str(len(densities))
+    ET.SubElement(cd_summary, "avg_density_present").text = fmt2(avg_density_present)
+    ET.SubElement(cd_summary, "avg_density_full_range").text = fmt2(avg_density_full_range)
+
 def _dedup_consecutive_by_density(points: List[Tuple[int, float, float]], tol: float = 1e-9):
     """
     Remove consecutive points whose density (2nd element) repeats.
@@ -300,17 +458,32 @@ def _dedup_consecutive_by_density(points: List[Tuple[int, float, float]], tol: f
 
 # --------- Public entry-point ---------
 def generate_detailed_report(
-    xml_text: str,
+    lineages: Union[str, GenealogyTable],
     last_version: int,
-    clones_density: List[Tuple[int, float, float]]
+    clones_density: List[Tuple[int, float, float]],
+    function_density: Optional[List[Tuple[int, float]]] = None,
 ) -> str:
     """
     High-level function: parse -> compute -> build XML report.
+    - `lineages` is the lineage XML or a GenealogyTable (read from its columns, no XML involved).
     - Produces a <clone_density> block with multiple <point> items,
       each using (version, density) from the tuple list.
     - Adds density averages: avg_density_present and avg_density_full_range.
+    - Adds a <function_density> block (whole-dataset function density) when given.
     - EXCLUDES 'None' from version-level distributions ('evolution'/'change').
     - Formats ALL float metrics with two decimals.
     """
-    lineages, evo_vals, chg_vals = parse_lineages(xml_text, last_version)
-    return build_results_xml(lineages, evo_vals, chg_vals, last_version, clones_density)
+    if isinstance(lineages, GenealogyTable):
+        infos, evo_vals, chg_vals = parse_lineage_table(lineages, last_version)
+    else:
+        infos, evo_vals, chg_vals = parse_lineages(lineages, last_version)
+    return build_results_xml(infos, evo_vals, chg_vals, last_version, clones_density, function_density)
+
+def generate_table_report(table: Union[str, GenealogyTable]) -> str:
+    """
+    Metrics report of a genealogy table (or the path of a .occg file), using the commit count and
+    density series stored in the table.
+    """
+    if not isinstance(table, GenealogyTable):
+        table = load_table(table)
+    return generate_detailed_report(table, table.last_version, table.densities, table.repo_densities)
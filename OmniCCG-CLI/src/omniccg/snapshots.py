@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass
+from typing import List
+
+
+def _git(args: List[str], cwd: str, check: bool = True) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          text=True, check=check, stdin=subprocess.DEVNULL)
+
+
+@dataclass
+class SnapshotProvider:
+    """
+    Bounded pool of reusable `git worktree`s of one repository.
+
+    Each slot owns a detached worktree at <root_dir>/w<slot>/repo, so several commits can be
+    materialized at the same time without touching the main working copy. Moving a slot to
+    another commit only rewrites the files that differ between the two trees.
+    The provider only holds paths, so it can be handed to worker processes.
+    """
+    repo_dir: str
+    root_dir: str
+    size: int = 1
+
+    def workspace_dir(self, slot: int) -> str:
+        return os.path.join(self.root_dir, f"w{slot}")
+
+    def worktree_dir(self, slot: int) -> str:
+        return os.path.join(self.workspace_dir(slot), "repo")
+
+    def existing_slots(self) -> List[int]:
+        """Slots with a workspace on disk, including those left by runs with more jobs."""
+        if not os.path.isdir(self.root_dir):
+            return []
+        names = os.listdir(self.root_dir)
+        return sorted(int(name[1:]) for name in names if name.startswith("w") and name[1:].isdigit())
+
+    def setup(self) -> None:
+        """Create the missing worktrees; must run in a single process before the slots are used."""
+        repo_dir = os.path.abspath(self.repo_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+        _git(["worktree", "prune"], cwd=repo_dir, check=False)
+        for slot in range(self.size):
+            wt = os.path.abspath(self.worktree_dir(slot))
+            if os.path.isfile(os.path.join(wt, ".git")):
+                continue
+            # Leftover directory that is not a worktree (e.g. an old standalone clone)
+            if os.path.exists(wt):
+                shutil.rmtree(wt, ignore_errors=True)
+            os.makedirs(os.path.dirname(wt), exist_ok=True)
+            _git(["worktree", "add", "--detach", "--force", wt, "HEAD"], cwd=repo_dir)
+
+    def materialize(self, slot: int, commit: str) -> str:
+        """Check `commit` out in the worktree of `slot` and return its path."""
+        wt = os.path.abspath(self.worktree_dir(slot))
+        _git(["checkout", "--detach", "--force", "--quiet", commit], cwd=wt)
+        return wt
+
+    def close(self) -> None:
+        """Remove every worktree of the pool, including slots left by runs with more jobs."""
+        repo_dir = os.path.abspath(self.repo_dir)
+        for slot in self.existing_slots():
+            wt = os.path.abspath(self.worktree_dir(slot))
+            if os.path.exists(wt):
+                _git(["worktree", "remove", "--force", wt], cwd=repo_dir, check=False)
+        _git(["worktree", "prune"], cwd=repo_dir, check=False)
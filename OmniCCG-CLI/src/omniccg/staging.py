@@ -0,0 +1,169 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Tuple
+from omniccg.process_languages.clean_cs_code import clean_file_cs
+from omniccg.process_languages.clean_rb_code import clean_file_rb
+from omniccg.process_languages.clean_py_code import clean_file
+
+STAGING_MODES = ("full", "incremental")
+
+# Per-file sanitizers applied before NiCad parses the staged sources
+SANITIZERS = {
+    "py": clean_file,
+    "cs": clean_file_cs,
+    "rb": clean_file_rb,
+}
+
+
+def _git(args: List[str], cwd: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          stdin=subprocess.DEVNULL)
+
+
+def is_staged_source(rel_path: str, language: Optional[str]) -> bool:
+    """Same selection as a full staging: files ending with .<language>, no .git, no *test* files."""
+    parts = rel_path.replace("\\", "/").split("/")
+    if ".git" in parts:
+        return False
+    name_lower = parts[-1].lower()
+    return name_lower.endswith(f".{language}") and "test" not in name_lower
+
+
+def sanitize_file(path: str, language: Optional[str]) -> None:
+    sanitizer = SANITIZERS.get(language or "")
+    if sanitizer:
+        sanitizer(path)
+
+
+def sanitize_directory(directory: str, language: Optional[str]) -> None:
+    if (language or "") not in SANITIZERS:
+        return
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(f".{language}"):
+                sanitize_file(os.path.join(root, name), language)
+
+
+def head_commit(repo_dir: str) -> Optional[str]:
+    proc = _git(["rev-parse", "HEAD"], cwd=repo_dir)
+    if proc.returncode != 0:
+        return None
+    return proc.stdout.decode("ascii", errors="ignore").strip() or None
+
+
+def write_staged_commit(repo_dir: str, marker_file: str) -> None:
+    """Record which commit the staged dataset reflects."""
+    commit = head_commit(repo_dir)
+    if commit:
+        Path(marker_file).write_text(commit, encoding="utf-8")
+
+
+def _read_staged_commit(marker_file: str) -> Optional[str]:
+    try:
+        return Path(marker_file).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def diff_name_status(repo_dir: str, old: str, new: str, language: Optional[str] = None) -> Optional[List[Tuple[str, str, Optional[str]]]]:
+    """
+    Return (status, path, new_path) for every file changed between two commits.
+    new_path is only set for renames and copies. With a language, only *.<language> files are listed.
+    """
+    pathspec = ["--", f":(icase)*.{language}"] if language else []
+    proc = _git(["diff", "--name-status", "-z", "-M", old, new, *pathspec], cwd=repo_dir)
+    if proc.returncode != 0:
+        return None
+    tokens = proc.stdout.decode("utf-8", errors="surrogateescape").split("\0")
+    changes: List[Tuple[str, str, Optional[str]]] = []
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        status = tokens[i][0]
+        if status in ("R", "C"):
+            changes.append((status, tokens[i + 1], tokens[i + 2]))
+            i += 3
+        else:
+            changes.append((status, tokens[i + 1], None))
+            i += 2
+    return changes
+
+
+def touches_sources(repo_dir: str, old: str, new: str, language: Optional[str]) -> bool:
+    """Whether any file that a staging would select changed between two commits."""
+    changes = diff_name_status(repo_dir, old, new, language)
+    if changes is None:
+        return True
+    return any(
+        is_staged_source(path, language) or (new_path is not None and is_staged_source(new_path, language))
+        for _, path, new_path in changes
+    )
+
+
+def _remove_staged(prod_data_dir: str, rel_path: str) -> None:
+    dst = Path(prod_data_dir) / rel_path
+    try:
+        dst.unlink()
+    except FileNotFoundError:
+        return
+    # Drop directories left empty by the deletion
+    parent = dst.parent
+    root = Path(prod_data_dir)
+    while parent != root and root in parent.parents:
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+        parent = parent.parent
+
+
+def _copy_staged(repo_dir: str, prod_data_dir: str, rel_path: str, language: Optional[str]) -> None:
+    src = os.path.join(repo_dir, rel_path)
+    dst = os.path.join(prod_data_dir, rel_path)
+    if not os.path.isfile(src):
+        return
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        shutil.copy2(src, dst)
+    except Exception:
+        # Ignore copy errors, as a full staging does
+        return
+    sanitize_file(dst, language)
+
+
+def stage_changes(repo_dir: str, prod_data_dir: str, marker_file: str, language: Optional[str]) -> Optional[bool]:
+    """
+    Bring prod_data_dir from the previously staged commit to the commit checked out in repo_dir
+    by applying only the adds, modifies, deletes and renames reported by git diff.
+
+    Returns None when there is nothing to start from (no previous staging, unknown commit),
+    in which case the caller must stage the whole tree. Otherwise returns whether the
+    dataset holds any source file.
+    """
+    previous = _read_staged_commit(marker_file)
+    current = head_commit(repo_dir)
+    if not previous or not current or not os.path.isdir(prod_data_dir):
+        return None
+
+    if previous != current:
+        changes = diff_name_status(repo_dir, previous, current, language)
+        if changes is None:
+            return None
+
+        # An interrupted update must not be mistaken for a consistent dataset
+        os.remove(marker_file)
+        for status, path, new_path in changes:
+            if status == "D":
+                if is_staged_source(path, language):
+                    _remove_staged(prod_data_dir, path)
+            elif status in ("R", "C"):
+                if status == "R" and is_staged_source(path, language):
+                    _remove_staged(prod_data_dir, path)
+                if is_staged_source(new_path, language):
+                    _copy_staged(repo_dir, prod_data_dir, new_path, language)
+            elif is_staged_source(path, language):
+                _copy_staged(repo_dir, prod_data_dir, path, language)
+        Path(marker_file).write_text(current, encoding="utf-8")
+
+    return next(Path(prod_data_dir).rglob(f"*.{language}"), None) is not None
@@ -0,0 +1,115 @@
+import random
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import pytest
+
+from omniccg.domain.CloneClass import CloneClass
+from omniccg.domain.CloneFragment import CloneFragment
+from omniccg.domain.CloneVersion import CloneVersion
+from omniccg.domain.Lineage import Lineage
+
+# (file, startline, endline) of a fragment, as the detectors report it
+Source = Tuple[str, int, int]
+
+EVOLUTION = ["None", "Same", "Add", "Subtract"]
+# "Weird" stands for a label the metrics do not know
+CHANGE = ["None", "Same", "Consistent", "Inconsistent", "Weird"]
+
+
+def _clone_class(rnd: random.Random) -> List[Source]:
+    return [(f"/ws/dataset/production/é{rnd.randrange(50)}/F{rnd.randrange(9)}.java", start, start + rnd.randrange(1, 40))
+            for start in (rnd.randrange(1, 900) for _ in range(rnd.randint(2, 5)))]
+
+
+def _clone_classes(seed: int) -> List[List[Source]]:
+    """Random clone classes of one detector run."""
+    rnd = random.Random(seed)
+    return [_clone_class(rnd) for _ in range(rnd.randint(0, 30))]
+
+
+@dataclass
+class Genealogy:
+    commits: int
+    lineages: List[Lineage] = field(default_factory=list)
+    densities: List[Tuple[int, float, float]] = field(default_factory=list)
+    repo_densities: List[Tuple[int, float]] = field(default_factory=list)
+
+    @property
+    def xml(self) -> str:
+        """The lineage XML, as WriteLineageFile writes it."""
+        return "".join(["<lineages>\n", *(lineage.toXML() for lineage in self.lineages), "</lineages>\n"])
+
+
+def _fragments(rnd: random.Random) -> List[CloneFragment]:
+    return [CloneFragment(file, ls, le, rnd.choice(["", "compute", "run(int)"]), rnd.randint(-2 ** 63, 2 ** 63 - 1),
+                          code_content="", simhash=0)
+            for file, ls, le in _clone_class(rnd)]
+
+
+def _version(rnd: random.Random, nr: int) -> CloneVersion:
+    cc = None
+    if rnd.random() < 0.95:
+        cc = CloneClass()
+        cc.fragments = _fragments(rnd)
+    version = CloneVersion(cc, f"{nr:07x}", nr, rnd.choice([None, rnd.randint(1, 99)]), rnd.choice(["None", "alice"]),
+                           evo=rnd.choice(EVOLUTION), chan=rnd.choice(CHANGE), n_evo=rnd.randint(0, 3),
+                           n_change=rnd.randint(0, 3), clones_loc=rnd.randint(0, 400))
+    if rnd.random() < 0.2:
+        version.removed_fragments = _fragments(rnd)[:rnd.randint(1, 2)]
+    return version
+
+
+def _genealogy(seed: int, added: Optional[Callable[[Lineage], None]] = None,
+               changed: Optional[Callable[[Lineage, int], None]] = None,
+               committed: Optional[Callable[[Genealogy], None]] = None) -> Genealogy:
+    """
+    Random genealogy, built the way the genealogy step builds one: at every commit lineages are
+    started, get a new version, or have their last version updated or replaced. The callbacks see
+    each step: added(lineage), changed(lineage, first) before the versions from `first` on change,
+    and committed(genealogy) once a commit is done.
+    """
+    rnd = random.Random(seed)
+    added = added or (lambda lineage: None)
+    changed = changed or (lambda lineage, first: None)
+    genealogy = Genealogy(commits=rnd.randint(1, 25))
+    for nr in range(1, genealogy.commits + 1):
+        for _ in range(rnd.randint(0, 4)):
+            op = rnd.random()
+            if op < 0.3 or not genealogy.lineages:
+                lineage = Lineage()
+                lineage.versions.append(_version(rnd, nr))
+                genealogy.lineages.append(lineage)
+                added(lineage)
+                continue
+            lineage = rnd.choice(genealogy.lineages)
+            versions = lineage.versions
+            if op < 0.6:
+                changed(lineage, len(versions))
+                versions.append(_version(rnd, nr))
+            elif op < 0.8:
+                changed(lineage, len(versions) - 1)
+                versions[-1].nr = max(versions[-1].nr, nr)
+                versions[-1].hash = f"{nr:07x}"
+            elif len(versions) >= 2:
+                changed(lineage, len(versions) - 1)
+                versions.pop()
+                changed(lineage, len(versions))
+                versions.append(_version(rnd, nr))
+        genealogy.densities.append((nr, rnd.random() * 10, float(rnd.randint(0, 900))))
+        genealogy.repo_densities.append((nr, rnd.random()))
+        if committed is not None:
+            committed(genealogy)
+    return genealogy
+
+
+@pytest.fixture
+def synthetic_clone_classes():
+    """Builds the random clone classes of a seed."""
+    return _clone_classes
+
+
+@pytest.fixture
+def synthetic_genealogy():
+    """Builds the random genealogy of a seed; see _genealogy for the callbacks."""
+    return _genealogy
@@ -0,0 +1,110 @@
+import random
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from omniccg.clone_xml import iter_clone_classes
+
+CHUNK_SIZES = (1, 3, 7, 64, 1 << 16)
+
+SIMIAN_REPORT = """Similarity Analyser 4.0.0 - http://www.harukizaemon.com/simian
+Copyright (c) 2003-2018 Simon Harris.  All rights reserved.
+Loading (recursively) *.java from /ws/dataset/production
+<?xml version="1.0" encoding="UTF-8"?>
+<!--
+Similarity Analyser 4.0.0 - http://www.harukizaemon.com/simian
+-->
+<simian version="4.0.0">
+    <check failOnDuplication="true" ignoreCurlyBraces="false" threshold="20">
+        <set lineCount="21" fingerprint="6d3c2c1d0b">
+            <block sourceFile="/ws/dataset/production/src/A.java" startLineNumber="12" endLineNumber="32"/>
+            <block sourceFile="/ws/dataset/production/src/B.java" startLineNumber="40" endLineNumber="60"/>
+        </set>
+        <set lineCount="20" fingerprint="0a9f8e7d6c">
+            <block sourceFile="/ws/dataset/production/src/C.java" startLineNumber="1" endLineNumber="20"/>
+            <block sourceFile="/ws/dataset/production/src/C.java" startLineNumber="101" endLineNumber="120"/>
+            <block sourceFile="/ws/dataset/production/src/D.java" startLineNumber="7" endLineNumber="26"/>
+        </set>
+        <summary duplicateFileCount="4" duplicateLineCount="101" duplicateBlockCount="5" totalFileCount="9"/>
+    </check>
+</simian>
+"""
+
+
+def _nicad(classes) -> str:
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', "<clones>",
+           '<systeminfo processor="nicad6" system="production"/>', f'<classinfo nclasses="{len(classes)}"/>']
+    for i, fragments in enumerate(classes):
+        out.append(f'<class classid="{i}" nclones="{len(fragments)}" nlines="5" similarity="100">')
+        out += [f'<source file="{f}" startline="{s}" endline="{e}" pcid="1"></source>' for f, s, e in fragments]
+        out.append("</class>")
+    out.append("</clones>")
+    return "\n".join(out) + "\n"
+
+
+def _simian(classes) -> str:
+    out = SIMIAN_REPORT[:SIMIAN_REPORT.index("<simian")].splitlines()
+    out += ['<simian version="4.0.0">', '    <check failOnDuplication="true" threshold="20">']
+    for fragments in classes:
+        out.append('        <set lineCount="20" fingerprint="abc">')
+        out += [f'            <block sourceFile="{f}" startLineNumber="{s}" endLineNumber="{e}"/>' for f, s, e in fragments]
+        out.append("        </set>")
+    out += ['        <summary duplicateFileCount="1" totalFileCount="3"/>', "    </check>", "</simian>"]
+    return "\n".join(out) + "\n"
+
+
+def _parsed_whole(xml: str):
+    """Clone classes as the ElementTree parse of the whole document read them."""
+    root = ET.fromstring(xml[xml.find("<?xml"):].encode("utf-8"))
+    if root.tag == "simian":
+        return [[(b.get("sourceFile"), int(b.get("startLineNumber")), int(b.get("endLineNumber")))
+                 for b in s.findall("block")] for s in root.find("check").findall("set")]
+    return [[(s.get("file"), int(s.get("startline")), int(s.get("endline"))) for s in c.findall("source")]
+            for c in root.findall("class")]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("render", [_nicad, _simian])
+def test_streamed_classes_match_the_whole_document(seed, render, synthetic_clone_classes, tmp_path):
+    classes = synthetic_clone_classes(seed)
+    xml = render(classes)
+    assert _parsed_whole(xml) == classes
+    path = tmp_path / "result.xml"
+    path.write_text(xml, encoding="utf-8")
+    for chunk_size in CHUNK_SIZES:
+        assert list(iter_clone_classes(str(path), chunk_size)) == classes
+    assert list(iter_clone_classes(xml)) == classes
+    assert list(iter_clone_classes(xml.encode("utf-8"))) == classes
+
+
+def test_simian_report_with_banner():
+    assert list(iter_clone_classes(SIMIAN_REPORT, chunk_size=16)) == [
+        [("/ws/dataset/production/src/A.java", 12, 32), ("/ws/dataset/production/src/B.java", 40, 60)],
+        [("/ws/dataset/production/src/C.java", 1, 20), ("/ws/dataset/production/src/C.java", 101, 120),
+         ("/ws/dataset/production/src/D.java", 7, 26)],
+    ]
+
+
+def test_missing_lines_are_none():
+    xml = '<clones><class><source file="A.java" startline="" endline="4"/></class></clones>'
+    assert list(iter_clone_classes(xml)) == [[("A.java", None, 4)]]
+
+
+def test_truncated_result_is_an_error():
+    # NiCad killed while writing: the classes read so far come out, then the parse fails
+    xml = ('<clones>\n<class><source file="A.java" startline="1" endline="9"/></class>\n'
+           '<class><source file="B.java" startline="3" en')
+    classes = iter_clone_classes(xml)
+    assert next(classes) == [("A.java", 1, 9)]
+    with pytest.raises(ET.ParseError):
+        next(classes)
+
+
+def test_unknown_root_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_clone_classes("<results><class/></results>"))
+
+
+def test_missing_file_is_reported(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(iter_clone_classes(str(tmp_path / "result.xml")))
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from comment_reference import EDGE_CASES, reference, repository_samples, random_samples
+from omniccg.domain.code_operations import code_without_comments_and_blank_lines
+from omniccg.domain.code_scanner import normalize_code, strip_comments
+from omniccg.domain.hash_operations import tokenize
+
+
+def _scan(segment, ext):
+    normalized = normalize_code(segment, ext)
+    return normalized, tokenize(normalized)
+
+
+@pytest.mark.parametrize("ext,segment", [(ext, case) for ext, cases in EDGE_CASES.items() for case in cases])
+def test_edge_cases_match_the_reference(ext, segment):
+    assert _scan(segment, ext) == reference(segment, ext)
+
+
+def test_repository_segments_match_the_reference():
+    rng = random.Random(1)
+    for ext, segment in repository_samples(rng, per_file=5):
+        assert _scan(segment, ext) == reference(segment, ext), (ext, segment)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_text_matches_the_reference(seed):
+    rng = random.Random(seed)
+    for ext, segment in random_samples(rng, 1000):
+        assert _scan(segment, ext) == reference(segment, ext), (ext, segment)
+
+
+def test_known_segments():
+    java = 'int a = 1; // one\nString s = "// kept"; /* two\n lines */ int b;\n\n'
+    assert strip_comments(java, ".java") == 'int a = 1; \nString s = "// kept"; \n int b;\n\n'
+    assert normalize_code(java, ".java") == 'int a = 1;\nString s = "// kept";\n int b;'
+    assert normalize_code("$a = 1; # c\n$b = '#'; // d\n", ".php") == "$a = 1;\n$b = '#';"
+    assert normalize_code("x = 1  # c\ny = \"#\"\n", ".py") == 'x = 1\ny = "#"'
+    assert normalize_code("=begin\nhidden\n=end\nputs 1 # c\n", ".rb") == "puts 1"
+    assert normalize_code("a // b\n", ".txt") == "a // b"
+
+
+def test_segment_of_a_file():
+    lines = ["class A {\n", "  // doc\n", "  int f() { return 1; } /* x */\n", "\n", "}\n"]
+    assert code_without_comments_and_blank_lines(lines, ".java", 2, 4) == "  int f() { return 1; }"
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from omniccg import core, dataset_index
+from omniccg.analysis import count_functions_in_file
+
+SOURCES = {
+    "src/app/Billing.java": "class Billing {\n    int total(int a) {\n        return a;\n    }\n\n"
+                            "    int tax(int a) {\n        return a / 5;\n    }\n}\n",
+    "src/app/Orders.java": "class Orders {\n    void place() {\n    }\n}\n",
+    "src/util/Text.java": "class Text {\n    String trim(String s) {\n        return s;\n    }\n\n"
+                          "    String pad(String s) {\n        return s;\n    }\n\n    String cut(String s) {\n"
+                          "        return s;\n    }\n}\n",
+    "src/app/BillingTest.java": "class BillingTest {\n    void testTotal() {\n    }\n}\n",
+}
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    ws = tmp_path / "ws"
+    for rel_path, text in SOURCES.items():
+        path = ws / "repo" / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    paths = core.Paths(ws_dir=str(ws), repo_dir=str(ws / "repo"), data_dir=str(ws / "dataset"),
+                       prod_data_dir=str(ws / "dataset" / "production"), res_dir=str(ws / "final_result"),
+                       clone_detector_dir=str(ws / "aggregated_results"),
+                       clone_detector_xml=str(ws / "aggregated_results" / "result.xml"))
+    dataset_index._indexes.clear()
+    yield core.Context(settings=core.Settings(language="java"), paths=paths, state=core.State())
+    dataset_index._indexes.clear()
+
+
+def test_density_denominator_comes_from_the_index(ctx, monkeypatch):
+    p = ctx.paths
+    assert core.PrepareSourceCode(ctx)
+    # NiCad reports the staged copies of the files
+    staged = os.path.join(p.prod_data_dir, "src")
+    with open(p.clone_detector_xml, "w") as fp:
+        fp.write(f'<clones>\n<class nclones="2">\n'
+                 f'<source file="{staged}/app/Billing.java" startline="2" endline="4"/>\n'
+                 f'<source file="{staged}/util/Text.java" startline="2" endline="4"/>\n</class>\n'
+                 f'<class nclones="2">\n<source file="{staged}/util/Text.java" startline="6" endline="8"/>\n'
+                 f'<source file="{staged}/util/Text.java" startline="10" endline="12"/>\n</class>\n</clones>\n')
+    analysis = core.CommitAnalysis(1, "a1b2c3d")
+    analysis.cloneclasses = core.parseCloneClassFile(ctx, p.clone_detector_xml)
+    assert {f.file for cc in analysis.cloneclasses for f in cc.fragments} == {
+        os.path.join(p.repo_dir, "src", "app", "Billing.java"), os.path.join(p.repo_dir, "src", "util", "Text.java")}
+
+    def parse_again(path):
+        raise AssertionError(f"{path} was parsed again instead of read from the index")
+
+    monkeypatch.setattr(dataset_index, "FileModel", parse_again)
+    core.PrepareDensityAnalysis(ctx, analysis)
+
+    cloned_files = [os.path.join(p.repo_dir, "src", "app", "Billing.java"), os.path.join(p.repo_dir, "src", "util", "Text.java")]
+    assert sum(count_functions_in_file(f, "java") for f in cloned_files) == 5
+    assert analysis.density_f_p == pytest.approx(100 * 4 / 5)
+    # Orders.java counts for the whole dataset, BillingTest.java is not staged
+    assert analysis.density_f_repo == pytest.approx(100 * 4 / 6)
+
+
+def test_files_outside_the_dataset_are_still_counted(ctx):
+    assert core.PrepareSourceCode(ctx)
+    index = dataset_index.dataset_index(ctx.paths.prod_data_dir, ctx.paths.repo_dir, "java", False)
+    test_file = os.path.join(ctx.paths.repo_dir, "src", "app", "BillingTest.java")
+    assert index.function_count(test_file) == count_functions_in_file(test_file, "java") == 1
+    with pytest.raises(ValueError):
+        index.function_count(os.path.join(ctx.paths.repo_dir, "src", "Missing.java"))
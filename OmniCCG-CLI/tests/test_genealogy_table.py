@@ -0,0 +1,84 @@
+import pytest
+
+from omniccg.genealogy_table import (TABLE_MAGIC, GenealogyTable, decode_table, encode_table, load_table,
+                                     save_table)
+from omniccg.metrics import generate_detailed_report, generate_table_report
+
+LINEAGES_XML = """<lineages>
+<lineage>
+\t<version nr="1" hash="a1b2c3d" number_pr="None" evolution="None" change="None" author="None" n_evo="0" n_cha="0" clones_LOC="18" >
+\t\t<class nclones="2">
+\t\t\t<source file="/ws/repo/src/A.java" startline="3" endline="11" function_name="sum" hash="-7"></source>
+\t\t\t<source file="/ws/repo/src/B.java" startline="20" endline="28" function_name="total" hash="42"></source>
+\t\t</class>
+\t</version>
+\t<version nr="4" hash="0c0ffee" number_pr="17" evolution="Subtract" change="Inconsistent" author="alice" n_evo="1" n_cha="1" clones_LOC="9" >
+\t\t<class nclones="1">
+\t\t\t<source file="/ws/repo/src/A.java" startline="3" endline="11" function_name="sum" hash="-7"></source>
+\t\t</class>
+\t</version>
+\t\t\t<source file="/ws/repo/src/B.java" startline="20" endline="29" function_name="total" hash="43"></source>
+</lineage>
+<lineage>
+\t<version nr="2" hash="deadbee" number_pr="None" evolution="None" change="None" author="None" n_evo="0" n_cha="0" clones_LOC="0" >
+\t</version>
+</lineage>
+</lineages>
+"""
+
+
+def test_table_of_a_known_genealogy():
+    table = GenealogyTable.from_xml(LINEAGES_XML, last_version=4)
+    assert (table.lineage_count, table.version_count) == (2, 3)
+    assert list(table.iter_version_labels()) == [[(1, "None", "None"), (4, "Subtract", "Inconsistent")],
+                                                 [(2, "None", "None")]]
+    first, second = table.iter_lineages()
+    assert first[1].fragments == [("/ws/repo/src/A.java", 3, 11, "sum", -7)]
+    assert first[1].removed_fragments == [("/ws/repo/src/B.java", 20, 29, "total", 43)]
+    assert (first[1].number_pr, first[1].author, first[1].clones_loc) == ("17", "alice", 9)
+    assert not second[0].has_class and second[0].fragments == []
+    # the file, name and commit strings are stored once
+    assert len(table.files) == 2 and len(table.commits) == 3
+    assert table.to_xml() == LINEAGES_XML
+    assert decode_table(encode_table(table)).to_xml() == LINEAGES_XML
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_table_reproduces_the_lineage_xml(seed, synthetic_genealogy):
+    genealogy = synthetic_genealogy(seed)
+    table = GenealogyTable.from_lineages(genealogy.lineages, genealogy.commits, genealogy.densities,
+                                         genealogy.repo_densities)
+    assert table.to_xml() == genealogy.xml
+    assert GenealogyTable.from_xml(genealogy.xml, genealogy.commits).to_xml() == genealogy.xml
+    assert decode_table(encode_table(table)).to_xml() == genealogy.xml
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_table_metrics_match_the_xml_metrics(seed, synthetic_genealogy, tmp_path):
+    g = synthetic_genealogy(seed)
+    expected = generate_detailed_report(g.xml, g.commits, g.densities, g.repo_densities)
+    path = str(tmp_path / "genealogy.occg")
+    save_table(path, GenealogyTable.from_lineages(g.lineages, g.commits, g.densities, g.repo_densities))
+    assert load_table(path).densities == g.densities
+    assert generate_table_report(path) == expected
+    assert generate_detailed_report(GenealogyTable.from_xml(g.xml, g.commits), g.commits, g.densities,
+                                    g.repo_densities) == expected
+
+
+def test_decode_rejects_other_files():
+    with pytest.raises(ValueError):
+        decode_table(LINEAGES_XML.encode("utf-8"))
+    data = encode_table(GenealogyTable.from_xml(LINEAGES_XML, last_version=4))
+    with pytest.raises(ValueError):
+        decode_table(TABLE_MAGIC + bytes([data[len(TABLE_MAGIC)] + 1]) + data[len(TABLE_MAGIC) + 1:])
+
+
+@pytest.mark.parametrize("damage", [lambda data: data[:-5], lambda data: data[:len(TABLE_MAGIC) + 3],
+                                    lambda data: data[:len(TABLE_MAGIC) + 1] + bytes(len(data) - len(TABLE_MAGIC) - 1)])
+def test_damaged_table_file_is_rejected(damage, tmp_path):
+    """An interrupted write or a damaged .occg file is reported as not being a table."""
+    path = tmp_path / "ccg_data.occg"
+    save_table(str(path), GenealogyTable.from_xml(LINEAGES_XML, last_version=4))
+    path.write_bytes(damage(path.read_bytes()))
+    with pytest.raises(ValueError):
+        load_table(str(path))
@@ -0,0 +1,101 @@
+import random
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from omniccg import core
+from omniccg.domain.Lineage import Lineage
+from omniccg.journal import LineageJournal, materialize_journal
+
+# cli.py imports its siblings as top-level modules, like when run from the package directory
+PACKAGE_DIR = Path(core.__file__).resolve().parent
+
+
+class _Version:
+    def __init__(self, text):
+        self.text = text
+
+    def toXML(self):
+        return self.text + "\n"
+
+
+def _lineage(*texts):
+    lineage = Lineage()
+    lineage.versions = [_Version(text) for text in texts]
+    return lineage
+
+
+def test_journal_of_a_known_genealogy(tmp_path):
+    path = str(tmp_path / "genealogy.journal")
+    journal = LineageJournal(path)
+    journal.open([])
+    first = _lineage("<v1/>")
+    journal.added(first)
+    journal.flush(1, "aaaaaaa")
+    journal.changed(first, 1)
+    first.versions.append(_Version("<v2/>"))
+    second = _lineage("<w1/>")
+    journal.added(second)
+    journal.flush(2, "bbbbbbb")
+    journal.changed(first, 1)
+    first.versions[1] = _Version("<v2b/>")
+    journal.flush(3, "ccccccc")
+    journal.close()
+
+    with open(path, "rb") as fp:
+        assert fp.read() == (b"C 1 aaaaaaa\nL 0 0 6\n<v1/>\nE\n"
+                             b"C 2 bbbbbbb\nL 0 1 6\n<v2/>\nL 1 0 6\n<w1/>\nE\n"
+                             b"C 3 ccccccc\nL 0 1 7\n<v2b/>\nE\n")
+    expected = "<lineages>\n<lineage>\n<v1/>\n<v2b/>\n</lineage>\n<lineage>\n<w1/>\n</lineage>\n</lineages>\n"
+    assert materialize_journal(path) == expected
+
+    # a record cut off by a crash is left out
+    with open(path, "ab") as fp:
+        fp.write(b"C 4 ddddddd\nL 1 1 6\n<w2")
+    assert materialize_journal(path) == expected
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_materialized_journal_matches_the_lineage_file(seed, tmp_path, synthetic_genealogy):
+    """Flushed after every commit and, now and then, reopened as after a checkpoint restore."""
+    rnd = random.Random(-seed)
+    path = str(tmp_path / "genealogy.journal")
+    journal = LineageJournal(path)
+    journal.open([])
+
+    def committed(genealogy):
+        journal.flush(len(genealogy.densities), f"{len(genealogy.densities):07x}")
+        if rnd.random() < 0.1:
+            offset = journal.tell()
+            journal.close()
+            journal.open(genealogy.lineages, offset)
+
+    g = synthetic_genealogy(seed, added=journal.added, changed=journal.changed, committed=committed)
+    journal.close()
+    lineage_file = str(tmp_path / "genealogy.xml")
+    assert materialize_journal(path) == core.WriteLineageFile(None, g.lineages, lineage_file)
+
+
+def test_journal_command(tmp_path, monkeypatch, synthetic_genealogy):
+    monkeypatch.syspath_prepend(str(PACKAGE_DIR))
+    import cli
+
+    path = str(tmp_path / "genealogy.journal")
+    journal = LineageJournal(path)
+    journal.open([])
+    g = synthetic_genealogy(7, added=journal.added, changed=journal.changed,
+                            committed=lambda genealogy: journal.flush(len(genealogy.densities), "0000000"))
+    journal.close()
+    expected = core.WriteLineageFile(None, g.lineages, str(tmp_path / "genealogy.xml"))
+
+    runner = CliRunner()
+    result = runner.invoke(cli.journal, ["--journal", path, "-o", str(tmp_path / "out.xml")])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "out.xml").read_text(encoding="utf-8") == expected
+
+    result = runner.invoke(cli.journal, ["--journal", path])
+    assert result.exit_code == 0 and result.stdout == expected
+
+    result = runner.invoke(cli.journal, [])
+    assert result.exit_code == 2 and "exactly one of --git-repo and --journal" in result.output
@@ -0,0 +1,60 @@
+import random
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from omniccg.domain.CloneClass import CloneClass
+from omniccg.domain.CloneVersion import CloneVersion
+from omniccg.domain.Lineage import Lineage
+from omniccg.metrics import LineageMetrics, generate_detailed_report
+
+
+def test_report_of_a_known_genealogy():
+    """A lineage that changes inconsistently and is alive at the end, and one that died after a commit."""
+    metrics = LineageMetrics()
+    changing, short = Lineage(), Lineage()
+    changing.versions.append(CloneVersion(CloneClass(), "a", 1))
+    metrics.added(changing)
+    metrics.flush()
+    metrics.changed(changing, 1)
+    changing.versions.append(CloneVersion(CloneClass(), "b", 2, evo="Add", chan="Consistent"))
+    short.versions.append(CloneVersion(CloneClass(), "b", 2))
+    metrics.added(short)
+    metrics.flush()
+    metrics.changed(changing, 2)
+    changing.versions.append(CloneVersion(CloneClass(), "c", 3, evo="Same", chan="Inconsistent"))
+    metrics.flush()
+
+    report = ET.fromstring(metrics.report(3, [(1, 1.0, 10.0), (2, 2.0, 20.0), (3, 3.0, 30.0)]))
+    assert report.findtext("total_clone_lineages") == "2"
+    assert report.findtext("total_amount_of_versions") == "2.00"
+    assert report.findtext("status_of_clone_lineages/alive/count") == "1"
+    assert report.findtext("status_of_clone_lineages/dead/count") == "1"
+    assert report.findtext("length_of_dead_clone_lineages/max") == "1"
+    assert [(e.tag, e.text) for e in report.find("change_patterns_of_lineages")] == [
+        ("consistent", "0.00"), ("same", "50.00"), ("inconsistent", "50.00")]
+    assert [(e.tag, e.text) for e in report.find("evolution_pattern_of_versions")] == [
+        ("add", "50.00"), ("same", "50.00")]
+    assert report.findtext("clone_density/summary/avg_density_present") == "2.00"
+    assert [p.get("rvolatile") for p in report.find("kvolatile")] == ["0.00", "0.50", "0.50", "0.50"]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_incremental_metrics_match_the_full_report(seed, synthetic_genealogy):
+    """Flushed at random commits and, now and then, reset as after a checkpoint restore."""
+    rnd = random.Random(-seed)
+    tracked = {"metrics": LineageMetrics()}
+
+    def committed(genealogy):
+        if rnd.random() < 0.7:
+            tracked["metrics"].flush()
+        if rnd.random() < 0.05:
+            tracked["metrics"] = LineageMetrics()
+            tracked["metrics"].reset(genealogy.lineages)
+
+    g = synthetic_genealogy(seed, added=lambda lineage: tracked["metrics"].added(lineage),
+                            changed=lambda lineage, first: tracked["metrics"].changed(lineage, first),
+                            committed=committed)
+    last_version = g.commits if rnd.random() < 0.8 else g.commits + 1
+    expected = generate_detailed_report(g.xml, last_version, g.densities, g.repo_densities)
+    assert tracked["metrics"].report(last_version, g.densities, g.repo_densities) == expected
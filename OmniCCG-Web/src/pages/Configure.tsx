@@ -188,8 +188,7 @@ const Configure = () => {
         headers: {
           "Content-Type": "application/json",
         },
-        // o backend está usando "gir_url", então seguimos isso:
-        body: JSON.stringify({ gir_url: repoUrl }),
+        body: JSON.stringify({ git_url: repoUrl }),
       });
     } catch (err) {
       console.error("Failed to notify stop_detect_clones:", err);